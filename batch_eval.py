@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+# Valutazione vettoriale di molte posizioni con NumPy (scoring di dataset, tuning).
+# Le posizioni sono codificate in un array (N, 64) int8 di codici pezzo (stessa mailbox di
+# ChessEngine.squares, a8 = 0) più un array (N,) bool "muove il Bianco". Ogni termine di
+# evaluate_board viene calcolato per tutte le posizioni insieme su array (N,) di bitboard uint64,
+# una per codice pezzo:
+#   - materiale, fase, imbalance: dall'entry materiale (_calculate_material_entry) calcolata
+#     una volta per chiave materiale distinta, come fa la material hash table;
+#   - PST: tabella per (codice, casa) indicizzata con la mailbox, Re interpolati per fase;
+#   - struttura pedonale, torri, colonne del Re: fill delle bitboard dei pedoni (span davanti/
+#     dietro, colonne occupate), con le stesse definizioni di _calculate_pawn_entry;
+#   - linee del Re e mobilità: attacchi per direzione con fill Kogge-Stone. I raggi di due pezzi
+#     nella stessa direzione non si sovrappongono (quello del pezzo dietro si ferma su quello
+#     davanti), quindi il popcount conta ogni pezzo come evaluate_board; dal Re, i pezzi
+#     pesanti nemici raggiunti direttamente hanno 0 pezzi in mezzo, quelli raggiunti togliendo
+#     il primo pezzo (x-ray) ne hanno 1.
+# I valori tapered sono precalcolati per ogni fase con get_tapered_value, quindi gli score
+# coincidono con quelli di evaluate_board. Le posizioni con un finale riconosciuto (rare)
+# vengono valutate con evaluate_board.
+import constants
+import evaluation
+import pst
+from bitboard import FULL_BOARD, FILE_A, FILE_H, NOT_FILE_A, NOT_FILE_H, ROW_MASKS, KING_SHIELD_BB, WHITE, BLACK
+from evaluation import WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK, get_tapered_value
+
+# Import condizionale: evaluate_batch richiede NumPy
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+_PHASES = range(constants.GAME_PHASE_MAX + 1)
+_PIECE_CODES = (WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK)
+# Direzioni come (shift della bitboard, maschera delle case di arrivo valide: esclude il
+# "giro" da una colonna del bordo a quella opposta). Shift positivo = verso h1.
+_ROOK_SHIFTS = ((1, NOT_FILE_A), (-1, NOT_FILE_H), (8, FULL_BOARD), (-8, FULL_BOARD))
+_BISHOP_SHIFTS = ((9, NOT_FILE_A), (7, NOT_FILE_H), (-7, NOT_FILE_A), (-9, NOT_FILE_H))
+_KNIGHT_SHIFTS = tuple((dr * 8 + dc, FULL_BOARD ^ sum((FILE_A << f) if dc > 0 else (FILE_H >> f) for f in range(abs(dc))))
+                       for dr, dc in ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+# FEN -> byte della mailbox: le cifre diventano altrettante case vuote
+_FEN_EXPAND = {ord(str(n)): '.' * n for n in range(1, 9)}
+_FEN_EXPAND[ord('/')] = None
+_FEN_CODES = bytes(constants.PIECE_CODES.get(chr(i), 0) for i in range(256))
+
+_tables = None
+
+
+def _tapered_table(mg_eg_tuple):
+    return np.array([get_tapered_value(mg_eg_tuple, phase) for phase in _PHASES], dtype=np.int64)
+
+
+def _build_tables():
+    """Tabelle NumPy costruite al primo uso (l'engine non importa NumPy se non serve)."""
+    tables = {}
+    max_phase = constants.GAME_PHASE_MAX or 1
+    piece_pst = np.zeros((16, 64), dtype=np.int32)
+    king_pst = np.zeros((16, 64, len(_PHASES)), dtype=np.int64)
+    for code in (WP, WN, WB, WR, WQ, BP, BN, BB, BR, BQ):
+        piece_pst[code] = pst.PST_BY_CODE[code]
+    for code in (WK, BK):
+        for sq in range(64):
+            mg_val = pst.KING_PST_MG_BY_CODE[code][sq]
+            eg_val = pst.KING_PST_EG_BY_CODE[code][sq]
+            for phase in _PHASES:
+                king_pst[code, sq, phase] = int(((mg_val * phase) + (eg_val * (max_phase - phase))) / max_phase)
+    tables['piece_pst'] = piece_pst.reshape(-1) # Indice codice * 64 + casa
+    tables['king_pst'] = king_pst
+    tables['squares'] = np.arange(64, dtype=np.int16)
+
+    for name in ('TEMPO_BONUS', 'DOUBLED_PAWN_PENALTY', 'ISOLATED_PAWN_PENALTY', 'BACKWARD_PAWN_PENALTY',
+                 'PAWN_RAM_PENALTY', 'ROOK_OPEN_FILE_BONUS', 'ROOK_SEMI_OPEN_FILE_BONUS', 'ROOK_ON_SEVENTH_BONUS',
+                 'KING_SHIELD_BONUS', 'KING_OPEN_FILE_PENALTY', 'KING_SEMI_OPEN_FILE_PENALTY',
+                 'ENDGAME_KING_ROOK_ATTACK_OPEN', 'ENDGAME_KING_ROOK_ATTACK_SEMI',
+                 'ENDGAME_KING_QUEEN_ATTACK_OPEN', 'ENDGAME_KING_QUEEN_ATTACK_SEMI'):
+        tables[name] = _tapered_table(getattr(constants, name))
+    # Bonus pedone passato per fase e riga della scacchiera (base + bonus del rango, come
+    # _pawn_structure_score): l'indice di rango è 7 - riga per il Bianco, riga per il Nero
+    passed = np.array([[get_tapered_value(constants.PASSED_PAWN_BONUS_BASE, phase) +
+                        get_tapered_value(constants.PASSED_PAWN_RANK_BONUS[rank_index], phase)
+                        for rank_index in range(8)] for phase in _PHASES], dtype=np.int64)
+    tables['passed'] = (passed[:, ::-1], passed)
+
+    tables['king_shield'] = np.array(KING_SHIELD_BB, dtype=np.uint64) # [colore][casa]
+    # Colonne kc-1..kc+1 intere per la casa del Re
+    tables['king_files'] = np.array([sum(FILE_A << f for f in range(max(0, (sq & 7) - 1), min(7, (sq & 7) + 1) + 1))
+                                     for sq in range(64)], dtype=np.uint64)
+    tables['material_unit'] = [np.int64(constants.MATERIAL_KEY_UNIT[code]) for code in range(15)]
+    tables['mobility_masks'] = [(bonus, np.uint64(mask)) for bonus, mask in evaluation.MOBILITY_BONUS_MASKS]
+    # (codice, scorrevole, direzioni, moltiplicatore) per la mobilità
+    tables['mobility_pieces'] = []
+    for base in (0, constants.BLACK_FLAG):
+        for piece_type, shifts, multiplier in (
+                (constants.KNIGHT, _KNIGHT_SHIFTS, constants.MOBILITY_KNIGHT_MULTIPLIER),
+                (constants.BISHOP, _BISHOP_SHIFTS, constants.MOBILITY_BISHOP_MULTIPLIER),
+                (constants.ROOK, _ROOK_SHIFTS, constants.MOBILITY_ROOK_MULTIPLIER),
+                (constants.QUEEN, _ROOK_SHIFTS + _BISHOP_SHIFTS, constants.MOBILITY_QUEEN_MULTIPLIER)):
+            tables['mobility_pieces'].append((base | piece_type, piece_type != constants.KNIGHT,
+                                              [(shift, np.uint64(mask)) for shift, mask in shifts], multiplier))
+    tables['rook_shifts'] = [(shift, np.uint64(mask)) for shift, mask in _ROOK_SHIFTS]
+    tables['bishop_shifts'] = [(shift, np.uint64(mask)) for shift, mask in _BISHOP_SHIFTS]
+    # Byte -> numero di bit, per il popcount senza np.bitwise_count (NumPy < 2.0)
+    tables['byte_popcount'] = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+    return tables
+
+
+def _get_tables():
+    global _tables
+    if _tables is None:
+        if not NUMPY_AVAILABLE:
+            raise ImportError("evaluate_batch richiede NumPy")
+        _tables = _build_tables()
+    return _tables
+
+
+def _popcount(bitboards):
+    """Numero di bit a 1 per ogni elemento di un array uint64."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    byte_counts = _get_tables()['byte_popcount'][np.ascontiguousarray(bitboards).view(np.uint8)]
+    return byte_counts.reshape(bitboards.shape + (8,)).sum(axis=-1)
+
+
+def _row_counts(bitboards):
+    """Numero di bit a 1 per riga della scacchiera: (N, 8), colonna r = riga r (a8 = riga 0)."""
+    return _get_tables()['byte_popcount'][np.ascontiguousarray(bitboards).view(np.uint8).reshape(-1, 8)]
+
+
+def _shift(bitboards, shift):
+    """Bitboard spostate di shift case (positivo = verso h1); i bit oltre il bordo si perdono."""
+    return bitboards << np.uint64(shift) if shift > 0 else bitboards >> np.uint64(-shift)
+
+
+def _north_fill(bitboards):
+    """Ogni pezzo riempie la sua colonna verso la traversa 8 (casa inclusa)."""
+    for distance in (8, 16, 32):
+        bitboards = bitboards | (bitboards >> np.uint64(distance))
+    return bitboards
+
+
+def _south_fill(bitboards):
+    """Ogni pezzo riempie la sua colonna verso la traversa 1 (casa inclusa)."""
+    for distance in (8, 16, 32):
+        bitboards = bitboards | (bitboards << np.uint64(distance))
+    return bitboards
+
+
+def _sideways(bitboards):
+    """Case sulle colonne adiacenti (stessa riga)."""
+    return ((bitboards << np.uint64(1)) & np.uint64(NOT_FILE_A)) | ((bitboards >> np.uint64(1)) & np.uint64(NOT_FILE_H))
+
+
+def _ray_attacks(sliders, empty, shift, mask):
+    """Case attaccate lungo una direzione dai pezzi in sliders (fill Kogge-Stone, occupancy = ~empty)."""
+    propagator = empty & mask
+    for distance in (shift, 2 * shift, 4 * shift):
+        sliders = sliders | (propagator & _shift(sliders, distance))
+        propagator = propagator & _shift(propagator, distance)
+    return _shift(sliders, shift) & mask
+
+
+def _line_attacks(king, occupied, shifts):
+    """
+    Case raggiunte dal Re lungo le direzioni shifts: (dirette, x-ray attraverso il primo pezzo).
+    Un pezzo nel primo insieme ha 0 pezzi tra sé e il Re, uno nel secondo esattamente 1.
+    """
+    empty = ~occupied
+    direct = np.zeros_like(king)
+    xray = np.zeros_like(king)
+    for shift, mask in shifts:
+        attacks = _ray_attacks(king, empty, shift, mask)
+        direct |= attacks
+        xray |= _ray_attacks(king, empty | (attacks & occupied), shift, mask) & ~attacks
+    return direct, xray
+
+
+def _bitboards(mask):
+    """Bitboard uint64 (N,) da una maschera bool (N, 64), bit sq = casa sq."""
+    packed = np.packbits(mask, axis=1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').reshape(-1)
+
+
+def encode_positions(positions):
+    """
+    Codifica le posizioni per evaluate_encoded: ogni posizione è una FEN oppure una coppia
+    (squares, colore) come gli argomenti di evaluate_board (mailbox di 64 codici, 'W'/'B').
+    Ritorna (boards (N, 64) int8, white_to_move (N,) bool).
+    """
+    if not NUMPY_AVAILABLE:
+        raise ImportError("evaluate_batch richiede NumPy")
+    mailboxes = []
+    white_to_move = []
+    for position in positions:
+        if isinstance(position, str):
+            fields = position.split()
+            placement = fields[0].translate(_FEN_EXPAND).encode('ascii')
+            if len(placement) != 64:
+                raise ValueError(f"FEN non valida: {position}")
+            mailboxes.append(placement.translate(_FEN_CODES))
+            white_to_move.append(len(fields) < 2 or fields[1] == 'w')
+        else:
+            squares, color = position
+            if not isinstance(squares, (bytes, bytearray)):
+                squares = evaluation.board_to_squares(squares)
+            mailboxes.append(bytes(squares))
+            white_to_move.append(color == 'W')
+    boards = np.frombuffer(b''.join(mailboxes), dtype=np.int8).reshape(len(mailboxes), 64)
+    return boards, np.array(white_to_move, dtype=bool)
+
+
+def evaluate_batch(positions):
+    """
+    Valuta molte posizioni insieme (FEN o coppie (squares, colore), vedi encode_positions).
+    Ritorna un array int64 di score dal punto di vista di chi muove, uguali a evaluate_board.
+    """
+    return evaluate_encoded(*encode_positions(positions))
+
+
+def evaluate_encoded(boards, white_to_move):
+    """evaluate_batch su posizioni già codificate: boards (N, 64) int8, white_to_move (N,) bool."""
+    tables = _get_tables()
+    boards = np.ascontiguousarray(boards, dtype=np.int8)
+    white_to_move = np.asarray(white_to_move, dtype=bool)
+    count = len(boards)
+    if not count:
+        return np.zeros(0, dtype=np.int64)
+    bitboards = [None] * 15
+    for code in _PIECE_CODES:
+        bitboards[code] = _bitboards(boards == code)
+    occupancy = (bitboards[WP] | bitboards[WN] | bitboards[WB] | bitboards[WR] | bitboards[WQ] | bitboards[WK],
+                 bitboards[BP] | bitboards[BN] | bitboards[BB] | bitboards[BR] | bitboards[BQ] | bitboards[BK])
+    occupied = occupancy[WHITE] | occupancy[BLACK]
+    empty = ~occupied
+
+    # --- Entry materiale per chiave distinta (come la material hash table) ---
+    piece_counts = [None] * 15
+    material_keys = np.zeros(count, dtype=np.int64)
+    for code in _PIECE_CODES:
+        piece_counts[code] = _popcount(bitboards[code])
+        material_keys += piece_counts[code] * tables['material_unit'][code]
+    unique_keys, key_index = np.unique(material_keys, return_inverse=True)
+    entries = [evaluation._calculate_material_entry(int(key)) for key in unique_keys]
+    phase = np.array([entry[evaluation.MATERIAL_PHASE] for entry in entries], dtype=np.intp)[key_index]
+    material = np.array([entry[evaluation.MATERIAL_VALUE][WHITE] - entry[evaluation.MATERIAL_VALUE][BLACK]
+                         for entry in entries], dtype=np.int64)[key_index]
+    imbalance = np.array([entry[evaluation.MATERIAL_IMBALANCE] for entry in entries], dtype=np.int64)[key_index]
+    recognized = np.array([entry[evaluation.MATERIAL_RECOGNIZER] is not None for entry in entries], dtype=bool)[key_index]
+
+    # --- Materiale, PST (Re interpolati con la fase), imbalance e tempo ---
+    pst_index = boards.astype(np.int16) * 64 + tables['squares']
+    total = material + imbalance + tables['piece_pst'][pst_index].sum(axis=1, dtype=np.int64)
+    tempo = tables['TEMPO_BONUS'][phase]
+    total += np.where(white_to_move, tempo, -tempo)
+    has_king = [None, None]
+    king_square = [None, None]
+    for side, king_code in ((WHITE, WK), (BLACK, BK)):
+        king = bitboards[king_code]
+        has_king[side] = king != 0
+        # Casa del Re = log2 della bitboard (esatto: una potenza di 2 è rappresentabile in float64)
+        king_square[side] = np.log2(np.where(has_king[side], king, np.uint64(1)).astype(np.float64)).astype(np.intp)
+        total += np.where(has_king[side], tables['king_pst'][king_code, king_square[side], phase], 0)
+
+    # --- Struttura pedonale ---
+    # "Avanti" per il Bianco = verso la traversa 8 (north), per il Nero verso la traversa 1 (south)
+    pawns = (bitboards[WP], bitboards[BP])
+    pawn_files = (_north_fill(pawns[WHITE]) | _south_fill(pawns[WHITE]),
+                  _north_fill(pawns[BLACK]) | _south_fill(pawns[BLACK]))
+    row_8 = np.uint64(ROW_MASKS[0]) # Una casa per colonna
+    pawn_score = np.zeros(count, dtype=np.int64)
+    for side, sign in ((WHITE, 1), (BLACK, -1)):
+        own, enemy = pawns[side], pawns[side ^ 1]
+        if side == WHITE:
+            ahead_span = _north_fill(own >> np.uint64(8))    # Case davanti a un pedone (stessa colonna)
+            behind_span = _south_fill(own << np.uint64(8))   # Case dietro a un pedone
+            enemy_front = _south_fill(enemy << np.uint64(8)) # Case dietro a un pedone nemico = davanti per noi
+        else:
+            ahead_span = _south_fill(own << np.uint64(8))
+            behind_span = _north_fill(own >> np.uint64(8))
+            enemy_front = _north_fill(enemy >> np.uint64(8))
+        # Doppiati: pedoni oltre il primo di ogni colonna
+        doubled = piece_counts[WP if side == WHITE else BP] - _popcount(pawn_files[side] & row_8)
+        isolated = _popcount(own & ~_sideways(pawn_files[side]))
+        # Arretrato: nessun pedone amico dietro sulle colonne adiacenti (= la casa non è davanti a
+        # un pedone amico adiacente) e nessun pedone amico davanti sulla stessa colonna
+        backward = _popcount(own & ~_sideways(ahead_span) & ~behind_span)
+        # Passato: nessun pedone nemico davanti sulla stessa colonna o sulle adiacenti (righe 2..7)
+        passed = own & ~(enemy_front | _sideways(enemy_front)) & np.uint64(FULL_BOARD ^ ROW_MASKS[0] ^ ROW_MASKS[7])
+        passed_score = (_row_counts(passed) * tables['passed'][side][phase]).sum(axis=1)
+        pawn_score += sign * (passed_score - (tables['DOUBLED_PAWN_PENALTY'][phase] * doubled +
+                                              tables['ISOLATED_PAWN_PENALTY'][phase] * isolated +
+                                              tables['BACKWARD_PAWN_PENALTY'][phase] * backward))
+    # Rams: pedone nero sulla casa davanti a un pedone bianco
+    rams = _popcount(((pawns[WHITE] & np.uint64(evaluation.RAM_ROWS_MASK)) >> np.uint64(8)) & pawns[BLACK])
+    total += pawn_score - tables['PAWN_RAM_PENALTY'][phase] * rams
+
+    # --- Torri: colonne aperte/semi-aperte e settima traversa ---
+    no_pawn_files = ~(pawn_files[WHITE] | pawn_files[BLACK])
+    for side, rook_code, seventh_row, sign in ((WHITE, WR, 1, 1), (BLACK, BR, 6, -1)):
+        rooks = bitboards[rook_code]
+        semi_open = ~pawn_files[side] & pawn_files[side ^ 1]
+        total += sign * (tables['ROOK_OPEN_FILE_BONUS'][phase] * _popcount(rooks & no_pawn_files) +
+                         tables['ROOK_SEMI_OPEN_FILE_BONUS'][phase] * _popcount(rooks & semi_open) +
+                         tables['ROOK_ON_SEVENTH_BONUS'][phase] * _popcount(rooks & np.uint64(ROW_MASKS[seventh_row])))
+
+    # --- Sicurezza del Re ---
+    for side, sign in ((WHITE, 1), (BLACK, -1)):
+        enemy_base = constants.BLACK_FLAG if side == WHITE else 0
+        enemy_rooks = bitboards[enemy_base | constants.ROOK]
+        enemy_queens = bitboards[enemy_base | constants.QUEEN]
+        king_files = tables['king_files'][king_square[side]] & row_8
+        shield = _popcount(tables['king_shield'][side, king_square[side]] & pawns[side])
+        king_score = (tables['KING_SHIELD_BONUS'][phase] * shield -
+                      tables['KING_OPEN_FILE_PENALTY'][phase] * _popcount(king_files & no_pawn_files) -
+                      tables['KING_SEMI_OPEN_FILE_PENALTY'][phase] * _popcount(king_files & ~pawn_files[side] & pawn_files[side ^ 1]))
+        # Torri/donne nemiche sulla linea del Re, con 0 (aperta) o 1 (semi-aperta) pezzi in mezzo
+        king = bitboards[WK if side == WHITE else BK]
+        straight, straight_xray = _line_attacks(king, occupied, tables['rook_shifts'])
+        diagonal, diagonal_xray = _line_attacks(king, occupied, tables['bishop_shifts'])
+        king_score -= (tables['ENDGAME_KING_ROOK_ATTACK_OPEN'][phase] * _popcount(straight & enemy_rooks) +
+                       tables['ENDGAME_KING_ROOK_ATTACK_SEMI'][phase] * _popcount(straight_xray & enemy_rooks) +
+                       tables['ENDGAME_KING_QUEEN_ATTACK_OPEN'][phase] * _popcount((straight | diagonal) & enemy_queens) +
+                       tables['ENDGAME_KING_QUEEN_ATTACK_SEMI'][phase] * _popcount((straight_xray | diagonal_xray) & enemy_queens))
+        total += sign * np.where(has_king[side], king_score, 0)
+
+    # --- Mobilità (esclusi Re e pedoni) ---
+    for code, is_slider, shifts, multiplier in tables['mobility_pieces']:
+        pieces = bitboards[code]
+        if not pieces.any():
+            continue
+        not_own = ~occupancy[code >> 3]
+        mobility = np.zeros(count, dtype=np.int64)
+        for shift, mask in shifts:
+            attacks = (_ray_attacks(pieces, empty, shift, mask) if is_slider else _shift(pieces, shift) & mask) & not_own
+            for bonus, bonus_mask in tables['mobility_masks']:
+                mobility += bonus * _popcount(attacks & bonus_mask)
+        total += (-multiplier if code & constants.BLACK_FLAG else multiplier) * mobility
+
+    # --- Cap e prospettiva di chi muove ---
+    scores = np.clip(total, -evaluation.EVAL_CAP, evaluation.EVAL_CAP) * np.where(white_to_move, 1, -1)
+
+    # Finali riconosciuti: valutazione scalare (il recognizer può anche non riconoscere la posizione)
+    for row in np.flatnonzero(recognized):
+        scores[row] = evaluation.evaluate_board(boards[row].astype(np.uint8).tobytes(), 'W' if white_to_move[row] else 'B')
+    return scores
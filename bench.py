@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# Benchmark dell'engine (non fanno parte dei test).
+# Uso:
+#   python bench.py overrun [movetime_ms ...]   -> sforamento del tempo allocato per mossa
+#   python bench.py smp [depth [workers ...]]   -> time-to-depth Lazy SMP con 1/2/4/8 processi
+#   python bench.py lazy [depth]                -> lazy evaluation: stadi raggiunti, uscite, errori
+#   python bench.py nnue [depth]                -> valutazioni/s classica vs NNUE (rete casuale)
+#   python bench.py batch [posizioni]           -> posizioni/s di evaluate_batch vs evaluate_board
+import sys
+import io
+import time
+import contextlib
+
+import constants
+import evaluation
+import batch_eval
+import nnue
+import search
+import smp
+from board import ChessEngine
+
+BENCH_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "rnbqkb1r/pp2pp1p/3p1np1/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+
+def _quiet_search(engine, **search_kwargs):
+    """search_move senza output UCI/debug; ritorna (mossa, secondi)."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        start = time.monotonic()
+        best_move = search.search_move(engine, **search_kwargs)
+        return best_move, time.monotonic() - start
+
+
+def bench_overrun(move_times_ms=(50, 100, 250, 500, 1000), clock_times_ms=(2000, 10000, 60000)):
+    """
+    Misura di quanto il tempo reale di una mossa supera il tempo allocato:
+    'go movetime N' (allocato = N) e 'go wtime/btime' (allocato = allocate_time).
+    """
+    cases = [(f"movetime {mt}", {'move_time': mt}, mt) for mt in move_times_ms]
+    cases += [(f"wtime {ct}", {'wtime': ct, 'btime': ct}, search.allocate_time(ct, 0, None) * 1000) for ct in clock_times_ms]
+    overruns = []
+    print(f"{'caso':<16}{'fen':>4}{'allocato ms':>13}{'reale ms':>10}{'sforamento ms':>15}")
+    for label, search_kwargs, allocated_ms in cases:
+        for fen_index, fen in enumerate(BENCH_FENS):
+            engine = ChessEngine(fen)
+            _, elapsed = _quiet_search(engine, **search_kwargs)
+            overrun_ms = elapsed * 1000 - allocated_ms
+            overruns.append(overrun_ms)
+            print(f"{label:<16}{fen_index:>4}{allocated_ms:>13.0f}{elapsed * 1000:>10.0f}{overrun_ms:>15.1f}")
+    print(f"sforamento max {max(overruns):.1f} ms, medio {sum(overruns) / len(overruns):.1f} ms su {len(overruns)} ricerche")
+    return overruns
+
+
+def bench_smp(depth=5, worker_counts=(1, 2, 4, 8)):
+    """
+    Time-to-depth di Lazy SMP: tempo per arrivare a 'go depth N' su BENCH_FENS con
+    1/2/4/8 processi (TT condivisa svuotata prima di ogni posizione). Lo speedup è
+    relativo a 1 processo, che usa la stessa TT condivisa.
+    """
+    totals = {}
+    print(f"{'processi':<10}{'fen':>4}{'tempo ms':>10}{'mossa':>8}")
+    for workers in worker_counts:
+        lazy_smp = smp.LazySMP(workers)
+        try:
+            total = 0.0
+            for fen_index, fen in enumerate(BENCH_FENS):
+                lazy_smp.table.clear()
+                engine = ChessEngine(fen)
+                engine.transposition_table = lazy_smp.table
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    start = time.monotonic()
+                    best_move = lazy_smp.search_move(engine, max_depth=depth)
+                    elapsed = time.monotonic() - start
+                total += elapsed
+                print(f"{workers:<10}{fen_index:>4}{elapsed * 1000:>10.0f}{str(best_move):>8}")
+        finally:
+            lazy_smp.close()
+        totals[workers] = total
+    baseline = totals[worker_counts[0]]
+    for workers, total in totals.items():
+        print(f"{workers} processi: {total * 1000:.0f} ms, speedup {baseline / total:.2f}x")
+    return totals
+
+
+def bench_lazy(depth=5):
+    """
+    Lazy evaluation della quiescenza: tempo a 'go depth N' su BENCH_FENS senza e con lazy
+    evaluation, poi una passata con verify (ogni uscita anticipata confrontata con la
+    valutazione completa) per contare gli stadi raggiunti e gli score diversi.
+    """
+    totals = {}
+    for lazy in (False, True):
+        constants.LAZY_EVAL = lazy
+        total = 0.0
+        for fen in BENCH_FENS:
+            _, elapsed = _quiet_search(ChessEngine(fen), max_depth=depth)
+            total += elapsed
+        totals[lazy] = total
+        print(f"lazy {'on ' if lazy else 'off'}: {total * 1000:.0f} ms")
+    print(f"speedup {totals[False] / totals[True]:.2f}x")
+
+    # search_move azzera lazy_eval_stats a ogni ricerca: i totali si sommano qui
+    stats = evaluation.LazyEvalStats()
+    evaluation.lazy_eval_stats.verify = True
+    try:
+        for fen in BENCH_FENS:
+            _quiet_search(ChessEngine(fen), max_depth=depth)
+            stats.add(evaluation.lazy_eval_stats)
+    finally:
+        evaluation.lazy_eval_stats.verify = False
+    evaluations = stats.reached[0]
+    print(f"valutazioni {evaluations}")
+    for stage, label in enumerate(("materiale/PST", "pedoni", "torri/Re", "mobilità")):
+        exits = f", uscite {stats.exits[stage]}" if stage < len(stats.exits) else ""
+        print(f"stadio {stage} ({label}): raggiunto {stats.reached[stage]} ({100 * stats.reached[stage] / max(1, evaluations):.1f}%){exits}")
+    print(f"uscite anticipate {stats.verified}: score diverso {stats.differs}, dalla parte sbagliata della finestra {stats.wrong_side}")
+    return totals
+
+
+def bench_nnue(depth=4, playouts=50):
+    """
+    Valutazioni al secondo della valutazione classica e di quella NNUE (nnue.Network.random,
+    dimensioni di default) sulle posizioni di random playout da BENCH_FENS (le stesse per le
+    due valutazioni, quasi tutte miss della eval cache); poi nodi/s a 'go depth N'. Con la
+    rete make/unmake include anche l'aggiornamento incrementale dell'accumulatore.
+    """
+    if not nnue.NUMPY_AVAILABLE:
+        print("NNUE non disponibile: NumPy non è installato", file=sys.stderr)
+        return None
+    import random
+    network = nnue.Network.random(0)
+    results = {}
+    for label, use_network in (("classica", False), ("nnue", True)):
+        rng = random.Random(0)
+        evaluations, eval_time = 0, 0.0
+        for playout in range(playouts):
+            engine = ChessEngine(BENCH_FENS[playout % len(BENCH_FENS)])
+            engine.set_network(network if use_network else None)
+            for _ in range(60):
+                start = time.perf_counter()
+                engine.evaluate()
+                eval_time += time.perf_counter() - start
+                evaluations += 1
+                legal_moves = engine.get_legal_moves(engine.current_player)
+                if not legal_moves:
+                    break
+                engine.make_move(rng.choice(legal_moves))
+        total_nodes, search_time = 0, 0.0
+        for fen in BENCH_FENS:
+            engine = ChessEngine(fen)
+            engine.set_network(network if use_network else None)
+            _, elapsed = _quiet_search(engine, max_depth=depth)
+            total_nodes += search.nodes_searched + search.q_nodes_searched
+            search_time += elapsed
+        results[label] = (evaluations / eval_time, total_nodes / search_time)
+        print(f"{label:<9}{evaluations / eval_time:>10.0f} valutazioni/s{total_nodes / search_time:>10.0f} nodi/s (depth {depth})")
+    print(f"nnue/classica: valutazioni {results['nnue'][0] / results['classica'][0]:.2f}x, nodi/s {results['nnue'][1] / results['classica'][1]:.2f}x")
+    return results
+
+def bench_batch(positions=200000, playouts=500):
+    """
+    Posizioni al secondo di batch_eval.evaluate_batch (codifica FEN e valutazione separate)
+    contro evaluate_board una posizione alla volta, sulle posizioni di random playout da
+    BENCH_FENS ripetute fino a positions.
+    """
+    if not batch_eval.NUMPY_AVAILABLE:
+        print("evaluate_batch non disponibile: NumPy non è installato", file=sys.stderr)
+        return None
+    import random
+    rng = random.Random(0)
+    fens = []
+    for playout in range(playouts):
+        engine = ChessEngine(BENCH_FENS[playout % len(BENCH_FENS)])
+        for _ in range(rng.randrange(100)):
+            legal_moves = engine.get_legal_moves(engine.current_player)
+            if not legal_moves:
+                break
+            engine.make_move(rng.choice(legal_moves))
+        fens.append(engine.get_fen())
+    engines = [ChessEngine(fen) for fen in fens]
+    start = time.perf_counter()
+    for engine in engines:
+        evaluation.evaluate_board(engine.squares, engine.current_player)
+    scalar_rate = len(engines) / (time.perf_counter() - start)
+    fens = (fens * (positions // len(fens) + 1))[:positions]
+    start = time.perf_counter()
+    boards, white_to_move = batch_eval.encode_positions(fens)
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_eval.evaluate_encoded(boards, white_to_move)
+    eval_time = time.perf_counter() - start
+    print(f"evaluate_board  {scalar_rate:>10.0f} posizioni/s")
+    print(f"evaluate_batch  {len(fens) / eval_time:>10.0f} posizioni/s (codifica FEN {len(fens) / encode_time:.0f} posizioni/s, "
+          f"totale {len(fens) / (encode_time + eval_time):.0f})")
+    return scalar_rate, len(fens) / eval_time
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "overrun"
+    if command == "overrun":
+        move_times = tuple(int(arg) for arg in sys.argv[2:]) or (50, 100, 250, 500, 1000)
+        bench_overrun(move_times)
+    elif command == "smp":
+        depth = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        worker_counts = tuple(int(arg) for arg in sys.argv[3:]) or (1, 2, 4, 8)
+        bench_smp(depth, worker_counts)
+    elif command == "lazy":
+        bench_lazy(int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    elif command == "nnue":
+        bench_nnue(int(sys.argv[2]) if len(sys.argv) > 2 else 4)
+    elif command == "batch":
+        bench_batch(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    else:
+        print(f"Benchmark sconosciuto: {command}", file=sys.stderr)
+        sys.exit(1)
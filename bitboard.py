@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Tabelle e funzioni di supporto per la rappresentazione a bitboard.
+# Tutte le tabelle (attacchi, case tra due case, maschere per pedoni e re) sono calcolate
+# una volta all'import: movegen, scacchi, SEE e valutazione fanno solo lookup.
+# Convenzione case: indice = riga * 8 + colonna, con riga 0 = traversa 8 (a8 = 0, h1 = 63),
+# la stessa usata dalle PST e dalla history heuristic.
+
+FULL_BOARD = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL_BOARD ^ FILE_A
+NOT_FILE_H = FULL_BOARD ^ FILE_H
+ROW_MASKS = [0xFF << (8 * r) for r in range(8)] # ROW_MASKS[0] = traversa 8
+
+WHITE = 0 # Indici colore per occupancy e tabelle pedoni
+BLACK = 1
+
+SQUARE_BB = [1 << sq for sq in range(64)]
+
+def lsb_index(bb):
+    """Indice del bit meno significativo (bb deve essere != 0)."""
+    return (bb & -bb).bit_length() - 1
+
+def iter_squares(bb):
+    """Itera sugli indici delle case occupate in una bitboard."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+def _step_mask(deltas):
+    """Costruisce per ogni casa la maschera delle destinazioni a un passo (cavallo/re)."""
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        mask = 0
+        for dr, dc in deltas:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < 8 and 0 <= nc < 8:
+                mask |= 1 << (nr * 8 + nc)
+        table.append(mask)
+    return table
+
+KNIGHT_ATTACKS = _step_mask([(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _step_mask([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+# PAWN_ATTACKS[colore][casa] = case attaccate da un pedone di quel colore sulla casa
+PAWN_ATTACKS = [_step_mask([(-1, -1), (-1, 1)]), _step_mask([(1, -1), (1, 1)])]
+
+# --- Attacchi dei pezzi scorrevoli (indicizzati per occupancy della linea) ---
+# Per ogni casa e per ognuna delle 4 linee (traversa, colonna, diagonale, antidiagonale)
+# si precalcola un dizionario {occupancy rilevante della linea -> attacchi lungo la linea}.
+# La maschera rilevante esclude le case estreme della linea: un pezzo lì non blocca nulla.
+# Come per le rotated bitboards, rook = traversa | colonna e bishop = diagonale | antidiagonale,
+# ma la chiave è direttamente "occ & maschera" invece della bitboard ruotata.
+
+_LINE_DIRECTIONS = [
+    ((0, -1), (0, 1)),   # Traversa
+    ((-1, 0), (1, 0)),   # Colonna
+    ((-1, -1), (1, 1)),  # Diagonale a8-h1
+    ((-1, 1), (1, -1)),  # Antidiagonale h8-a1
+]
+
+def _ray_squares(sq, dr, dc):
+    """Case lungo un raggio a partire da sq (esclusa)."""
+    r, c = divmod(sq, 8)
+    squares = []
+    r += dr; c += dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        squares.append(r * 8 + c)
+        r += dr; c += dc
+    return squares
+
+def _build_line_tables():
+    masks = [[0] * 64 for _ in range(4)]
+    attacks = [[None] * 64 for _ in range(4)]
+    for line, directions in enumerate(_LINE_DIRECTIONS):
+        for sq in range(64):
+            rays = [_ray_squares(sq, dr, dc) for dr, dc in directions]
+            relevant = 0
+            for ray in rays:
+                for s in ray[:-1]: # Ultima casa del raggio non rilevante
+                    relevant |= 1 << s
+            table = {}
+            subset = 0
+            while True: # Enumerazione sottoinsiemi (Carry-Rippler)
+                att = 0
+                for ray in rays:
+                    for s in ray:
+                        att |= 1 << s
+                        if subset & (1 << s): break
+                table[subset] = att
+                subset = (subset - relevant) & relevant
+                if subset == 0: break
+            masks[line][sq] = relevant
+            attacks[line][sq] = table
+    return masks, attacks
+
+(RANK_MASKS, FILE_MASKS, DIAG_MASKS, ANTI_MASKS), \
+(RANK_ATTACKS, FILE_ATTACKS, DIAG_ATTACKS, ANTI_ATTACKS) = _build_line_tables()
+
+def rook_attacks(sq, occupied):
+    """Case attaccate da una torre su sq data l'occupancy totale."""
+    return RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+
+def bishop_attacks(sq, occupied):
+    """Case attaccate da un alfiere su sq data l'occupancy totale."""
+    return DIAG_ATTACKS[sq][occupied & DIAG_MASKS[sq]] | ANTI_ATTACKS[sq][occupied & ANTI_MASKS[sq]]
+
+def queen_attacks(sq, occupied):
+    """Case attaccate da una donna su sq data l'occupancy totale."""
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+# --- Tabelle tra coppie di case (pin e scacchi) ---
+# BETWEEN_BB[a][b]: case strettamente tra a e b se allineate (traversa/colonna/diagonale), altrimenti 0.
+# LINE_BB[a][b]: l'intera linea che passa per a e b (estremi inclusi), altrimenti 0.
+def _build_pair_tables():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for directions in _LINE_DIRECTIONS:
+        for a in range(64):
+            full_line = 1 << a
+            for dr, dc in directions:
+                for s in _ray_squares(a, dr, dc):
+                    full_line |= 1 << s
+            for dr, dc in directions:
+                path = 0
+                for s in _ray_squares(a, dr, dc):
+                    between[a][s] = path
+                    line[a][s] = full_line
+                    path |= 1 << s
+    return between, line
+
+BETWEEN_BB, LINE_BB = _build_pair_tables()
+
+# --- Tabelle per pedoni e re (struttura pedonale, sicurezza del re) ---
+# Case da cui un pedone di quel colore attacca sq = case attaccate da un pedone avversario su sq.
+PAWN_ATTACKER_ORIGINS = [PAWN_ATTACKS[BLACK], PAWN_ATTACKS[WHITE]]
+
+def _build_pawn_tables():
+    # "Avanti" per il bianco = righe di indice minore, per il nero = righe di indice maggiore
+    forward_file = [[0] * 64 for _ in range(2)]      # Stessa colonna, case davanti
+    passed_mask = [[0] * 64 for _ in range(2)]       # Colonna e adiacenti, case davanti
+    behind_adjacent = [[0] * 64 for _ in range(2)]   # Colonne adiacenti, case dietro (sostegno)
+    king_shield = [[0] * 64 for _ in range(2)]       # Riga davanti al re, colonne c-1..c+1
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        for color, ahead_rows, behind_rows in ((WHITE, range(0, r), range(r + 1, 8)),
+                                              (BLACK, range(r + 1, 8), range(0, r))):
+            for rr in ahead_rows:
+                forward_file[color][sq] |= 1 << (rr * 8 + c)
+                for cc in (c - 1, c, c + 1):
+                    if 0 <= cc < 8:
+                        passed_mask[color][sq] |= 1 << (rr * 8 + cc)
+            for rr in behind_rows:
+                for cc in (c - 1, c + 1):
+                    if 0 <= cc < 8:
+                        behind_adjacent[color][sq] |= 1 << (rr * 8 + cc)
+            shield_row = r - 1 if color == WHITE else r + 1
+            if 0 <= shield_row < 8:
+                for cc in (c - 1, c, c + 1):
+                    if 0 <= cc < 8:
+                        king_shield[color][sq] |= 1 << (shield_row * 8 + cc)
+    return forward_file, passed_mask, behind_adjacent, king_shield
+
+FORWARD_FILE_BB, PASSED_PAWN_MASK, BEHIND_ADJACENT_BB, KING_SHIELD_BB = _build_pawn_tables()
@@ -1,16 +1,18 @@
 # -*- coding: utf-8 -*-
 import sys
-import copy
 import time # Necessario per il timer interno? Forse no se spostato in search
-import random # Necessario per fallback in search? Forse no
-import os # Per Polyglot path
 
 # Importa i moduli creati
 import constants
 import move as m # Alias per evitare conflitti
+from move import MOVE_TABLE, TO_SHIFT, FROM_MASK, PROMOTION_SHIFT, PROMOTION_MASK, CASTLE_FLAG
 import pst
+from tt import TranspositionTable
 import evaluation # Per chiamare evaluate_board (anche se ora è in search?) -> Manteniamo evaluate qui per ora
 import search # Per chiamare le funzioni di ricerca -> Le chiamate saranno da UCI/main
+from bitboard import (FULL_BOARD, NOT_FILE_A, NOT_FILE_H, ROW_MASKS, WHITE, BLACK,
+                      KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_ATTACKER_ORIGINS,
+                      BETWEEN_BB, LINE_BB, rook_attacks, bishop_attacks)
 
 # Import condizionale per Polyglot
 try:
@@ -27,17 +29,39 @@ class ChessEngine:
     def __init__(self, fen=constants.INITIAL_FEN):
         self.board = [['.' for _ in range(8)] for _ in range(8)]
         self.current_player = 'W'
-        self.castling_rights = {'W': {'K': True, 'Q': True}, 'B': {'k': True, 'q': True}}
+        self.castling = constants.CASTLE_ALL # Diritti di arrocco: maschera a 4 bit (constants.CASTLE_*)
         self.en_passant_target = None
         self.halfmove_clock = 0
         self.fullmove_number = 1
-        self.history = [] # Lista di dizionari per unmake
+        self._allocate_undo_stack() # Pile di undo per ply (vedi make_move)
         self.current_hash = 0
+        self.pawn_key = 0 # Hash Zobrist dei soli pedoni (chiave della pawn hash table)
+        self.material_key = 0 # Conteggi dei pezzi per codice (constants.MATERIAL_KEY_UNIT)
+        self.pst_score = 0 # Somma PST dei pezzi esclusi i re (vedi evaluation.pst_score_from_piece_squares)
+        # Valutazione NNUE opzionale (nnue.py): rete attiva e accumulatori per ply (indice undo_count)
+        self.network = None
+        self.accumulators = []
+
+        # Mailbox piatta: 64 codici interi (constants.PIECE_CODES), indice = r * 8 + c.
+        # Bitboard: una per codice pezzo (bianchi 1..6, neri 9..14) + occupancy per colore.
+        # self.board resta come vista [r][c] di caratteri per chi la legge ancora (SEE, test).
+        self.squares = bytearray(64)
+        self.bitboards = [0] * 15
+        self.occupancy = [0, 0] # [bianco, nero]
+        self.occupied = 0
+        # Insiemi delle case occupate per codice pezzo e case dei due re, aggiornati
+        # incrementalmente: movegen, scacco e valutazione iterano solo sui pezzi presenti.
+        self.piece_squares = [set() for _ in range(15)]
+        self.king_squares = [-1, -1] # [bianco, nero], -1 se il re manca
 
         # Strutture dati per ricerca (gestite qui ma usate da search.py)
-        self.transposition_table = [None] * constants.TT_SIZE
+        self.transposition_table = TranspositionTable(constants.TT_SIZE_MB)
+        self.pawn_table = evaluation.PawnHashTable(constants.PAWN_HASH_SIZE)
+        self.eval_cache = evaluation.EvalCache(constants.EVAL_CACHE_SIZE)
+        self.material_table = evaluation.MaterialHashTable(constants.MATERIAL_HASH_SIZE)
         self.killer_moves = [[None, None] for _ in range(constants.MAX_SEARCH_PLY)]
-        self.history_heuristic = [[[0] * 64 for _ in range(64)] for _ in range(2)] # [color][from][to]
+        self.history_heuristic = [[0] * 4096 for _ in range(2)] # [color][from_to], indice = move & FROM_TO_MASK
+        self._empty_history = [0] * 4096 # Per azzerare la history in place (new_game)
 
         # Flag per libro Polyglot
         self.use_book = CHESS_POLYGLOT_AVAILABLE and constants.BOOK_PATH is not None
@@ -46,58 +70,116 @@ class ChessEngine:
         # Inizializza
         self.parse_fen(fen) # Questo calcolerà anche l'hash iniziale
 
+    def new_game(self):
+        """
+        UCI 'ucinewgame': posizione iniziale e strutture di ricerca azzerate senza riallocarle
+        (TT invecchiata in O(1), killer e history riscritte in place).
+        """
+        self.parse_fen(constants.INITIAL_FEN)
+        self.transposition_table.new_game()
+        for killers in self.killer_moves:
+            killers[0] = killers[1] = None
+        for history_color in self.history_heuristic:
+            history_color[:] = self._empty_history
+        self.play_book_move_on_go = None
+
     # --- Funzioni Ausiliarie Colore/Pezzo ---
     def get_piece_color(self, piece):
         if piece == '.': return None
         return 'W' if piece.isupper() else 'B'
 
+    # --- Gestione Mailbox/Bitboard ---
+    def _rebuild_piece_state(self):
+        """Ricalcola mailbox, bitboard, insiemi pezzi e occupancy a partire dalla vista self.board."""
+        self.squares = bytearray(64)
+        self.bitboards = [0] * 15
+        self.piece_squares = [set() for _ in range(15)]
+        self.king_squares = [-1, -1]
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '.':
+                    code = constants.PIECE_CODES[piece]
+                    self.squares[r * 8 + c] = code
+                    self.bitboards[code] |= 1 << (r * 8 + c)
+                    self.piece_squares[code].add(r * 8 + c)
+                    if code & constants.TYPE_MASK == constants.KING:
+                        self.king_squares[code >> 3] = r * 8 + c
+        white = 0
+        black = 0
+        for piece_type in range(constants.PAWN, constants.KING + 1):
+            white |= self.bitboards[piece_type]
+            black |= self.bitboards[piece_type | constants.BLACK_FLAG]
+        self.occupancy = [white, black]
+        self.occupied = white | black
+
+    def _add_piece(self, code, sq):
+        """Mette il pezzo code sulla casa vuota sq (mailbox, bitboard, insiemi e vista board)."""
+        self.squares[sq] = code
+        self.board[sq >> 3][sq & 7] = constants.CODE_TO_CHAR[code]
+        bit = 1 << sq
+        self.bitboards[code] |= bit
+        self.occupancy[code >> 3] |= bit
+        self.occupied |= bit
+        self.piece_squares[code].add(sq)
+        if code & constants.TYPE_MASK == constants.KING:
+            self.king_squares[code >> 3] = sq
+
+    def _remove_piece(self, code, sq):
+        """Toglie il pezzo code dalla casa sq (mailbox, bitboard, insiemi e vista board)."""
+        self.squares[sq] = constants.EMPTY
+        self.board[sq >> 3][sq & 7] = '.'
+        bit = 1 << sq
+        self.bitboards[code] ^= bit
+        self.occupancy[code >> 3] ^= bit
+        self.occupied ^= bit
+        self.piece_squares[code].discard(sq)
+        # king_squares non si azzera: il re viene rimesso subito dopo (mossa o unmake)
+
     # --- Gestione Hash Zobrist ---
     def calculate_zobrist_hash(self):
         """Calcola l'hash Zobrist completo per la posizione corrente."""
         h = 0
         # Pezzi
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                if piece != '.':
-                    piece_index = constants.PIECE_TO_ZOBRIST_INDEX[piece]
-                    h ^= constants.ZOBRIST_PIECES[r][c][piece_index]
+        zobrist = constants.ZOBRIST_BY_CODE
+        for sq, code in enumerate(self.squares):
+            if code:
+                h ^= zobrist[code][sq]
         # Turno
         if self.current_player == 'B':
             h ^= constants.ZOBRIST_SIDE
-        # Arrocco
-        castling_index = 0
-        if self.castling_rights['W']['K']: castling_index |= 1
-        if self.castling_rights['W']['Q']: castling_index |= 2
-        if self.castling_rights['B']['k']: castling_index |= 4
-        if self.castling_rights['B']['q']: castling_index |= 8
-        h ^= constants.ZOBRIST_CASTLING[castling_index]
+        # Arrocco (la maschera dei diritti è direttamente l'indice)
+        h ^= constants.ZOBRIST_CASTLING[self.castling]
         # En Passant
         if self.en_passant_target is not None:
             ep_col = self.en_passant_target[1]
             h ^= constants.ZOBRIST_EP_FILE[ep_col]
         return h
 
-    def _update_hash_piece(self, current_hash, piece, r, c):
+    def calculate_pawn_key(self):
+        """Calcola da zero la chiave dei pedoni (stesse chiavi Zobrist dei pedoni nell'hash completo)."""
+        zobrist = constants.ZOBRIST_BY_CODE
+        key = 0
+        for code in (constants.WHITE_PAWN, constants.BLACK_PAWN):
+            for sq in self.piece_squares[code]:
+                key ^= zobrist[code][sq]
+        return key
+
+    def calculate_material_key(self):
+        """Calcola da zero la chiave materiale (un contatore di MATERIAL_KEY_BITS bit per codice pezzo)."""
+        return evaluation.material_key_from_piece_squares(self.piece_squares)
+
+    def calculate_pst_score(self):
+        """Calcola da zero la somma PST dei pezzi esclusi i re."""
+        return evaluation.pst_score_from_piece_squares(self.piece_squares)
+
+    def _update_hash_piece(self, current_hash, code, sq):
         """Aggiorna hash per aggiunta/rimozione pezzo."""
-        if piece != '.':
-             piece_index = constants.PIECE_TO_ZOBRIST_INDEX[piece]
-             return current_hash ^ constants.ZOBRIST_PIECES[r][c][piece_index]
-        return current_hash
+        return current_hash ^ constants.ZOBRIST_BY_CODE[code][sq] # Riga di zeri per EMPTY
 
-    def _update_hash_castling(self, current_hash, old_rights_tuple, new_rights_tuple):
-        """Aggiorna hash per cambio diritti arrocco."""
-        old_index = 0
-        if old_rights_tuple[0]: old_index |= 1 # WK
-        if old_rights_tuple[1]: old_index |= 2 # WQ
-        if old_rights_tuple[2]: old_index |= 4 # BK
-        if old_rights_tuple[3]: old_index |= 8 # BQ
-        new_index = 0
-        if new_rights_tuple[0]: new_index |= 1 # WK
-        if new_rights_tuple[1]: new_index |= 2 # WQ
-        if new_rights_tuple[2]: new_index |= 4 # BK
-        if new_rights_tuple[3]: new_index |= 8 # BQ
-        return current_hash ^ constants.ZOBRIST_CASTLING[old_index] ^ constants.ZOBRIST_CASTLING[new_index]
+    def _update_hash_castling(self, current_hash, old_castling, new_castling):
+        """Aggiorna hash per cambio diritti arrocco (maschere a 4 bit)."""
+        return current_hash ^ constants.ZOBRIST_CASTLING[old_castling] ^ constants.ZOBRIST_CASTLING[new_castling]
 
     def _update_hash_ep(self, current_hash, old_ep_target, new_ep_target):
         """Aggiorna hash per cambio target en passant."""
@@ -126,10 +208,9 @@ class ChessEngine:
 
             self.current_player = parts[1].upper()
             castling = parts[2]
-            self.castling_rights = {
-                'W': {'K': 'K' in castling, 'Q': 'Q' in castling},
-                'B': {'k': 'k' in castling, 'q': 'q' in castling}
-            }
+            self.castling = 0
+            for right, char in constants.CASTLING_FEN_CHARS:
+                if char in castling: self.castling |= right
             ep_square = parts[3]
             if ep_square != '-':
                 ep_col = ord(ep_square[0]) - ord('a')
@@ -144,8 +225,14 @@ class ChessEngine:
 
             self.halfmove_clock = int(parts[4])
             self.fullmove_number = int(parts[5])
-            self.history = [] # Resetta history quando imposti nuova posizione
+            self.undo_count = 0 # Resetta le pile di undo quando imposti nuova posizione
+            self._rebuild_piece_state()
             self.current_hash = self.calculate_zobrist_hash() # Calcola hash iniziale
+            self.pawn_key = self.calculate_pawn_key()
+            self.material_key = self.calculate_material_key()
+            self.pst_score = self.calculate_pst_score()
+            if self.network is not None:
+                self.accumulators = [self.network.refresh(self.piece_squares)]
             # Resetta anche TT e altre strutture di ricerca? Dipende dal comando UCI (ucinewgame vs position)
             # Lo gestiamo nel loop UCI. Qui parse_fen imposta solo lo stato.
 
@@ -169,13 +256,13 @@ class ChessEngine:
                 return None # Coordinate fuori scacchiera
 
             # Verifica se è arrocco
-            piece = self.board[start_row][start_col]
+            piece = self.squares[start_row * 8 + start_col]
             is_castle = False
-            if piece.lower() == 'k' and abs(start_col - end_col) == 2:
+            if piece & constants.TYPE_MASK == constants.KING and abs(start_col - end_col) == 2:
                 is_castle = True
 
             return m.Move(start_row, start_col, end_row, end_col, promotion_piece, is_castle)
-        except (ValueError, IndexError):
+        except (ValueError, IndexError, KeyError): # KeyError: pezzo di promozione non valido
             return None
 
     def get_fen(self):
@@ -194,12 +281,7 @@ class ChessEngine:
 
         fen += f" {self.current_player.lower()}" # Turno
 
-        castling_str = "" # Arrocco
-        if self.castling_rights['W']['K']: castling_str += 'K'
-        if self.castling_rights['W']['Q']: castling_str += 'Q'
-        if self.castling_rights['B']['k']: castling_str += 'k'
-        if self.castling_rights['B']['q']: castling_str += 'q'
-        fen += f" {castling_str if castling_str else '-'}"
+        fen += f" {self._castling_fen_part()}" # Arrocco
 
         # En Passant
         if self.en_passant_target:
@@ -211,314 +293,538 @@ class ChessEngine:
         fen += f" {self.halfmove_clock} {self.fullmove_number}"
         return fen
 
+    def _castling_fen_part(self):
+        """Campo arrocco della FEN ('-' se nessun diritto)."""
+        return "".join(char for right, char in constants.CASTLING_FEN_CHARS if self.castling & right) or "-"
+
     # --- Generazione Mosse ---
-    def _get_pawn_moves(self, r, c, color):
-        """Genera mosse pseudo-legali per un pedone."""
-        moves = []
-        direction = -1 if color == 'W' else 1
-        start_rank = 6 if color == 'W' else 1
-        promotion_rank = 0 if color == 'W' else 7
-
-        # Movimento avanti di uno
-        target_r, target_c = r + direction, c
-        if 0 <= target_r < 8 and self.board[target_r][target_c] == '.':
-            if target_r == promotion_rank: # Promozione
-                for promo in ['q', 'r', 'b', 'n']:
-                    moves.append(m.Move(r, c, target_r, target_c, promo))
+    def _append_moves(self, moves, from_sq, targets):
+        """Aggiunge a moves una Move per ogni casa della bitboard targets (lookup in MOVE_TABLE)."""
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            moves.append(MOVE_TABLE[from_sq | ((low.bit_length() - 1) << TO_SHIFT)])
+
+    def _append_pawn_moves(self, moves, targets, offset, promotion_row_mask):
+        """Aggiunge le mosse di pedone verso targets; la casa di partenza è to_sq + offset."""
+        while targets:
+            low = targets & -targets
+            to_sq = low.bit_length() - 1
+            targets ^= low
+            code = (to_sq + offset) | (to_sq << TO_SHIFT)
+            if low & promotion_row_mask: # Promozione: q, r, b, n
+                for promotion_index in (4, 3, 2, 1):
+                    moves.append(MOVE_TABLE[code | (promotion_index << PROMOTION_SHIFT)])
             else:
-                moves.append(m.Move(r, c, target_r, target_c))
-
-            # Doppio passo iniziale (solo se il passo singolo era possibile)
-            if r == start_rank:
-                double_target_r = r + 2 * direction
-                # Non serve check 0 <= double_target_r < 8 perché promotion_rank lo impedisce
-                if self.board[double_target_r][c] == '.':
-                    moves.append(m.Move(r, c, double_target_r, c))
-
-        # Catture diagonali
-        for dc in [-1, 1]:
-            target_r, target_c = r + direction, c + dc
-            if 0 <= target_r < 8 and 0 <= target_c < 8:
-                target_piece = self.board[target_r][target_c]
-                target_color = self.get_piece_color(target_piece)
-
-                # Cattura normale
-                if target_color is not None and target_color != color:
-                    if target_r == promotion_rank: # Promozione con cattura
-                        for promo in ['q', 'r', 'b', 'n']:
-                            moves.append(m.Move(r, c, target_r, target_c, promo))
-                    else:
-                        moves.append(m.Move(r, c, target_r, target_c))
-                # Cattura en passant
-                elif (target_r, target_c) == self.en_passant_target:
-                    # Verifica aggiuntiva (opzionale): pedone sulla giusta traversa per EP?
-                    # (Il pedone attaccante deve essere sulla 5a traversa per il bianco, 4a per il nero)
-                    correct_ep_rank = 3 if color == 'W' else 4
-                    if r == correct_ep_rank:
-                        moves.append(m.Move(r, c, target_r, target_c)) # EP flag non serve qui, è implicito
+                moves.append(MOVE_TABLE[code])
+
+    def _get_pawn_moves(self, color, moves, pawns, target_mask=FULL_BOARD, tactical=True, quiet=True):
+        """
+        Aggiunge a moves le mosse dei pedoni in pawns (set-wise sulle bitboard), escluso l'en passant.
+        target_mask limita le case di arrivo (evasioni dallo scacco, linea di inchiodatura).
+        tactical = catture e promozioni, quiet = avanzate senza promozione.
+        """
+        side = WHITE if color == 'W' else BLACK
+        empty = ~self.occupied & FULL_BOARD
+        enemies = self.occupancy[side ^ 1] & target_mask
+
+        if side == WHITE: # Il bianco avanza verso la riga 0 (indici decrescenti)
+            single = (pawns >> 8) & empty
+            double = ((single & ROW_MASKS[5]) >> 8) & empty # Doppio passo solo se il singolo era possibile
+            captures_left = ((pawns & NOT_FILE_A) >> 9) & enemies
+            captures_right = ((pawns & NOT_FILE_H) >> 7) & enemies
+            push, left, right = 8, 9, 7
+            promotion_row_mask = ROW_MASKS[0]
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & ROW_MASKS[2]) << 8) & empty
+            captures_left = ((pawns & NOT_FILE_A) << 7) & enemies
+            captures_right = ((pawns & NOT_FILE_H) << 9) & enemies
+            push, left, right = -8, -7, -9
+            promotion_row_mask = ROW_MASKS[7]
+
+        single &= target_mask
+        if tactical:
+            self._append_pawn_moves(moves, captures_left, left, promotion_row_mask)
+            self._append_pawn_moves(moves, captures_right, right, promotion_row_mask)
+            self._append_pawn_moves(moves, single & promotion_row_mask, push, promotion_row_mask)
+        if quiet:
+            self._append_pawn_moves(moves, single & ~promotion_row_mask, push, 0)
+            self._append_pawn_moves(moves, double & target_mask, 2 * push, 0)
         return moves
 
-    def _get_knight_moves(self, r, c):
-        """Genera mosse pseudo-legali per un cavallo."""
+    def _get_en_passant_moves(self, side, pawns):
+        """Catture en passant pseudo-legali dei pedoni in pawns."""
         moves = []
-        knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-        current_color = self.get_piece_color(self.board[r][c]) # Determina colore una volta
-        for dr, dc in knight_moves:
-            target_r, target_c = r + dr, c + dc
-            if 0 <= target_r < 8 and 0 <= target_c < 8:
-                target_piece = self.board[target_r][target_c]
-                target_color = self.get_piece_color(target_piece)
-                if target_color != current_color: # Cattura o casa vuota
-                    moves.append(m.Move(r, c, target_r, target_c))
+        if self.en_passant_target is not None:
+            ep_r, ep_c = self.en_passant_target
+            ep_sq = ep_r * 8 + ep_c
+            attackers = PAWN_ATTACKER_ORIGINS[side][ep_sq] & pawns
+            while attackers:
+                low = attackers & -attackers
+                attackers ^= low
+                moves.append(MOVE_TABLE[(low.bit_length() - 1) | (ep_sq << TO_SHIFT)]) # EP flag non serve qui, è implicito
         return moves
 
-    def _get_sliding_moves(self, r, c, directions):
-        """Genera mosse pseudo-legali per pezzi scorrevoli (B, R, Q)."""
+    def _get_castling_moves(self, color):
+        """Genera gli arrocchi (da chiamare solo se color non è sotto scacco)."""
         moves = []
-        current_color = self.get_piece_color(self.board[r][c])
-        for dr, dc in directions:
-            for i in range(1, 8):
-                target_r, target_c = r + i * dr, c + i * dc
-                if not (0 <= target_r < 8 and 0 <= target_c < 8): break # Fuori scacchiera
-
-                target_piece = self.board[target_r][target_c]
-                if target_piece == '.': # Casa vuota
-                    moves.append(m.Move(r, c, target_r, target_c))
-                else: # Casa occupata
-                    target_color = self.get_piece_color(target_piece)
-                    if target_color != current_color: # Cattura
-                        moves.append(m.Move(r, c, target_r, target_c))
-                    break # Blocca sliding (amico o nemico)
+        opponent_color = 'B' if color == 'W' else 'W'
+        occupied = self.occupied
+        if color == 'W':
+            # Arrocco Corto (Kingside): f1, g1 liberi
+            if self.castling & constants.CASTLE_WK and \
+               not occupied & ((1 << 61) | (1 << 62)) and \
+               not self.is_square_attacked(7, 5, opponent_color) and \
+               not self.is_square_attacked(7, 6, opponent_color):
+                # Nota: is_square_attacked(7, 4) è già coperto dal controllo dello scacco
+                moves.append(MOVE_TABLE[60 | (62 << TO_SHIFT) | CASTLE_FLAG]) # e1g1
+            # Arrocco Lungo (Queenside): b1, c1, d1 liberi
+            if self.castling & constants.CASTLE_WQ and \
+               not occupied & ((1 << 57) | (1 << 58) | (1 << 59)) and \
+               not self.is_square_attacked(7, 3, opponent_color) and \
+               not self.is_square_attacked(7, 2, opponent_color):
+                moves.append(MOVE_TABLE[60 | (58 << TO_SHIFT) | CASTLE_FLAG]) # e1c1
+        else: # color == 'B'
+            # Arrocco Corto (Kingside): f8, g8 liberi
+            if self.castling & constants.CASTLE_BK and \
+               not occupied & ((1 << 5) | (1 << 6)) and \
+               not self.is_square_attacked(0, 5, opponent_color) and \
+               not self.is_square_attacked(0, 6, opponent_color):
+                moves.append(MOVE_TABLE[4 | (6 << TO_SHIFT) | CASTLE_FLAG]) # e8g8
+            # Arrocco Lungo (Queenside): b8, c8, d8 liberi
+            if self.castling & constants.CASTLE_BQ and \
+               not occupied & ((1 << 1) | (1 << 2) | (1 << 3)) and \
+               not self.is_square_attacked(0, 3, opponent_color) and \
+               not self.is_square_attacked(0, 2, opponent_color):
+                moves.append(MOVE_TABLE[4 | (2 << TO_SHIFT) | CASTLE_FLAG]) # e8c8
         return moves
 
     def _get_king_moves(self, r, c, color):
         """Genera mosse pseudo-legali per il Re (incluso arrocco)."""
         moves = []
-        king_moves = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+        side = WHITE if color == 'W' else BLACK
         # Mosse normali
-        for dr, dc in king_moves:
-            target_r, target_c = r + dr, c + dc
-            if 0 <= target_r < 8 and 0 <= target_c < 8:
-                target_piece = self.board[target_r][target_c]
-                target_color = self.get_piece_color(target_piece)
-                if target_color != color:
-                    moves.append(m.Move(r, c, target_r, target_c))
+        self._append_moves(moves, r * 8 + c, KING_ATTACKS[r * 8 + c] & ~self.occupancy[side])
 
         # Arrocco (condizioni base)
         if not self.is_in_check(color): # Non si può arroccare sotto scacco
-            opponent_color = 'B' if color == 'W' else 'W'
-            if color == 'W':
-                # Arrocco Corto (Kingside)
-                if self.castling_rights['W']['K'] and \
-                   self.board[7][5] == '.' and self.board[7][6] == '.' and \
-                   not self.is_square_attacked(7, 5, opponent_color) and \
-                   not self.is_square_attacked(7, 6, opponent_color):
-                    # Nota: is_square_attacked(7, 4) è già coperto da not is_in_check
-                    moves.append(m.Move(7, 4, 7, 6, is_castle=True))
-                # Arrocco Lungo (Queenside)
-                if self.castling_rights['W']['Q'] and \
-                   self.board[7][1] == '.' and self.board[7][2] == '.' and self.board[7][3] == '.' and \
-                   not self.is_square_attacked(7, 3, opponent_color) and \
-                   not self.is_square_attacked(7, 2, opponent_color):
-                    moves.append(m.Move(7, 4, 7, 2, is_castle=True))
-            else: # color == 'B'
-                 # Arrocco Corto (Kingside)
-                if self.castling_rights['B']['k'] and \
-                   self.board[0][5] == '.' and self.board[0][6] == '.' and \
-                   not self.is_square_attacked(0, 5, opponent_color) and \
-                   not self.is_square_attacked(0, 6, opponent_color):
-                    moves.append(m.Move(0, 4, 0, 6, is_castle=True))
-                # Arrocco Lungo (Queenside)
-                if self.castling_rights['B']['q'] and \
-                    self.board[0][1] == '.' and self.board[0][2] == '.' and self.board[0][3] == '.' and \
-                    not self.is_square_attacked(0, 3, opponent_color) and \
-                    not self.is_square_attacked(0, 2, opponent_color):
-                    moves.append(m.Move(0, 4, 0, 2, is_castle=True))
+            moves.extend(self._get_castling_moves(color))
         return moves
 
     def get_pseudo_legal_moves(self, player_color):
         """Genera tutte le mosse pseudo-legali per il giocatore."""
-        moves = []
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                color = self.get_piece_color(piece)
-                if color == player_color:
-                    piece_type = piece.lower()
-                    if piece_type == 'p': moves.extend(self._get_pawn_moves(r, c, color))
-                    elif piece_type == 'n': moves.extend(self._get_knight_moves(r, c))
-                    elif piece_type == 'b': moves.extend(self._get_sliding_moves(r, c, [(-1, -1), (-1, 1), (1, -1), (1, 1)]))
-                    elif piece_type == 'r': moves.extend(self._get_sliding_moves(r, c, [(-1, 0), (1, 0), (0, -1), (0, 1)]))
-                    elif piece_type == 'q': moves.extend(self._get_sliding_moves(r, c, [(-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (1, 0), (0, -1), (0, 1)]))
-                    elif piece_type == 'k': moves.extend(self._get_king_moves(r, c, color))
+        side = WHITE if player_color == 'W' else BLACK
+        base = 8 * side # Codice "colore" da combinare con il tipo di pezzo
+        piece_squares = self.piece_squares
+        occupied = self.occupied
+        not_own = ~self.occupancy[side] & FULL_BOARD
+
+        pawns = self.bitboards[base | constants.PAWN]
+        moves = self._get_pawn_moves(player_color, [], pawns)
+        moves.extend(self._get_en_passant_moves(side, pawns))
+        for sq in piece_squares[base | constants.KNIGHT]:
+            self._append_moves(moves, sq, KNIGHT_ATTACKS[sq] & not_own)
+        for sq in piece_squares[base | constants.BISHOP]:
+            self._append_moves(moves, sq, bishop_attacks(sq, occupied) & not_own)
+        for sq in piece_squares[base | constants.ROOK]:
+            self._append_moves(moves, sq, rook_attacks(sq, occupied) & not_own)
+        for sq in piece_squares[base | constants.QUEEN]:
+            self._append_moves(moves, sq, (rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)) & not_own)
+        king_sq = self.king_squares[side]
+        if king_sq >= 0:
+            moves.extend(self._get_king_moves(king_sq >> 3, king_sq & 7, player_color))
         return moves
 
+    def _attackers_to(self, sq, attacker_side, occupied):
+        """Bitboard dei pezzi di attacker_side che attaccano sq, con occupancy data."""
+        base = 8 * attacker_side
+        bitboards = self.bitboards
+        queens = bitboards[base | constants.QUEEN]
+        return ((PAWN_ATTACKER_ORIGINS[attacker_side][sq] & bitboards[base | constants.PAWN]) |
+                (KNIGHT_ATTACKS[sq] & bitboards[base | constants.KNIGHT]) |
+                (KING_ATTACKS[sq] & bitboards[base | constants.KING]) |
+                (bishop_attacks(sq, occupied) & (bitboards[base | constants.BISHOP] | queens)) |
+                (rook_attacks(sq, occupied) & (bitboards[base | constants.ROOK] | queens)))
+
     def is_square_attacked(self, r, c, attacker_color):
         """Controlla se la casa (r, c) è attaccata da attacker_color."""
-        # Attacchi Pedone
-        pawn_direction = 1 if attacker_color == 'W' else -1
-        expected_pawn = 'P' if attacker_color == 'W' else 'p'
-        for dc in [-1, 1]:
-            pr, pc = r + pawn_direction, c + dc # Pedone attaccante sarebbe QUI
-            if 0 <= pr < 8 and 0 <= pc < 8 and self.board[pr][pc] == expected_pawn:
-                return True
-
-        # Attacchi Cavallo
-        knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-        expected_knight = 'N' if attacker_color == 'W' else 'n'
-        for dr, dc in knight_moves:
-            nr, nc = r + dr, c + dc
-            if 0 <= nr < 8 and 0 <= nc < 8 and self.board[nr][nc] == expected_knight: return True
-
+        sq = r * 8 + c
+        attacker_side = WHITE if attacker_color == 'W' else BLACK
+        base = 8 * attacker_side
+        bitboards = self.bitboards
+        if PAWN_ATTACKER_ORIGINS[attacker_side][sq] & bitboards[base | constants.PAWN]: return True
+        if KNIGHT_ATTACKS[sq] & bitboards[base | constants.KNIGHT]: return True
+        if KING_ATTACKS[sq] & bitboards[base | constants.KING]: return True
+        queens = bitboards[base | constants.QUEEN]
+        occupied = self.occupied
         # Attacchi Scorrevoli (B, R, Q)
-        piece_checks = [
-            ('b', [(-1, -1), (-1, 1), (1, -1), (1, 1)]),
-            ('r', [(-1, 0), (1, 0), (0, -1), (0, 1)]),
-        ]
-        expected_queen = 'Q' if attacker_color == 'W' else 'q'
-        for p_type, directions in piece_checks:
-            expected_piece = p_type.upper() if attacker_color == 'W' else p_type
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    sr, sc = r + i * dr, c + i * dc
-                    if not (0 <= sr < 8 and 0 <= sc < 8): break
-                    piece = self.board[sr][sc]
-                    if piece != '.':
-                        if piece == expected_piece or piece == expected_queen: return True
-                        break # Pezzo bloccante
-
-        # Attacchi Re
-        king_moves = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        expected_king = 'K' if attacker_color == 'W' else 'k'
-        for dr, dc in king_moves:
-            kr, kc = r + dr, c + dc
-            if 0 <= kr < 8 and 0 <= kc < 8 and self.board[kr][kc] == expected_king: return True
-
+        if bishop_attacks(sq, occupied) & (bitboards[base | constants.BISHOP] | queens): return True
+        if rook_attacks(sq, occupied) & (bitboards[base | constants.ROOK] | queens): return True
         return False
 
     def is_in_check(self, player_color):
         """Controlla se player_color è sotto scacco."""
-        king_char = 'K' if player_color == 'W' else 'k'
-        king_pos = None
-        for r in range(8):
-            for c in range(8):
-                if self.board[r][c] == king_char: king_pos = (r, c); break
-            if king_pos: break
-        if not king_pos: return False # Dovrebbe essere impossibile
-
+        king_sq = self.king_squares[WHITE if player_color == 'W' else BLACK]
+        if king_sq < 0: return False # Dovrebbe essere impossibile
         opponent_color = 'B' if player_color == 'W' else 'W'
-        return self.is_square_attacked(king_pos[0], king_pos[1], opponent_color)
+        return self.is_square_attacked(king_sq >> 3, king_sq & 7, opponent_color)
+
+    def gives_check(self, move_obj):
+        """
+        True se la mossa (del lato al tratto) dà scacco, senza eseguirla.
+        Scacchi diretti del pezzo mosso o promosso, scacchi di scoperta dei pezzi scorrevoli
+        (solo se la casa di partenza o di arrivo è sulla linea precalcolata del re avversario),
+        più i casi speciali: torre dell'arrocco e pedone catturato en passant.
+        """
+        from_sq = move_obj & FROM_MASK
+        to_sq = (move_obj >> TO_SHIFT) & FROM_MASK
+        piece = self.squares[from_sq]
+        color_flag = piece & constants.BLACK_FLAG
+        side = color_flag >> 3
+        king_sq = self.king_squares[side ^ 1]
+        if king_sq < 0: return False
+        promotion_index = move_obj >> PROMOTION_SHIFT & PROMOTION_MASK
+        # Indici di promozione 1..4 = n, b, r, q: il tipo del pezzo promosso è indice + 1
+        piece_type = promotion_index + 1 if promotion_index else piece & constants.TYPE_MASK
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+
+        # Scacchi diretti di pedone e cavallo
+        if piece_type == constants.PAWN:
+            if PAWN_ATTACKS[side][to_sq] & (1 << king_sq): return True
+        elif piece_type == constants.KNIGHT:
+            if KNIGHT_ATTACKS[to_sq] & (1 << king_sq): return True
+
+        # Pezzi scorrevoli del lato che muove e occupancy dopo la mossa
+        bitboards = self.bitboards
+        queens = bitboards[color_flag | constants.QUEEN]
+        diagonal = (bitboards[color_flag | constants.BISHOP] | queens) & ~from_bit
+        straight = (bitboards[color_flag | constants.ROOK] | queens) & ~from_bit
+        if piece_type == constants.BISHOP or piece_type == constants.QUEEN: diagonal |= to_bit
+        if piece_type == constants.ROOK or piece_type == constants.QUEEN: straight |= to_bit
+        occupied = (self.occupied & ~from_bit) | to_bit
+
+        if move_obj & CASTLE_FLAG: # La torre attraversa il re: può dare scacco dalla sua nuova casa
+            rook_start_sq, rook_end_sq = self._castle_rook_squares(from_sq, to_sq)
+            rook_bits = (1 << rook_start_sq) | (1 << rook_end_sq)
+            occupied ^= rook_bits
+            straight ^= rook_bits
+        elif piece_type == constants.PAWN and not self.squares[to_sq] and from_sq & 7 != to_sq & 7:
+            occupied &= ~(1 << ((from_sq & 56) | (to_sq & 7))) # En passant: sparisce anche il pedone catturato
+        elif not (LINE_BB[king_sq][from_sq] | LINE_BB[king_sq][to_sq]):
+            return False # Né la casa lasciata né quella raggiunta sono allineate col re
+
+        return bool((bishop_attacks(king_sq, occupied) & diagonal) or (rook_attacks(king_sq, occupied) & straight))
+
+    def _get_pinned_pieces(self, side, king_sq):
+        """Bitboard dei pezzi di side inchiodati sul proprio re da un pezzo scorrevole avversario."""
+        enemy_base = 8 * (side ^ 1)
+        bitboards = self.bitboards
+        enemy_queens = bitboards[enemy_base | constants.QUEEN]
+        # Pezzi scorrevoli avversari allineati col re su scacchiera vuota
+        snipers = ((bishop_attacks(king_sq, 0) & (bitboards[enemy_base | constants.BISHOP] | enemy_queens)) |
+                   (rook_attacks(king_sq, 0) & (bitboards[enemy_base | constants.ROOK] | enemy_queens)))
+        occupied = self.occupied
+        own = self.occupancy[side]
+        pinned = 0
+        while snipers:
+            low = snipers & -snipers
+            snipers ^= low
+            blockers = BETWEEN_BB[king_sq][low.bit_length() - 1] & occupied
+            # Inchiodato = unico pezzo tra re e attaccante, ed è nostro
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+        return pinned
 
     def get_legal_moves(self, player_color):
-        """Genera mosse legali filtrando le pseudo-legali."""
-        pseudo_legal_moves = self.get_pseudo_legal_moves(player_color)
-        legal_moves = []
-        # Salva stato PRIMA del loop
-        original_state = self.get_state_snapshot()
+        """Genera direttamente tutte le mosse legali (vedi _generate_legal_moves)."""
+        return self._generate_legal_moves(player_color)
+
+    def _generate_legal_moves(self, player_color, tactical=True, quiet=True):
+        """
+        Genera direttamente le mosse legali.
+        Scacchi e pezzi inchiodati vengono calcolati una volta per nodo: le mosse normali sono
+        limitate alle case che parano lo scacco e alla linea di inchiodatura, le mosse del re
+        controllano la casa d'arrivo senza il re sulla scacchiera. Solo l'en passant (pin
+        orizzontali dopo la doppia rimozione) viene verificato con make/unmake.
+        tactical = catture (incluso en passant) e promozioni, quiet = tutte le altre (incluso arrocco):
+        il move picker della ricerca genera i due gruppi in fasi separate.
+        """
+        side = WHITE if player_color == 'W' else BLACK
+        king_sq = self.king_squares[side]
+        if king_sq < 0: # Posizione senza re (solo da FEN anomale): filtro con make/unmake
+            moves = self._filter_legal_moves(player_color, self.get_pseudo_legal_moves(player_color))
+            return [mv for mv in moves if (tactical if self.is_tactical_move(mv) else quiet)]
+
+        base = 8 * side
+        enemy_side = side ^ 1
+        piece_squares = self.piece_squares
+        occupied = self.occupied
+        own = self.occupancy[side]
+        moves = []
+        # Case di arrivo ammesse dal tipo di mosse richiesto
+        if tactical and quiet: kind_mask = ~own & FULL_BOARD
+        elif tactical: kind_mask = self.occupancy[enemy_side]
+        else: kind_mask = ~occupied & FULL_BOARD
+
+        # Mosse del re: la casa di arrivo non deve essere attaccata togliendo il re (raggi X)
+        occupied_without_king = occupied ^ (1 << king_sq)
+        king_targets = KING_ATTACKS[king_sq] & kind_mask
+        while king_targets:
+            low = king_targets & -king_targets
+            king_targets ^= low
+            to_sq = low.bit_length() - 1
+            if not self._attackers_to(to_sq, enemy_side, occupied_without_king):
+                moves.append(MOVE_TABLE[king_sq | (to_sq << TO_SHIFT)])
+
+        checkers = self._attackers_to(king_sq, enemy_side, occupied)
+        if checkers & (checkers - 1): # Scacco doppio: solo il re può muovere
+            return moves
+        if checkers: # Scacco semplice: catturare il pezzo che dà scacco o interporsi
+            target_mask = checkers | BETWEEN_BB[king_sq][checkers.bit_length() - 1]
+        else:
+            target_mask = FULL_BOARD
+            if quiet:
+                moves.extend(self._get_castling_moves(player_color))
+
+        pinned = self._get_pinned_pieces(side, king_sq)
+        not_own = kind_mask & target_mask
+
+        pawns = self.bitboards[base | constants.PAWN]
+        self._get_pawn_moves(player_color, moves, pawns & ~pinned, target_mask, tactical, quiet)
+        pinned_pawns = pawns & pinned
+        while pinned_pawns:
+            low = pinned_pawns & -pinned_pawns
+            pinned_pawns ^= low
+            self._get_pawn_moves(player_color, moves, low, target_mask & LINE_BB[king_sq][low.bit_length() - 1], tactical, quiet)
+
+        for sq in piece_squares[base | constants.KNIGHT]:
+            if not pinned >> sq & 1: # Un cavallo inchiodato non può mai muovere
+                self._append_moves(moves, sq, KNIGHT_ATTACKS[sq] & not_own)
+        for sq in piece_squares[base | constants.BISHOP]:
+            targets = bishop_attacks(sq, occupied) & not_own
+            if pinned >> sq & 1: targets &= LINE_BB[king_sq][sq]
+            self._append_moves(moves, sq, targets)
+        for sq in piece_squares[base | constants.ROOK]:
+            targets = rook_attacks(sq, occupied) & not_own
+            if pinned >> sq & 1: targets &= LINE_BB[king_sq][sq]
+            self._append_moves(moves, sq, targets)
+        for sq in piece_squares[base | constants.QUEEN]:
+            targets = (rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)) & not_own
+            if pinned >> sq & 1: targets &= LINE_BB[king_sq][sq]
+            self._append_moves(moves, sq, targets)
+
+        if tactical and self.en_passant_target is not None:
+            moves.extend(self._filter_legal_moves(player_color, self._get_en_passant_moves(side, pawns)))
+        return moves
+
+    def generate_captures(self, player_color):
+        """Catture legali (incluso en passant) e promozioni, senza generare le mosse tranquille (quiescence)."""
+        return self._generate_legal_moves(player_color, tactical=True, quiet=False)
 
-        for move_obj in pseudo_legal_moves:
+    def generate_evasions(self, player_color):
+        """
+        Mosse legali che parano lo scacco: re, cattura del pezzo che dà scacco, interposizione.
+        Lista vuota se player_color non è sotto scacco.
+        """
+        if not self.is_in_check(player_color):
+            return []
+        return self._generate_legal_moves(player_color)
+
+    def is_tactical_move(self, move_obj):
+        """True per catture (incluso en passant) e promozioni."""
+        to_sq = (move_obj >> TO_SHIFT) & FROM_MASK
+        if move_obj >> PROMOTION_SHIFT & PROMOTION_MASK or self.squares[to_sq]:
+            return True
+        ep_target = self.en_passant_target
+        return (ep_target is not None and ep_target[0] * 8 + ep_target[1] == to_sq and
+                self.squares[move_obj & FROM_MASK] & constants.TYPE_MASK == constants.PAWN)
+
+    def is_legal_move(self, move_obj):
+        """
+        Verifica che una mossa presa da fuori (TT, killer) sia legale nella posizione corrente,
+        senza generare le altre mosse: raggiungibilità del pezzo e poi scacchi/inchiodature.
+        """
+        side = WHITE if self.current_player == 'W' else BLACK
+        from_sq = move_obj & FROM_MASK
+        to_sq = (move_obj >> TO_SHIFT) & FROM_MASK
+        squares = self.squares
+        piece = squares[from_sq]
+        if not piece or piece >> 3 != side: return False
+        target = squares[to_sq]
+        if target and (target >> 3 == side or target & constants.TYPE_MASK == constants.KING): return False
+        piece_type = piece & constants.TYPE_MASK
+        occupied = self.occupied
+        to_bit = 1 << to_sq
+        promotion_piece = move_obj.promotion_piece
+
+        if move_obj.is_castle: # Arrocchi: stesse condizioni del generatore
+            return piece_type == constants.KING and not self.is_in_check(self.current_player) and \
+                   move_obj in self._get_castling_moves(self.current_player)
+
+        if piece_type == constants.PAWN:
+            push = -8 if side == WHITE else 8
+            last_row = 0 if side == WHITE else 7
+            if (promotion_piece is not None) != (move_obj.end_row == last_row): return False
+            if promotion_piece is not None and promotion_piece not in ('q', 'r', 'b', 'n'): return False
+            if to_sq == from_sq + push:
+                if target: return False
+            elif to_sq == from_sq + 2 * push:
+                if target or squares[from_sq + push] or move_obj.start_row != (6 if side == WHITE else 1): return False
+            elif PAWN_ATTACKS[side][from_sq] & to_bit:
+                if not target:
+                    if self.en_passant_target != (move_obj.end_row, move_obj.end_col): return False
+                    return bool(self._filter_legal_moves(self.current_player, [move_obj])) # En passant: make/verify
+            else:
+                return False
+        else:
+            if promotion_piece is not None: return False
+            if piece_type == constants.KNIGHT: reach = KNIGHT_ATTACKS[from_sq]
+            elif piece_type == constants.BISHOP: reach = bishop_attacks(from_sq, occupied)
+            elif piece_type == constants.ROOK: reach = rook_attacks(from_sq, occupied)
+            elif piece_type == constants.QUEEN: reach = rook_attacks(from_sq, occupied) | bishop_attacks(from_sq, occupied)
+            else: reach = KING_ATTACKS[from_sq]
+            if not reach & to_bit: return False
+
+        enemy_side = side ^ 1
+        if piece_type == constants.KING:
+            return not self._attackers_to(to_sq, enemy_side, occupied ^ (1 << from_sq))
+        king_sq = self.king_squares[side]
+        if king_sq < 0: return bool(self._filter_legal_moves(self.current_player, [move_obj]))
+        checkers = self._attackers_to(king_sq, enemy_side, occupied)
+        if checkers:
+            if checkers & (checkers - 1): return False # Scacco doppio: solo il re
+            if not to_bit & (checkers | BETWEEN_BB[king_sq][checkers.bit_length() - 1]): return False
+        if self._get_pinned_pieces(side, king_sq) >> from_sq & 1:
+            return bool(LINE_BB[king_sq][from_sq] & to_bit)
+        return True
+
+    def _filter_legal_moves(self, player_color, candidate_moves):
+        """Tiene le mosse che non lasciano il proprio re sotto scacco (verifica con make/unmake)."""
+        legal_moves = []
+        for move_obj in candidate_moves:
             self.make_move(move_obj)
             # Controlla se il *proprio* re è sotto scacco dopo la mossa
             if not self.is_in_check(player_color):
                 legal_moves.append(move_obj)
-            # Ripristina sempre allo stato PRIMA della mossa specifica
-            self.restore_state_snapshot(original_state)
-
+            self.unmake_move()
         return legal_moves
 
     # --- Make/Unmake Move ---
-    def get_state_snapshot(self):
-        """Salva lo stato per unmake_move."""
-        # Usa una tupla per i diritti di arrocco per renderli immutabili/hashable
-        castling_tuple = (
-            self.castling_rights['W']['K'], self.castling_rights['W']['Q'],
-            self.castling_rights['B']['k'], self.castling_rights['B']['q']
-        )
-        # La board è una lista di liste, una copia superficiale va bene per il restore
-        # perché sovrascriviamo le singole celle. Se modificassimo liste interne, servirebbe deepcopy.
-        return {
-            'board': [row[:] for row in self.board],
-            'current_player': self.current_player,
-            'castling_tuple': castling_tuple,
-            'en_passant_target': self.en_passant_target, # Tupla è immutabile
-            'halfmove_clock': self.halfmove_clock,
-            'fullmove_number': self.fullmove_number,
-            'current_hash': self.current_hash,
-            'history_len': len(self.history) # Per troncamento history in restore
-        }
-
-    def restore_state_snapshot(self, snapshot):
-        """Ripristina lo stato da uno snapshot."""
-        self.board = [row[:] for row in snapshot['board']] # Ripristina board
-        self.current_player = snapshot['current_player']
-        # Ripristina diritti dalla tupla
-        ct = snapshot['castling_tuple']
-        self.castling_rights = {'W': {'K': ct[0], 'Q': ct[1]}, 'B': {'k': ct[2], 'q': ct[3]}}
-        self.en_passant_target = snapshot['en_passant_target']
-        self.halfmove_clock = snapshot['halfmove_clock']
-        self.fullmove_number = snapshot['fullmove_number']
-        self.current_hash = snapshot['current_hash']
-        # Tronca history se necessario (make_move aggiunge, restore non deve rimuovere se non necessario)
-        if len(self.history) > snapshot['history_len']:
-             self.history = self.history[:snapshot['history_len']]
+    def _allocate_undo_stack(self, size=constants.UNDO_STACK_SIZE):
+        """
+        Pile di undo preallocate, una voce per ply (struct-of-arrays indicizzata da undo_count):
+        mossa, pezzo catturato, target EP, diritti di arrocco, halfmove clock, hash, chiave
+        dei pedoni, chiave materiale e somma PST prima della mossa.
+        """
+        self.undo_count = 0
+        self.undo_moves = [m.NO_MOVE] * size
+        self.undo_captured = bytearray(size)
+        self.undo_ep_target = [None] * size
+        self.undo_castling = bytearray(size)
+        self.undo_halfmove = [0] * size
+        self.hash_history = [0] * size # Hash delle posizioni precedenti (controllo ripetizioni)
+        self.pawn_key_history = [0] * size
+        self.material_key_history = [0] * size
+        self.pst_history = [0] * size
+
+    def _grow_undo_stack(self):
+        """Raddoppia le pile di undo (solo per partite più lunghe di UNDO_STACK_SIZE ply)."""
+        size = len(self.undo_moves)
+        self.undo_moves.extend([m.NO_MOVE] * size)
+        self.undo_captured.extend(bytearray(size))
+        self.undo_ep_target.extend([None] * size)
+        self.undo_castling.extend(bytearray(size))
+        self.undo_halfmove.extend([0] * size)
+        self.hash_history.extend([0] * size)
+        self.pawn_key_history.extend([0] * size)
+        self.material_key_history.extend([0] * size)
+        self.pst_history.extend([0] * size)
 
     def make_move(self, move_obj):
         """Esegue una mossa sulla scacchiera e aggiorna lo stato."""
-        start_r, start_c = move_obj.start_row, move_obj.start_col
-        end_r, end_c = move_obj.end_row, move_obj.end_col
-        piece = self.board[start_r][start_c]
-        piece_color = self.get_piece_color(piece)
-        piece_type = piece.lower()
-        captured_piece = self.board[end_r][end_c]
-        is_capture = captured_piece != '.'
-
-        # --- Salva info per unmake ---
+        start_sq = move_obj & FROM_MASK
+        end_sq = (move_obj >> TO_SHIFT) & FROM_MASK
+        squares = self.squares
+        zobrist = constants.ZOBRIST_BY_CODE
+        piece = squares[start_sq]
+        piece_color_flag = piece & constants.BLACK_FLAG # 0 = bianco, 8 = nero
+        piece_type = piece & constants.TYPE_MASK
+        captured_piece = squares[end_sq]
+
+        # --- Salva info per unmake (pile preallocate, nessuna allocazione per mossa) ---
+        ply = self.undo_count
+        if ply == len(self.undo_moves):
+            self._grow_undo_stack()
         original_hash = self.current_hash
-        current_castling_tuple = (self.castling_rights['W']['K'], self.castling_rights['W']['Q'],
-                                   self.castling_rights['B']['k'], self.castling_rights['B']['q'])
+        current_castling = self.castling
         current_ep_target = self.en_passant_target
-        current_halfmove = self.halfmove_clock
-        captured_piece_ep = '.' # Default
-        rook_move_castle_info = None # Per unmake arrocco
+        self.undo_moves[ply] = move_obj
+        self.undo_captured[ply] = captured_piece
+        self.undo_ep_target[ply] = current_ep_target
+        self.undo_castling[ply] = current_castling
+        self.undo_halfmove[ply] = self.halfmove_clock
+        self.hash_history[ply] = original_hash
+        self.pawn_key_history[ply] = self.pawn_key
+        self.material_key_history[ply] = self.material_key
+        self.pst_history[ply] = self.pst_score
+        self.undo_count = ply + 1
 
         # --- Aggiornamento Hash Incrementale ---
-        new_hash = original_hash
-        # 1. Rimuovi pezzo mosso da casa iniziale
-        new_hash = self._update_hash_piece(new_hash, piece, start_r, start_c)
-        # 2. Rimuovi pezzo catturato (se esiste) da casa finale
-        if is_capture:
-            new_hash = self._update_hash_piece(new_hash, captured_piece, end_r, end_c)
+        # 1. Rimuovi pezzo mosso da casa iniziale, 2. rimuovi pezzo catturato (riga di zeri se vuota)
+        new_hash = original_hash ^ zobrist[piece][start_sq] ^ zobrist[captured_piece][end_sq]
 
         # --- Modifiche Scacchiera Base ---
         # Pezzo mosso arriva a destinazione
         final_piece = piece
-        if move_obj.promotion_piece:
-            final_piece = move_obj.promotion_piece.upper() if piece_color == 'W' else move_obj.promotion_piece.lower()
-        self.board[end_r][end_c] = final_piece
-        self.board[start_r][start_c] = '.'
+        if move_obj >> PROMOTION_SHIFT & PROMOTION_MASK:
+            final_piece = (constants.PIECE_CODES[move_obj.promotion_piece] & constants.TYPE_MASK) | piece_color_flag
+        self._remove_piece(piece, start_sq)
+        if captured_piece:
+            self._remove_piece(captured_piece, end_sq)
+        self._add_piece(final_piece, end_sq)
 
         # 3. Aggiungi pezzo (eventualmente promosso) a casa finale
-        new_hash = self._update_hash_piece(new_hash, final_piece, end_r, end_c)
+        new_hash ^= zobrist[final_piece][end_sq]
+
+        # Chiave pedoni: cambia solo con mosse di pedone (promozioni comprese) e catture di pedoni
+        if piece_type == constants.PAWN or captured_piece & constants.TYPE_MASK == constants.PAWN:
+            pawn_key = self.pawn_key
+            if piece_type == constants.PAWN:
+                pawn_key ^= zobrist[piece][start_sq]
+                if final_piece == piece:
+                    pawn_key ^= zobrist[piece][end_sq]
+            if captured_piece & constants.TYPE_MASK == constants.PAWN:
+                pawn_key ^= zobrist[captured_piece][end_sq]
+            self.pawn_key = pawn_key
+        # Chiave materiale: cambia solo con catture e promozioni
+        if captured_piece:
+            self.material_key -= constants.MATERIAL_KEY_UNIT[captured_piece]
+        if final_piece != piece:
+            self.material_key += constants.MATERIAL_KEY_UNIT[final_piece] - constants.MATERIAL_KEY_UNIT[piece]
+        # Somma PST (righe di zeri per casa vuota e re)
+        pst_by_code = pst.PST_BY_CODE
+        self.pst_score += pst_by_code[final_piece][end_sq] - pst_by_code[piece][start_sq] - pst_by_code[captured_piece][end_sq]
 
         # --- Gestione En Passant ---
         new_ep_target = None
-        if piece_type == 'p':
-            # *** CORREZIONE: Definisci direction qui ***
-            direction = -1 if piece_color == 'W' else 1
-            # ******************************************
-
-            # Imposta nuovo target EP se doppio passo
-            if abs(start_r - end_r) == 2:
-                new_ep_target = (start_r + direction, start_c) # Ora direction è definito
+        is_capture = captured_piece != constants.EMPTY
+        if piece_type == constants.PAWN:
+            # Imposta nuovo target EP se doppio passo (casa intermedia)
+            if abs(start_sq - end_sq) == 16:
+                middle_sq = (start_sq + end_sq) >> 1
+                new_ep_target = (middle_sq >> 3, middle_sq & 7)
             # Se la mossa è una cattura EP
-            elif (end_r, end_c) == current_ep_target:
-                captured_ep_r = start_r # Riga del pedone attaccante
-                captured_ep_c = end_c   # Colonna del pedone catturato
-                captured_piece_ep = self.board[captured_ep_r][captured_ep_c] # Dovrebbe essere 'p' o 'P'
-                # 4. Rimuovi pedone catturato EP dall'hash
-                new_hash = self._update_hash_piece(new_hash, captured_piece_ep, captured_ep_r, captured_ep_c)
-                # Rimuovi pedone catturato EP dalla scacchiera
-                self.board[captured_ep_r][captured_ep_c] = '.'
+            elif current_ep_target is not None and end_sq == current_ep_target[0] * 8 + current_ep_target[1]:
+                captured_ep_sq = (start_sq & 56) | (end_sq & 7) # Riga del pedone attaccante, colonna del pedone catturato
+                captured_piece_ep = squares[captured_ep_sq] # Pedone avversario
+                # 4. Rimuovi pedone catturato EP dall'hash e dalla scacchiera
+                new_hash ^= zobrist[captured_piece_ep][captured_ep_sq]
+                self.pawn_key ^= zobrist[captured_piece_ep][captured_ep_sq]
+                self.material_key -= constants.MATERIAL_KEY_UNIT[captured_piece_ep]
+                self.pst_score -= pst_by_code[captured_piece_ep][captured_ep_sq]
+                self._remove_piece(captured_piece_ep, captured_ep_sq)
                 is_capture = True # Conta come cattura per halfmove clock
 
         # 5. Aggiorna hash per cambio EP target
@@ -526,151 +832,211 @@ class ChessEngine:
         self.en_passant_target = new_ep_target # Aggiorna stato
 
         # --- Gestione Arrocco ---
-        if move_obj.is_castle:
-            rook_start_c, rook_end_c = (7, 5) if end_c == 6 else (0, 3) # Corto vs Lungo
-            rook_r = start_r # Stessa riga del Re
-            rook = self.board[rook_r][rook_start_c]
-            # Salva info per unmake
-            rook_move_castle_info = (rook_r, rook_start_c, rook_r, rook_end_c, rook) # (r1,c1, r2,c2, piece)
-
+        if move_obj & CASTLE_FLAG:
+            rook_start_sq, rook_end_sq = self._castle_rook_squares(start_sq, end_sq)
+            rook = squares[rook_start_sq]
             # Muovi torre sulla scacchiera
-            self.board[rook_r][rook_end_c] = rook
-            self.board[rook_r][rook_start_c] = '.'
+            self._remove_piece(rook, rook_start_sq)
+            self._add_piece(rook, rook_end_sq)
             # 6. Aggiorna hash per movimento torre
-            new_hash = self._update_hash_piece(new_hash, rook, rook_r, rook_start_c) # Rimuovi da start
-            new_hash = self._update_hash_piece(new_hash, rook, rook_r, rook_end_c)   # Aggiungi a end
+            new_hash ^= zobrist[rook][rook_start_sq] ^ zobrist[rook][rook_end_sq]
+            self.pst_score += pst_by_code[rook][rook_end_sq] - pst_by_code[rook][rook_start_sq]
 
         # --- Aggiorna Contatori ---
-        if piece_type == 'p' or is_capture: # Cattura include EP qui
+        if piece_type == constants.PAWN or is_capture: # Cattura include EP qui
              self.halfmove_clock = 0
         else:
              self.halfmove_clock += 1
-        # NOTA: l'incremento di fullmove_number dovrebbe avvenire DOPO che il NERO ha mosso.
-        # Lo spostiamo dopo il cambio giocatore.
-
-        # --- Aggiorna Diritti Arrocco ---
-        # Copia superficiale è ok, modifichiamo i booleani interni
-        new_castling_rights_dict = {
-             'W': self.castling_rights['W'].copy(),
-             'B': self.castling_rights['B'].copy()
-        }
-        wk, wq = new_castling_rights_dict['W']['K'], new_castling_rights_dict['W']['Q']
-        bk, bq = new_castling_rights_dict['B']['k'], new_castling_rights_dict['B']['q']
-
-        # Se il Re si muove
-        if piece_type == 'k':
-            if piece_color == 'W': wk = wq = False
-            else: bk = bq = False
-        # Se la Torre si muove dalla casa iniziale
-        if start_r == 7 and start_c == 0: wq = False # A1
-        if start_r == 7 and start_c == 7: wk = False # H1
-        if start_r == 0 and start_c == 0: bq = False # A8
-        if start_r == 0 and start_c == 7: bk = False # H8
-        # Se la Torre viene catturata sulla casa finale
-        if end_r == 7 and end_c == 0: wq = False # Torre A1 catturata
-        if end_r == 7 and end_c == 7: wk = False # Torre H1 catturata
-        if end_r == 0 and end_c == 0: bq = False # Torre A8 catturata
-        if end_r == 0 and end_c == 7: bk = False # Torre H8 catturata
-
-        # Crea nuova tupla per hash e aggiorna dizionario stato
-        new_castling_tuple = (wk, wq, bk, bq)
-        new_castling_rights_dict['W']['K'], new_castling_rights_dict['W']['Q'] = wk, wq
-        new_castling_rights_dict['B']['k'], new_castling_rights_dict['B']['q'] = bk, bq
 
+        # --- Aggiorna Diritti Arrocco (maschera per casa di partenza e di arrivo) ---
+        new_castling = current_castling & constants.CASTLING_RIGHTS_MASK[start_sq] & constants.CASTLING_RIGHTS_MASK[end_sq]
+        if piece_type == constants.KING: # Re mosso (anche da FEN con re fuori posto)
+            new_castling &= ~constants.CASTLE_RIGHTS_BY_COLOR[piece_color_flag >> 3]
         # 7. Aggiorna hash per cambio diritti arrocco (solo se sono cambiati)
-        if new_castling_tuple != current_castling_tuple:
-             new_hash = self._update_hash_castling(new_hash, current_castling_tuple, new_castling_tuple)
-        self.castling_rights = new_castling_rights_dict # Aggiorna stato arrocco
+        if new_castling != current_castling:
+            new_hash ^= constants.ZOBRIST_CASTLING[current_castling] ^ constants.ZOBRIST_CASTLING[new_castling]
+            self.castling = new_castling
 
         # --- Cambia Giocatore ---
-        original_player = self.current_player # Salva giocatore prima del cambio
-        self.current_player = 'B' if piece_color == 'W' else 'W'
+        self.current_player = 'W' if piece_color_flag else 'B'
         # 8. Aggiorna hash per cambio turno
-        new_hash = self._update_hash_side(new_hash)
+        new_hash ^= constants.ZOBRIST_SIDE
 
-        # --- Aggiorna Fullmove Number (ora che sappiamo chi ha mosso) ---
-        if original_player == 'B': # Se era il turno del Nero a muovere
+        # --- Aggiorna Fullmove Number (dopo la mossa del Nero) ---
+        if piece_color_flag:
             self.fullmove_number += 1
 
-        # --- Aggiorna Hash Finale e History ---
         self.current_hash = new_hash
-        self.history.append({
-            'move': move_obj, # Oggetto Move
-            'captured_piece': captured_piece, # Carattere pezzo catturato (o '.')
-            'captured_piece_ep': captured_piece_ep, # Carattere pezzo catturato EP (o '.')
-            'castling_tuple_before': current_castling_tuple, # Diritti prima
-            'en_passant_target_before': current_ep_target, # EP target prima
-            'halfmove_clock_before': current_halfmove, # Clock prima
-            'previous_hash': original_hash, # Hash prima della mossa
-            'rook_move_castle_info': rook_move_castle_info # Info per annullare mossa torre
-        })
+        if self.network is not None:
+            self._push_accumulator(ply, move_obj, piece, final_piece, captured_piece)
+
+    def set_network(self, network):
+        """
+        Attiva la valutazione NNUE con network (nnue.Network), o quella classica con None.
+        Solo il ply corrente riceve l'accumulatore: quelli dei ply precedenti (None) vengono
+        ricalcolati quando servono (unwind_to e rigioco delle mosse, vedi get_position_history).
+        """
+        self.network = network
+        self.eval_cache.clear() # Gli score in cache sono dell'altra valutazione
+        self.accumulators = []
+        if network is not None:
+            self._refresh_accumulator()
+
+    def _refresh_accumulator(self):
+        """Ricalcola da zero l'accumulatore del ply corrente e lo ritorna."""
+        while len(self.accumulators) <= self.undo_count:
+            self.accumulators.append(None)
+        accumulator = self.accumulators[self.undo_count] = self.network.refresh(self.piece_squares)
+        return accumulator
+
+    def _push_accumulator(self, ply, move_obj, piece, final_piece, captured_piece):
+        """Accumulatore dopo la mossa (ply + 1) dalle righe dei pezzi tolti e aggiunti."""
+        if self.accumulators[ply] is None:
+            # Ply senza accumulatore (rete attivata dopo queste mosse): la posizione è già
+            # quella dopo la mossa, si ricalcola da zero
+            self._refresh_accumulator()
+            return
+        delta = self.network.delta_table
+        start_sq = move_obj & FROM_MASK
+        end_sq = (move_obj >> TO_SHIFT) & FROM_MASK
+        accumulator = self.accumulators[ply] - delta[piece, start_sq] + delta[final_piece, end_sq]
+        if captured_piece:
+            accumulator -= delta[captured_piece, end_sq]
+        elif piece & constants.TYPE_MASK == constants.PAWN and (start_sq ^ end_sq) & 7:
+            # Pedone in diagonale su casa vuota: en passant
+            accumulator -= delta[piece ^ constants.BLACK_FLAG, (start_sq & 56) | (end_sq & 7)]
+        if move_obj & CASTLE_FLAG:
+            rook_start_sq, rook_end_sq = self._castle_rook_squares(start_sq, end_sq)
+            rook = constants.ROOK | (piece & constants.BLACK_FLAG)
+            accumulator += delta[rook, rook_end_sq] - delta[rook, rook_start_sq]
+        if len(self.accumulators) == ply + 1:
+            self.accumulators.append(accumulator)
+        else:
+            self.accumulators[ply + 1] = accumulator
+
+    def _castle_rook_squares(self, king_start_sq, king_end_sq):
+        """Case di partenza e arrivo della torre per un arrocco (corto se il re va in colonna g)."""
+        row_base = king_start_sq & 56
+        if king_end_sq & 7 == 6:
+            return row_base | 7, row_base | 5
+        return row_base, row_base | 3
 
     def unmake_move(self):
         """Annulla l'ultima mossa eseguita."""
-        if not self.history: return
-        last_move_info = self.history.pop()
+        if not self.undo_count: return
+        ply = self.undo_count - 1
+        self.undo_count = ply
 
-        move_obj = last_move_info['move']
-        start_r, start_c = move_obj.start_row, move_obj.start_col
-        end_r, end_c = move_obj.end_row, move_obj.end_col
+        move_obj = self.undo_moves[ply]
+        start_sq = move_obj & FROM_MASK
+        end_sq = (move_obj >> TO_SHIFT) & FROM_MASK
 
         # Pezzo mosso (considera promozione)
-        moved_piece_type = self.board[end_r][end_c].lower() # Tipo pezzo che è arrivato
-        original_piece_char = moved_piece_type.upper() if self.current_player == 'B' else moved_piece_type.lower() # Determina pezzo originale
-        if moved_piece_type != 'p' and move_obj.promotion_piece is not None:
-            original_piece_char = 'P' if self.current_player == 'B' else 'p' # Era un pedone prima della promo
+        moved_piece = self.squares[end_sq] # Pezzo che è arrivato
+        color_flag = moved_piece & constants.BLACK_FLAG
+        original_piece = moved_piece
+        if move_obj >> PROMOTION_SHIFT & PROMOTION_MASK:
+            original_piece = constants.PAWN | color_flag # Era un pedone prima della promo
 
         # Ripristina pezzo mosso e pezzo catturato
-        self.board[start_r][start_c] = original_piece_char
-        self.board[end_r][end_c] = last_move_info['captured_piece'] # Ripristina pezzo catturato (o '.')
-
-        # Annulla cattura En Passant
-        captured_piece_ep = last_move_info['captured_piece_ep']
-        if captured_piece_ep != '.':
-            ep_capture_r = start_r # Riga del pedone attaccante originale
-            ep_capture_c = end_c   # Colonna della cattura
-            self.board[ep_capture_r][ep_capture_c] = captured_piece_ep # Rimetti pedone catturato
-            self.board[end_r][end_c] = '.' # La casa di arrivo EP era vuota
+        self._remove_piece(moved_piece, end_sq)
+        self._add_piece(original_piece, start_sq)
+        captured_piece = self.undo_captured[ply]
+        ep_target_before = self.undo_ep_target[ply]
+        if captured_piece:
+            self._add_piece(captured_piece, end_sq) # Ripristina pezzo catturato
+        elif original_piece & constants.TYPE_MASK == constants.PAWN and ep_target_before is not None and \
+             end_sq == ep_target_before[0] * 8 + ep_target_before[1]:
+            # Annulla cattura En Passant: il pedone avversario torna sulla riga del pedone che ha catturato
+            self._add_piece(constants.PAWN | (color_flag ^ constants.BLACK_FLAG), (start_sq & 56) | (end_sq & 7))
 
         # Annulla Arrocco (muovi torre indietro)
-        rook_info = last_move_info['rook_move_castle_info']
-        if rook_info:
-            rook_r1, rook_c1, rook_r2, rook_c2, rook_piece = rook_info
-            self.board[rook_r1][rook_c1] = rook_piece # Torre torna a casa iniziale
-            self.board[rook_r2][rook_c2] = '.'        # Casa finale torre diventa vuota
-
-        # Ripristina stato partita dal dizionario history
-        ct = last_move_info['castling_tuple_before']
-        self.castling_rights = {'W': {'K': ct[0], 'Q': ct[1]}, 'B': {'k': ct[2], 'q': ct[3]}}
-        self.en_passant_target = last_move_info['en_passant_target_before']
-        self.halfmove_clock = last_move_info['halfmove_clock_before']
-        self.current_hash = last_move_info['previous_hash'] # Ripristina hash!
+        if move_obj & CASTLE_FLAG:
+            rook_start_sq, rook_end_sq = self._castle_rook_squares(start_sq, end_sq)
+            rook_piece = constants.ROOK | color_flag
+            self._remove_piece(rook_piece, rook_end_sq) # Casa finale torre diventa vuota
+            self._add_piece(rook_piece, rook_start_sq)  # Torre torna a casa iniziale
+
+        # Ripristina stato partita dalle pile di undo
+        self.castling = self.undo_castling[ply]
+        self.en_passant_target = ep_target_before
+        self.halfmove_clock = self.undo_halfmove[ply]
+        self.current_hash = self.hash_history[ply] # Ripristina hash!
+        self.pawn_key = self.pawn_key_history[ply]
+        self.material_key = self.material_key_history[ply]
+        self.pst_score = self.pst_history[ply]
 
         # Cambia giocatore indietro
-        self.current_player = 'W' if self.current_player == 'B' else 'B'
+        self.current_player = 'B' if color_flag else 'W'
         # Aggiusta numero mossa se il nero ha appena annullato
-        if self.current_player == 'B':
+        if color_flag:
              self.fullmove_number -= 1
-    
+
+    def get_position_history(self):
+        """
+        (FEN di partenza, mosse giocate da lì): ricrea la posizione corrente in un altro
+        processo con la storia degli hash (ripetizioni). Non deve esserci una mossa nulla in corso.
+        """
+        moves = self.undo_moves[:self.undo_count]
+        self.unwind_to(0)
+        start_fen = self.get_fen()
+        for move_obj in moves:
+            self.make_move(move_obj)
+        return start_fen, moves
+
+    def unwind_to(self, undo_count):
+        """Annulla mosse e mosse nulle fino a riportare le pile di undo a undo_count (ricerca interrotta)."""
+        while self.undo_count > undo_count:
+            if self.undo_moves[self.undo_count - 1] == m.NO_MOVE:
+                self.unmake_null_move()
+            else:
+                self.unmake_move()
+
+    def make_null_move(self):
+        """
+        Mossa nulla (null move pruning): cambia solo il turno e azzera il target en passant,
+        aggiornando l'hash con le chiavi di turno ed EP. Nessuna copia della scacchiera.
+        Va annullata con unmake_null_move.
+        """
+        ply = self.undo_count
+        if ply == len(self.undo_moves):
+            self._grow_undo_stack()
+        original_hash = self.current_hash
+        current_ep_target = self.en_passant_target
+        self.undo_moves[ply] = m.NO_MOVE # Mossa nulla
+        self.undo_ep_target[ply] = current_ep_target
+        self.hash_history[ply] = original_hash
+        self.undo_count = ply + 1
+        self.en_passant_target = None
+        self.current_player = 'B' if self.current_player == 'W' else 'W'
+        self.current_hash = self._update_hash_side(self._update_hash_ep(original_hash, current_ep_target, None))
+        if self.network is not None: # Stessi pezzi: stesso accumulatore
+            if len(self.accumulators) == ply + 1:
+                self.accumulators.append(self.accumulators[ply])
+            else:
+                self.accumulators[ply + 1] = self.accumulators[ply]
+
+    def unmake_null_move(self):
+        """Annulla la mossa nulla eseguita da make_null_move."""
+        ply = self.undo_count - 1
+        self.undo_count = ply
+        self.en_passant_target = self.undo_ep_target[ply]
+        self.current_hash = self.hash_history[ply]
+        self.current_player = 'B' if self.current_player == 'W' else 'W'
+
     def _perft_recursive(self, depth):
         """Funzione ricorsiva helper per Perft."""
         if depth == 0:
             return 1 # Siamo arrivati a una foglia
 
-        nodes = 0
         legal_moves = self.get_legal_moves(self.current_player)
+        if depth == 1:
+            return len(legal_moves) # Il generatore è legale: le foglie si contano senza giocarle
 
+        nodes = 0
         for move_obj in legal_moves:
-            # Nota: Stiamo usando la versione di get_legal_moves con make/unmake implicito
-            # per il check di legalità. Questo è meno efficiente per Perft ma usa
-            # il codice che già hai. Se Perft risulta troppo lento, potremmo
-            # ottimizzare get_legal_moves come discusso in precedenza.
-
-            # Salva lo stato PRIMA di make_move per il perft ricorsivo
-            # (make/unmake sono già usati da get_legal_moves, ma qui li usiamo
-            # per scendere nell'albero di Perft)
-            # Usiamo make_move/unmake_move invece di get_state_snapshot/restore
-            # perché sono le funzioni che vogliamo testare implicitamente.
+            # Usiamo make_move/unmake_move per scendere nell'albero di Perft:
+            # sono le funzioni che vogliamo testare implicitamente.
             # L'hash viene aggiornato da make_move/unmake_move.
 
             # --- Esegui la mossa ---
@@ -754,12 +1120,7 @@ class ChessEngine:
             # Imposta turno
             board_pc.turn = chess.WHITE if self.current_player == 'W' else chess.BLACK
             # Imposta diritti arrocco (usa FEN part)
-            castling_fen_part = ""
-            if self.castling_rights['W']['K']: castling_fen_part += 'K'
-            if self.castling_rights['W']['Q']: castling_fen_part += 'Q'
-            if self.castling_rights['B']['k']: castling_fen_part += 'k'
-            if self.castling_rights['B']['q']: castling_fen_part += 'q'
-            board_pc.set_castling_fen(castling_fen_part if castling_fen_part else "-")
+            board_pc.set_castling_fen(self._castling_fen_part())
             # Imposta En Passant
             if self.en_passant_target:
                 ep_r, ep_c = self.en_passant_target
@@ -783,10 +1144,31 @@ class ChessEngine:
     # Questi potrebbero non essere necessari se UCI chiama direttamente search.py
     # Ma li teniamo per ora se vuoi un punto di accesso unificato tramite l'engine
 
-    def evaluate(self):
-         """Wrapper per chiamare la funzione di valutazione."""
-         # Nota: evaluate_board in evaluation.py prende board e player
-         return evaluation.evaluate_board(self.board, self.current_player)
+    def evaluate(self, alpha=None, beta=None):
+         """
+         Valutazione statica dal punto di vista di chi muove (come evaluate_board), letta
+         dalla eval cache quando la posizione è già stata valutata.
+         Con alpha/beta la valutazione classica può essere lazy: fuori dalla finestra ritorna lo
+         score parziale, che non viene messo in cache. Con una rete attiva (set_network) valuta
+         l'accumulatore NNUE del ply corrente.
+         """
+         white_score = self.eval_cache.probe(self.current_hash)
+         if white_score is None:
+             if self.network is not None:
+                 accumulator = self.accumulators[self.undo_count]
+                 if accumulator is None: # Ply tornato con unwind_to prima di set_network
+                     accumulator = self._refresh_accumulator()
+                 score = self.network.evaluate(accumulator, 0 if self.current_player == 'W' else 1)
+                 self.eval_cache.store(self.current_hash, score if self.current_player == 'W' else -score)
+                 return score
+             score, exact = evaluation.evaluate_board_bounded(self.squares, self.current_player, self.piece_squares,
+                                                              self.pawn_key, self.pawn_table,
+                                                              self.material_key, self.material_table,
+                                                              self.pst_score, self.bitboards, alpha, beta)
+             if exact:
+                 self.eval_cache.store(self.current_hash, score if self.current_player == 'W' else -score)
+             return score
+         return white_score if self.current_player == 'W' else -white_score
 
     def find_best_move(self, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtime=None, btime=None, winc=0, binc=0, movestogo=None):
          """Wrapper per chiamare la funzione di ricerca principale."""
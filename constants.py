@@ -11,12 +11,20 @@ STALEMATE_SCORE = 0 # Punteggio per stallo (usato globalmente)
 MAX_SEARCH_PLY = 64 # Limite massimo di profondità per evitare errori/loop
 
 # --- Costanti Transposition Table (TT) ---
-TT_SIZE = 1048576 # Dimensione della Transposition Table (2^20, circa 1M entry)
+TT_SIZE_MB = 32 # Dimensione della Transposition Table in MB (16 byte per entry, vedi tt.py)
+TT_BUCKET_SIZE = 4 # Entry per bucket (4 x 16 byte = una linea di cache)
+MAX_HASH_MB = 4096 # Massimo per l'opzione UCI Hash
+TT_AGE_WEIGHT = 8 # Sostituzione: valore entry = profondità - TT_AGE_WEIGHT * età (in ricerche)
 TT_BOUND_EXACT = 0
 TT_BOUND_LOWER = 1
 TT_BOUND_UPPER = 2
+PAWN_HASH_SIZE = 1 << 14 # Entry della pawn hash table (potenza di 2, vedi evaluation.PawnHashTable)
+EVAL_CACHE_SIZE = 1 << 16 # Entry della cache di valutazione (potenza di 2, vedi evaluation.EvalCache)
+MATERIAL_HASH_SIZE = 1 << 12 # Entry della material hash table (potenza di 2, vedi evaluation.MaterialHashTable)
 
 # --- Costanti Ricerca ---
+MAX_THREADS = 64 # Massimo per l'opzione UCI Threads (processi Lazy SMP, vedi smp.py)
+ROOT_SPLIT_ORDER_DEPTH = 3 # Profondità della ricerca seriale che ordina le mosse radice prima del root splitting
 NMP_MIN_DEPTH = 3
 NMP_REDUCTION = 2
 CHECK_EXTENSION = 1
@@ -24,6 +32,7 @@ LMR_MIN_DEPTH = 3
 LMR_MIN_MOVE_INDEX = 4
 LMR_REDUCTION = 1
 FUTILITY_MARGIN_DEPTH_1 = 200 # Margine per Futility Pruning a depth 1
+SEARCH_POLL_INTERVAL = 128 # Nodi tra due controlli di scadenza/abort (potenza di 2)
 MIN_MATERIAL_FOR_NMP = PIECE_VALUES['n'] + PIECE_VALUES['p'] # Valore minimo per NMP
 
 # --- Costanti Valutazione ---
@@ -42,6 +51,7 @@ KING_OPEN_FILE_PENALTY = (12, 12) # Era (12, 12)
 KING_SEMI_OPEN_FILE_PENALTY = (6, 6) # Era (6, 6)
 GAME_PHASE_MAX = 24 # Somma dei valori di fase iniziali (escl. pedoni/re)
 PIECE_PHASE_VALUES = {'q': 4, 'r': 2, 'b': 1, 'n': 1, 'p': 0, 'k': 0} # Valori per calcolo fase
+LAZY_EVAL = True # Stand-pat della quiescenza lazy sopra beta (evaluation.evaluate_board_bounded)
 
 # --- Costanti Ricerca: Singular Extensions ---
 SINGULAR_MIN_DEPTH = 6       # Profondità minima per considerare estensioni singolari
@@ -90,14 +100,68 @@ KILLER_MOVE_SECONDARY_BONUS = 80000
 MAX_HISTORY_SCORE_BONUS = 70000 # Limite massimo per bonus da history heuristic
 
 # --- Tabelle Zobrist ---
-ZOBRIST_PIECES = [[[random.getrandbits(64) for _ in range(12)] for _ in range(8)] for _ in range(8)]
-ZOBRIST_SIDE = random.getrandbits(64)
-ZOBRIST_CASTLING = [random.getrandbits(64) for _ in range(16)]
-ZOBRIST_EP_FILE = [random.getrandbits(64) for _ in range(8)]
+# Seme fisso: le chiavi sono le stesse in ogni esecuzione e in ogni processo (Lazy SMP,
+# root splitting) e gli snapshot della TT salvati su file restano validi (vedi tt.py).
+ZOBRIST_SEED = 0x42414B414D495441 # "BAKAMITA"
+_zobrist_random = random.Random(ZOBRIST_SEED)
+ZOBRIST_PIECES = [[[_zobrist_random.getrandbits(64) for _ in range(12)] for _ in range(8)] for _ in range(8)]
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
 PIECE_TO_ZOBRIST_INDEX = {'P': 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4, 'K': 5, 'p': 6, 'n': 7, 'b': 8, 'r': 9, 'q': 10, 'k': 11}
 
+# --- Codifica Intera dei Pezzi (mailbox bytearray a 64 case) ---
+# Codice = tipo (bit 0-2) | colore (bit 3): bianchi 1..6, neri 9..14, 0 = casa vuota.
+# Colore: code & BLACK_FLAG, tipo: code & TYPE_MASK.
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+TYPE_MASK = 7
+BLACK_FLAG = 8
+PIECE_CODES = {'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6, 'p': 9, 'n': 10, 'b': 11, 'r': 12, 'q': 13, 'k': 14}
+CODE_TO_CHAR = '.PNBRQK..pnbrqk' # CODE_TO_CHAR[code] -> carattere FEN ('.' per casa vuota)
+WHITE_PAWN, WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK, WHITE_QUEEN, WHITE_KING = 1, 2, 3, 4, 5, 6
+BLACK_PAWN, BLACK_KNIGHT, BLACK_BISHOP, BLACK_ROOK, BLACK_QUEEN, BLACK_KING = 9, 10, 11, 12, 13, 14
+PIECE_VALUES_BY_CODE = [0] * 15
+PIECE_PHASE_BY_CODE = [0] * 15
+ZOBRIST_BY_CODE = [[0] * 64 for _ in range(15)] # [code][casa]
+for _char, _code in PIECE_CODES.items():
+    PIECE_VALUES_BY_CODE[_code] = PIECE_VALUES[_char.lower()]
+    PIECE_PHASE_BY_CODE[_code] = PIECE_PHASE_VALUES[_char.lower()]
+    ZOBRIST_BY_CODE[_code] = [ZOBRIST_PIECES[_sq >> 3][_sq & 7][PIECE_TO_ZOBRIST_INDEX[_char]] for _sq in range(64)]
+# Chiave materiale: il numero di pezzi di ogni codice in un campo di MATERIAL_KEY_BITS bit
+# (somma di MATERIAL_KEY_UNIT[code] per pezzo, conteggio = key >> (MATERIAL_KEY_BITS * code) & MATERIAL_COUNT_MASK)
+MATERIAL_KEY_BITS = 4
+MATERIAL_COUNT_MASK = (1 << MATERIAL_KEY_BITS) - 1
+MATERIAL_KEY_UNIT = [1 << (MATERIAL_KEY_BITS * _code) for _code in range(15)]
+
+# --- Diritti di Arrocco (maschera a 4 bit, stesso indice di ZOBRIST_CASTLING) ---
+CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ = 1, 2, 4, 8
+CASTLE_ALL = 15
+CASTLING_FEN_CHARS = ((CASTLE_WK, 'K'), (CASTLE_WQ, 'Q'), (CASTLE_BK, 'k'), (CASTLE_BQ, 'q'))
+CASTLE_RIGHTS_BY_COLOR = [CASTLE_WK | CASTLE_WQ, CASTLE_BK | CASTLE_BQ] # [bianco, nero]
+# Diritti che sopravvivono a una mossa che parte da / arriva su una casa:
+# rights &= CASTLING_RIGHTS_MASK[from] & CASTLING_RIGHTS_MASK[to] (re e torri mosse o torri catturate)
+CASTLING_RIGHTS_MASK = [CASTLE_ALL] * 64
+CASTLING_RIGHTS_MASK[0] = CASTLE_ALL ^ CASTLE_BQ                 # a8
+CASTLING_RIGHTS_MASK[7] = CASTLE_ALL ^ CASTLE_BK                 # h8
+CASTLING_RIGHTS_MASK[4] = CASTLE_ALL ^ (CASTLE_BK | CASTLE_BQ)   # e8
+CASTLING_RIGHTS_MASK[56] = CASTLE_ALL ^ CASTLE_WQ                # a1
+CASTLING_RIGHTS_MASK[63] = CASTLE_ALL ^ CASTLE_WK                # h1
+CASTLING_RIGHTS_MASK[60] = CASTLE_ALL ^ (CASTLE_WK | CASTLE_WQ)  # e1
+
+# Capacità iniziale delle pile di undo per ply (raddoppiate se una partita le riempie)
+UNDO_STACK_SIZE = 1024
+
 # --- Costanti Libro Aperture (Polyglot) ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__)) # Potrebbe servire aggiustarlo in base a dove esegui main.py
 BOOK_FILENAME = "book_.bin"
 BOOK_PATH = os.path.join(SCRIPT_DIR, BOOK_FILENAME)
+
+# --- Snapshot della Transposition Table (opzioni UCI Hash File / Save Hash / Load Hash) ---
+TT_SNAPSHOT_FILENAME = "hash.tt"
+TT_SNAPSHOT_PATH = os.path.join(SCRIPT_DIR, TT_SNAPSHOT_FILENAME)
+
+# --- Rete NNUE (opzioni UCI Use NNUE / EvalFile, richiede NumPy) ---
+NNUE_FILENAME = "nn.bin"
+NNUE_PATH = os.path.join(SCRIPT_DIR, NNUE_FILENAME)
 # CHESS_POLYGLOT_AVAILABLE verrà definito in base all'import in altri moduli
\ No newline at end of file
@@ -1,21 +1,57 @@
 # -*- coding: utf-8 -*-
+from array import array
+
 import constants
 import pst
+from bitboard import (FILE_A, FILE_H, KNIGHT_ATTACKS, KING_ATTACKS, BETWEEN_BB, FORWARD_FILE_BB, PASSED_PAWN_MASK,
+                      BEHIND_ADJACENT_BB, KING_SHIELD_BB, ROW_MASKS, WHITE, BLACK,
+                      rook_attacks, bishop_attacks, iter_squares)
+
+# Codici interi dei pezzi (mailbox bytearray, vedi constants.PIECE_CODES)
+WP, WN, WB, WR, WQ, WK = (constants.WHITE_PAWN, constants.WHITE_KNIGHT, constants.WHITE_BISHOP,
+                          constants.WHITE_ROOK, constants.WHITE_QUEEN, constants.WHITE_KING)
+BP, BN, BB, BR, BQ, BK = (constants.BLACK_PAWN, constants.BLACK_KNIGHT, constants.BLACK_BISHOP,
+                          constants.BLACK_ROOK, constants.BLACK_QUEEN, constants.BLACK_KING)
+
+# Maschere per valore di MOBILITY_SQUARE_BONUS: somma bonus = sum(valore * popcount(attacchi & maschera))
+MOBILITY_BONUS_MASKS = []
+for _bonus in sorted(set(constants.MOBILITY_SQUARE_BONUS)):
+    if _bonus:
+        MOBILITY_BONUS_MASKS.append((_bonus, sum(1 << sq for sq in range(64) if constants.MOBILITY_SQUARE_BONUS[sq] == _bonus)))
+
+RAM_ROWS_MASK = 0
+for _r in range(1, 7): # Pedoni bianchi considerati per i ram: righe 1..6
+    RAM_ROWS_MASK |= ROW_MASKS[_r]
+
+def board_to_squares(board_array):
+    """Converte la vista [r][c] di caratteri nella mailbox bytearray di codici interi."""
+    squares = bytearray(64)
+    for r in range(8):
+        for c in range(8):
+            piece = board_array[r][c]
+            if piece != '.':
+                squares[r * 8 + c] = constants.PIECE_CODES[piece]
+    return squares
 
-def get_piece_color(piece): # Funzione helper locale o importata da board? Mettiamola qui per ora.
-    if piece == '.': return None
-    return 'W' if piece.isupper() else 'B'
+def squares_to_piece_squares(squares):
+    """Costruisce gli insiemi di case per codice pezzo (come ChessEngine.piece_squares) dalla mailbox."""
+    piece_squares = [set() for _ in range(15)]
+    for sq, code in enumerate(squares):
+        if code:
+            piece_squares[code].add(sq)
+    return piece_squares
 
 # --- NUOVA Funzione per Calcolare Fase Numerica ---
-def calculate_game_phase(board_array):
+def calculate_game_phase(piece_squares):
     """Calcola la fase numerica della partita (0=EG puro, GAME_PHASE_MAX=MG pieno)."""
+    return _game_phase_from_counts([len(code_squares) for code_squares in piece_squares])
+
+def _game_phase_from_counts(counts):
+    """Fase numerica dai conteggi dei pezzi per codice (vedi calculate_game_phase)."""
     current_phase_score = 0
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece != '.':
-                # Usa PIECE_PHASE_VALUES da constants
-                current_phase_score += constants.PIECE_PHASE_VALUES.get(piece.lower(), 0)
+    phase_by_code = constants.PIECE_PHASE_BY_CODE # Valori di PIECE_PHASE_VALUES per codice
+    for code in (WN, WB, WR, WQ, BN, BB, BR, BQ, WP, BP):
+        current_phase_score += phase_by_code[code] * counts[code]
     # Limita tra 0 e GAME_PHASE_MAX (importante se i valori non sono perfetti)
     phase = max(0, min(constants.GAME_PHASE_MAX, current_phase_score))
     return phase
@@ -31,134 +67,140 @@ def get_tapered_value(mg_eg_tuple, phase):
     tapered = ((mg_val * phase) + (eg_val * (max_phase - phase))) / max_phase
     return int(tapered) # Ritorna un intero
 
-# --- NUOVA Funzione Helper per Interpolazione PST ---
-def get_tapered_pst_value(piece_char, square_index, phase):
-    """Ottiene il valore PST. Interpola SOLO per il Re."""
-    piece_type = piece_char.lower()
-    max_phase = constants.GAME_PHASE_MAX
-    if max_phase == 0: max_phase = 1 # Evita divisione per zero
-
-    # Applica mirroring PRIMA di accedere alle tabelle
-    lookup_index = square_index ^ 56 if piece_char.islower() else square_index
-    if not (0 <= lookup_index < 64): return 0
-
-    # --- Logica Modificata ---
-    if piece_type == 'k':
-        # Interpola SOLO per il Re
-        mg_val = pst.KING_PST_MIDGAME[lookup_index]
-        eg_val = pst.KING_PST_ENDGAME[lookup_index]
-        tapered_val = ((mg_val * phase) + (eg_val * (max_phase - phase))) / max_phase
-        return int(tapered_val)
-    else:
-        # Per TUTTI gli altri pezzi (P, N, B, R, Q): usa il valore PST standard (MG)
-        # senza considerare la fase.
-        table_key = piece_type
-        table = pst._PST_TABLES.get(table_key) # Accede al dizionario interno di pst
-        if table is None: return 0
-        # Ritorna direttamente il valore dalla tabella MG
-        return table[lookup_index]
-
-def _estimate_game_phase(board_array):
-    """Stima la fase della partita (MIDGAME o ENDGAME)."""
-    white_material = 0
-    black_material = 0
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece != '.':
-                piece_type = piece.lower()
-                if piece_type != 'k':
-                    value = constants.PIECE_VALUES_SIMPLE_FOR_PHASE.get(piece_type, 0)
-                    if get_piece_color(piece) == 'W':
-                        white_material += value
-                    else:
-                        black_material += value
-    total_material = white_material + black_material
-    return "ENDGAME" if total_material <= constants.ENDGAME_MATERIAL_THRESHOLD else "MIDGAME"
-
-def _calculate_bishop_pair(white_bishops, black_bishops):
-    """Calcola il bonus/malus per la coppia di alfieri."""
-    score = 0
-    if white_bishops >= 2: score += constants.BISHOP_PAIR_BONUS
-    if black_bishops >= 2: score -= constants.BISHOP_PAIR_BONUS
-    return score
-
-def _calculate_pawn_structure(board_array, white_pawns_on_file_counts, black_pawns_on_file_counts, phase): # Aggiunto phase
-    """Calcola i termini di valutazione relativi alla struttura pedonale (tapered)."""
-    # Ottieni i valori tapered delle penalità
-    penalty_doubled = get_tapered_value(constants.DOUBLED_PAWN_PENALTY, phase)
-    penalty_isolated = get_tapered_value(constants.ISOLATED_PAWN_PENALTY, phase)
-    penalty_backward = get_tapered_value(constants.BACKWARD_PAWN_PENALTY, phase)
+# Entry della pawn hash table: tutto ciò che dipende solo dalle bitboard dei pedoni, senza fase.
+# I termini sono conteggi netti (bianco - nero) da moltiplicare per i valori tapered:
+#   (conteggi per colonna bianchi, conteggi per colonna neri, bitboard passati bianchi,
+#    bitboard passati neri, doppiati, isolati, arretrati, rams,
+#    passati come coppie (indice di rango, conteggio netto))
+PAWN_FILE_COUNTS_WHITE, PAWN_FILE_COUNTS_BLACK, PAWN_PASSED_WHITE, PAWN_PASSED_BLACK = range(4)
 
-    pawn_structure_score = 0
-    white_pawn_positions = []
-    black_pawn_positions = []
-    white_pawn_on_file_exists = [False] * 8
-    black_pawn_on_file_exists = [False] * 8
+def _calculate_pawn_entry(white_pawns_bb, black_pawns_bb):
+    """Calcola l'entry della pawn hash table per le due bitboard dei pedoni."""
+    white_pawns_on_file_counts = [0] * 8
+    black_pawns_on_file_counts = [0] * 8
+    for sq in iter_squares(white_pawns_bb):
+        white_pawns_on_file_counts[sq & 7] += 1
+    for sq in iter_squares(black_pawns_bb):
+        black_pawns_on_file_counts[sq & 7] += 1
 
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece == 'P':
-                white_pawn_positions.append((r, c))
-                white_pawn_on_file_exists[c] = True
-            elif piece == 'p':
-                black_pawn_positions.append((r, c))
-                black_pawn_on_file_exists[c] = True
-
-    # Penalità Pedoni Doppiati (usa valore tapered)
+    # Pedoni Doppiati
+    doubled = 0
     for c in range(8):
-        if white_pawns_on_file_counts[c] > 1:
-            pawn_structure_score -= penalty_doubled * (white_pawns_on_file_counts[c] - 1)
-        if black_pawns_on_file_counts[c] > 1:
-            pawn_structure_score += penalty_doubled * (black_pawns_on_file_counts[c] - 1)
-
-    # Penalità Pedoni Isolati E Arretrati (usa valori tapered)
-    # Pedoni Bianchi
-    for r_pawn, c_pawn in white_pawn_positions:
-        is_isolated = True
-        has_support_behind_left = False
-        has_support_behind_right = False
-        if c_pawn > 0:
-            if white_pawn_on_file_exists[c_pawn - 1]: is_isolated = False
-            for r_check in range(r_pawn + 1, 8):
-                if board_array[r_check][c_pawn - 1] == 'P': has_support_behind_left = True; break
-        if c_pawn < 7:
-            if white_pawn_on_file_exists[c_pawn + 1]: is_isolated = False
-            for r_check in range(r_pawn + 1, 8):
-                if board_array[r_check][c_pawn + 1] == 'P': has_support_behind_right = True; break
-        if is_isolated: pawn_structure_score -= penalty_isolated # Usa tapered
-        is_backward = not has_support_behind_left and not has_support_behind_right
-        if is_backward:
-            is_semi_open = True
-            for r_check in range(r_pawn - 1, -1, -1):
-                if board_array[r_check][c_pawn] == 'P': is_semi_open = False; break
-            if is_semi_open: pawn_structure_score -= penalty_backward # Usa tapered
-
-    # Pedoni Neri (logica speculare)
-    for r_pawn, c_pawn in black_pawn_positions:
-        is_isolated = True
-        has_support_behind_left = False
-        has_support_behind_right = False
-        if c_pawn > 0:
-            if black_pawn_on_file_exists[c_pawn - 1]: is_isolated = False
-            for r_check in range(r_pawn - 1, -1, -1):
-                if board_array[r_check][c_pawn - 1] == 'p': has_support_behind_left = True; break
-        if c_pawn < 7:
-            if black_pawn_on_file_exists[c_pawn + 1]: is_isolated = False
-            for r_check in range(r_pawn - 1, -1, -1):
-                if board_array[r_check][c_pawn + 1] == 'p': has_support_behind_right = True; break
-        if is_isolated: pawn_structure_score += penalty_isolated # Usa tapered
-        is_backward = not has_support_behind_left and not has_support_behind_right
-        if is_backward:
-            is_semi_open = True
-            for r_check in range(r_pawn + 1, 8):
-                if board_array[r_check][c_pawn] == 'p': is_semi_open = False; break
-            if is_semi_open: pawn_structure_score += penalty_backward # Usa tapered
-
-    return pawn_structure_score
-
-def _calculate_rook_placement(board_array, white_pawns_on_file_counts, black_pawns_on_file_counts, phase): # Aggiunto phase
+        if white_pawns_on_file_counts[c] > 1: doubled += white_pawns_on_file_counts[c] - 1
+        if black_pawns_on_file_counts[c] > 1: doubled -= black_pawns_on_file_counts[c] - 1
+
+    # Isolati, Arretrati e Passati
+    # Arretrato = nessun pedone amico dietro sulle colonne adiacenti; conta solo se la colonna
+    # davanti è libera da pedoni amici (tabelle BEHIND_ADJACENT_BB / FORWARD_FILE_BB)
+    # Passato = nessun pedone nemico davanti nella sua colonna e in quelle adiacenti
+    isolated = 0
+    backward = 0
+    passed_bbs = [0, 0]
+    passed_by_rank = [0] * 8
+    for side, pawns_bb, enemy_pawns_bb, counts, sign in (
+            (WHITE, white_pawns_bb, black_pawns_bb, white_pawns_on_file_counts, 1),
+            (BLACK, black_pawns_bb, white_pawns_bb, black_pawns_on_file_counts, -1)):
+        for sq in iter_squares(pawns_bb):
+            c_pawn = sq & 7
+            if not ((c_pawn > 0 and counts[c_pawn - 1]) or (c_pawn < 7 and counts[c_pawn + 1])):
+                isolated += sign
+            if not BEHIND_ADJACENT_BB[side][sq] & pawns_bb and not FORWARD_FILE_BB[side][sq] & pawns_bb:
+                backward += sign
+            # Pedoni non possono essere passati sulla 1a/8a riga
+            if 8 <= sq < 56 and not PASSED_PAWN_MASK[side][sq] & enemy_pawns_bb:
+                passed_bbs[side] |= 1 << sq
+                r = sq >> 3
+                rank_index = (7 - r) if side == WHITE else r # Indice 0=vicino alla propria base, 7=vicino alla promozione
+                passed_by_rank[rank_index] += sign
+
+    # Rams: pedone nero sulla casa davanti a un pedone bianco
+    rams = (((white_pawns_bb & RAM_ROWS_MASK) >> 8) & black_pawns_bb).bit_count()
+
+    passed_ranks = tuple((rank_index, count) for rank_index, count in enumerate(passed_by_rank) if count)
+    return (white_pawns_on_file_counts, black_pawns_on_file_counts, passed_bbs[WHITE], passed_bbs[BLACK],
+            doubled, isolated, backward, rams, passed_ranks)
+
+def _pawn_structure_score(pawn_entry, phase):
+    """Punteggio tapered della struttura pedonale (doppiati, isolati, arretrati, passati, rams)."""
+    _, _, _, _, doubled, isolated, backward, rams, passed_ranks = pawn_entry
+    score = -(get_tapered_value(constants.DOUBLED_PAWN_PENALTY, phase) * doubled +
+              get_tapered_value(constants.ISOLATED_PAWN_PENALTY, phase) * isolated +
+              get_tapered_value(constants.BACKWARD_PAWN_PENALTY, phase) * backward +
+              get_tapered_value(constants.PAWN_RAM_PENALTY, phase) * rams)
+    if passed_ranks:
+        bonus_passed_base = get_tapered_value(constants.PASSED_PAWN_BONUS_BASE, phase)
+        for rank_index, count in passed_ranks:
+            score += (bonus_passed_base + get_tapered_value(constants.PASSED_PAWN_RANK_BONUS[rank_index], phase)) * count
+    return score
+
+class PawnHashTable:
+    """
+    Cache delle entry di _calculate_pawn_entry indicizzata dalla chiave dei pedoni
+    (ChessEngine.pawn_key, aggiornata in make/unmake). La struttura pedonale cambia di rado
+    tra nodi vicini: quasi tutte le valutazioni la trovano già calcolata.
+    Sostituzione sempre; hits/misses contano gli accessi.
+    """
+    def __init__(self, size=constants.PAWN_HASH_SIZE):
+        self.mask = size - 1 # size è una potenza di 2
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        size = self.mask + 1
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, pawn_key, white_pawns_bb, black_pawns_bb):
+        """Entry per la chiave pawn_key (le bitboard servono solo per calcolarla se manca)."""
+        index = pawn_key & self.mask
+        if self.keys[index] == pawn_key:
+            self.hits += 1
+            return self.entries[index]
+        self.misses += 1
+        entry = _calculate_pawn_entry(white_pawns_bb, black_pawns_bb)
+        self.keys[index] = pawn_key
+        self.entries[index] = entry
+        return entry
+
+class EvalCache:
+    """
+    Cache della valutazione statica indicizzata dall'hash Zobrist completo: due array piatti
+    (hash a 64 bit e score dal punto di vista del Bianco, così vale per entrambi i lati).
+    Sostituzione sempre; hits/misses contano gli accessi.
+    """
+    def __init__(self, size=constants.EVAL_CACHE_SIZE):
+        self.mask = size - 1 # size è una potenza di 2
+        self.keys = array('Q', bytes(8 * size))
+        self.scores = array('i', bytes(4 * size))
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        size = self.mask + 1
+        self.keys = array('Q', bytes(8 * size))
+        self.scores = array('i', bytes(4 * size))
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, position_hash):
+        """Score dal punto di vista del Bianco, o None se la posizione non è in cache."""
+        index = position_hash & self.mask
+        if self.keys[index] == position_hash:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        return None
+
+    def store(self, position_hash, white_score):
+        index = position_hash & self.mask
+        self.keys[index] = position_hash
+        self.scores[index] = white_score
+
+def _calculate_rook_placement(piece_squares, white_pawns_on_file_counts, black_pawns_on_file_counts, phase): # Aggiunto phase
     """Calcola i bonus per il posizionamento delle torri (tapered)."""
     # Ottieni i bonus tapered
     bonus_rook_open = get_tapered_value(constants.ROOK_OPEN_FILE_BONUS, phase)
@@ -166,43 +208,30 @@ def _calculate_rook_placement(board_array, white_pawns_on_file_counts, black_paw
     bonus_rook_seventh = get_tapered_value(constants.ROOK_ON_SEVENTH_BONUS, phase)
 
     rook_placement_score = 0
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece.lower() == 'r':
-                is_white_rook = (piece == 'R')
-                is_open_file = (white_pawns_on_file_counts[c] == 0 and black_pawns_on_file_counts[c] == 0)
-                is_semi_open_for_white = (white_pawns_on_file_counts[c] == 0 and black_pawns_on_file_counts[c] > 0) # Modificato per chiarezza
-                is_semi_open_for_black = (black_pawns_on_file_counts[c] == 0 and white_pawns_on_file_counts[c] > 0) # Modificato per chiarezza
-
-                if is_white_rook:
-                    if is_open_file: rook_placement_score += bonus_rook_open # Usa tapered
-                    elif is_semi_open_for_white: rook_placement_score += bonus_rook_semi_open # Usa tapered
-                    if r == 1: # Riga 7 dal punto di vista del nero (indice 1)
-                         rook_placement_score += bonus_rook_seventh # Usa tapered
-                else: # Torre Nera
-                    if is_open_file: rook_placement_score -= bonus_rook_open # Usa tapered
-                    elif is_semi_open_for_black: rook_placement_score -= bonus_rook_semi_open # Usa tapered
-                    if r == 6: # Riga 2 dal punto di vista del bianco (indice 6)
-                         rook_placement_score -= bonus_rook_seventh # Usa tapered
+    for code in (WR, BR):
+        for sq in piece_squares[code]:
+            r, c = sq >> 3, sq & 7
+            is_open_file = (white_pawns_on_file_counts[c] == 0 and black_pawns_on_file_counts[c] == 0)
+            is_semi_open_for_white = (white_pawns_on_file_counts[c] == 0 and black_pawns_on_file_counts[c] > 0) # Modificato per chiarezza
+            is_semi_open_for_black = (black_pawns_on_file_counts[c] == 0 and white_pawns_on_file_counts[c] > 0) # Modificato per chiarezza
+
+            if code == WR:
+                if is_open_file: rook_placement_score += bonus_rook_open # Usa tapered
+                elif is_semi_open_for_white: rook_placement_score += bonus_rook_semi_open # Usa tapered
+                if r == 1: # Riga 7 dal punto di vista del nero (indice 1)
+                     rook_placement_score += bonus_rook_seventh # Usa tapered
+            else: # Torre Nera
+                if is_open_file: rook_placement_score -= bonus_rook_open # Usa tapered
+                elif is_semi_open_for_black: rook_placement_score -= bonus_rook_semi_open # Usa tapered
+                if r == 6: # Riga 2 dal punto di vista del bianco (indice 6)
+                     rook_placement_score -= bonus_rook_seventh # Usa tapered
     return rook_placement_score
 
-def _count_pieces_between(board_array, r1, c1, r2, c2):
+def _count_pieces_between(occupied, sq1, sq2):
     """Conta i pezzi tra due case (esclusi gli estremi) su una linea retta o diagonale."""
-    count = 0
-    dr = 0 if r1 == r2 else (1 if r2 > r1 else -1)
-    dc = 0 if c1 == c2 else (1 if c2 > c1 else -1)
-    r, c = r1 + dr, c1 + dc
-    while r != r2 or c != c2:
-        if not (0 <= r < 8 and 0 <= c < 8): # Sicurezza extra, non dovrebbe servire
-            break
-        if board_array[r][c] != '.':
-            count += 1
-        r += dr
-        c += dc
-    return count
-
-def _calculate_king_safety(board_array, white_king_pos, black_king_pos,
+    return (BETWEEN_BB[sq1][sq2] & occupied).bit_count()
+
+def _calculate_king_safety(piece_squares, white_pawns_bb, black_pawns_bb, occupied, white_king_pos, black_king_pos,
                            white_pawns_on_file_counts, black_pawns_on_file_counts, phase): # Aggiunto phase, rimosso game_phase
     """
     Calcola i termini di valutazione relativi alla sicurezza del Re (tapered).
@@ -224,16 +253,9 @@ def _calculate_king_safety(board_array, white_king_pos, black_king_pos,
         kr, kc = white_king_pos
         # 1. Scudo Pedoni Bianchi (vale più in MG, taper a 0 in EG)
         if bonus_king_shield != 0: # Ottimizzazione: non cercare se il bonus è 0
-            shield_squares = []
-            # ... (logica invariata per trovare shield_squares) ...
-            if kr > 0:
-                shield_squares.extend([(kr-1, kc)])
-                if kc > 0: shield_squares.append((kr-1, kc-1))
-                if kc < 7: shield_squares.append((kr-1, kc+1))
-            # ... (altre case scudo, se necessario) ...
-            for sr, sc in shield_squares:
-                if 0 <= sr < 8 and 0 <= sc < 8 and board_array[sr][sc] == 'P':
-                    king_safety_score += bonus_king_shield # Usa tapered
+            # Case scudo: riga davanti al re, colonne kc-1..kc+1 (KING_SHIELD_BB)
+            shield_pawns = (KING_SHIELD_BB[WHITE][kr * 8 + kc] & white_pawns_bb).bit_count()
+            king_safety_score += bonus_king_shield * shield_pawns # Usa tapered
 
         # 2. Penalità Colonne Aperte/Semi-Aperte vicino al Re Bianco (vale più in MG, taper a ~0 in EG)
         if penalty_king_open != 0 or penalty_king_semi_open != 0:
@@ -246,29 +268,27 @@ def _calculate_king_safety(board_array, white_king_pos, black_king_pos,
 
         # 3. Penalità Attacchi EG su Linee Aperte/Semi (vale 0 in MG, taper a valore pieno in EG)
         enemy_pieces_heavy = [] # Trova pezzi pesanti NERI
-        for r in range(8):
-            for c in range(8):
-                piece = board_array[r][c]
-                if piece == 'r' or piece == 'q':
-                    enemy_pieces_heavy.append((piece, r, c))
+        for code in (BR, BQ):
+            for sq in piece_squares[code]:
+                enemy_pieces_heavy.append((code, sq >> 3, sq & 7))
 
         if penalty_eg_rook_open != 0 or penalty_eg_rook_semi != 0 or \
            penalty_eg_queen_open != 0 or penalty_eg_queen_semi != 0:
             for piece, pr, pc in enemy_pieces_heavy:
-                piece_type = piece.lower()
+                piece_type = piece & constants.TYPE_MASK
                 on_same_line = False
                 is_diagonal = abs(kr - pr) == abs(kc - pc)
                 is_straight = (kr == pr) or (kc == pc)
-                if piece_type == 'r' and is_straight: on_same_line = True
-                if piece_type == 'q' and (is_straight or is_diagonal): on_same_line = True
+                if piece_type == constants.ROOK and is_straight: on_same_line = True
+                if piece_type == constants.QUEEN and (is_straight or is_diagonal): on_same_line = True
 
                 if on_same_line:
-                    pieces_between = _count_pieces_between(board_array, kr, kc, pr, pc)
+                    pieces_between = _count_pieces_between(occupied, kr * 8 + kc, pr * 8 + pc)
                     if pieces_between == 0: # Linea aperta
-                        penalty = penalty_eg_rook_open if piece_type == 'r' else penalty_eg_queen_open
+                        penalty = penalty_eg_rook_open if piece_type == constants.ROOK else penalty_eg_queen_open
                         king_safety_score -= penalty # Usa tapered
                     elif pieces_between == 1: # Linea semi-aperta
-                        penalty = penalty_eg_rook_semi if piece_type == 'r' else penalty_eg_queen_semi
+                        penalty = penalty_eg_rook_semi if piece_type == constants.ROOK else penalty_eg_queen_semi
                         king_safety_score -= penalty # Usa tapered
 
     # --- Termini relativi alla Sicurezza Re Nero (logica speculare) ---
@@ -276,16 +296,8 @@ def _calculate_king_safety(board_array, white_king_pos, black_king_pos,
         kr, kc = black_king_pos
         # 1. Scudo Pedoni Neri
         if bonus_king_shield != 0:
-            shield_squares = []
-            # ... (logica invariata per trovare shield_squares per il nero) ...
-            if kr < 7:
-                shield_squares.extend([(kr+1, kc)])
-                if kc > 0: shield_squares.append((kr+1, kc-1))
-                if kc < 7: shield_squares.append((kr+1, kc+1))
-            # ...
-            for sr, sc in shield_squares:
-                if 0 <= sr < 8 and 0 <= sc < 8 and board_array[sr][sc] == 'p':
-                    king_safety_score -= bonus_king_shield # Bonus nero = malus bianco (usa tapered)
+            shield_pawns = (KING_SHIELD_BB[BLACK][kr * 8 + kc] & black_pawns_bb).bit_count()
+            king_safety_score -= bonus_king_shield * shield_pawns # Bonus nero = malus bianco (usa tapered)
 
         # 2. Penalità Colonne Aperte/Semi-Aperte vicino al Re Nero
         if penalty_king_open != 0 or penalty_king_semi_open != 0:
@@ -298,155 +310,74 @@ def _calculate_king_safety(board_array, white_king_pos, black_king_pos,
 
         # 3. Penalità Attacchi EG su Linee Aperte/Semi (da pezzi BIANCHI)
         enemy_pieces_heavy = [] # Trova pezzi pesanti BIANCHI
-        for r in range(8):
-            for c in range(8):
-                piece = board_array[r][c]
-                if piece == 'R' or piece == 'Q':
-                    enemy_pieces_heavy.append((piece, r, c))
+        for code in (WR, WQ):
+            for sq in piece_squares[code]:
+                enemy_pieces_heavy.append((code, sq >> 3, sq & 7))
 
         if penalty_eg_rook_open != 0 or penalty_eg_rook_semi != 0 or \
            penalty_eg_queen_open != 0 or penalty_eg_queen_semi != 0:
             for piece, pr, pc in enemy_pieces_heavy:
-                piece_type = piece.lower()
+                piece_type = piece & constants.TYPE_MASK
                 on_same_line = False
                 is_diagonal = abs(kr - pr) == abs(kc - pc)
                 is_straight = (kr == pr) or (kc == pc)
-                if piece_type == 'r' and is_straight: on_same_line = True
-                if piece_type == 'q' and (is_straight or is_diagonal): on_same_line = True
+                if piece_type == constants.ROOK and is_straight: on_same_line = True
+                if piece_type == constants.QUEEN and (is_straight or is_diagonal): on_same_line = True
 
                 if on_same_line:
-                    pieces_between = _count_pieces_between(board_array, kr, kc, pr, pc)
+                    pieces_between = _count_pieces_between(occupied, kr * 8 + kc, pr * 8 + pc)
                     if pieces_between == 0: # Linea aperta
-                        penalty = penalty_eg_rook_open if piece_type == 'r' else penalty_eg_queen_open
+                        penalty = penalty_eg_rook_open if piece_type == constants.ROOK else penalty_eg_queen_open
                         king_safety_score += penalty # Penalità nero = bonus bianco (usa tapered)
                     elif pieces_between == 1: # Linea semi-aperta
-                        penalty = penalty_eg_rook_semi if piece_type == 'r' else penalty_eg_queen_semi
+                        penalty = penalty_eg_rook_semi if piece_type == constants.ROOK else penalty_eg_queen_semi
                         king_safety_score += penalty # Usa tapered
 
     return king_safety_score
 
-def _calculate_passed_pawns(board_array, phase, tapered_rank_bonus_list): # Aggiunto phase e tapered_rank_bonus_list
-    """Calcola il bonus/malus per i pedoni passati (tapered)."""
-    passed_pawn_score = 0
-    # Ottieni il bonus base tapered
-    bonus_passed_base = get_tapered_value(constants.PASSED_PAWN_BONUS_BASE, phase)
+def _mobility_bonus(targets):
+    """Somma MOBILITY_SQUARE_BONUS sulle case della bitboard targets."""
+    total = 0
+    for bonus, mask in MOBILITY_BONUS_MASKS:
+        total += bonus * (targets & mask).bit_count()
+    return total
 
-    for r in range(1, 7): # Pedoni non possono essere passati sulla 1a/8a riga
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece.lower() == 'p':
-                piece_color = get_piece_color(piece)
-                is_passed = True
-                # Direzione di avanzamento del pedone corrente
-                advance_direction = -1 if piece_color == 'W' else 1
-                # Righe davanti al pedone nella sua colonna e colonne adiacenti
-                check_range_row = range(r + advance_direction, -1 if piece_color == 'W' else 8, advance_direction)
-                enemy_pawn = 'p' if piece_color == 'W' else 'P'
-
-                # Controlla pedoni nemici davanti nelle 3 colonne rilevanti
-                for check_r in check_range_row:
-                    # Colonna stessa
-                    if board_array[check_r][c] == enemy_pawn: is_passed = False; break
-                    # Colonna sinistra
-                    if c > 0 and board_array[check_r][c - 1] == enemy_pawn: is_passed = False; break
-                    # Colonna destra
-                    if c < 7 and board_array[check_r][c + 1] == enemy_pawn: is_passed = False; break
-                if not is_passed: continue # Se trovi un blocco, vai al prossimo pedone
-
-                # È passato!
-                # Usa la lista dei bonus di rango GIA' TAPERED passata come argomento
-                rank_index = (7 - r) if piece_color == 'W' else r # Indice 0=vicino alla propria base, 7=vicino alla promozione
-                rank_bonus = tapered_rank_bonus_list[rank_index]
-
-                bonus = bonus_passed_base + rank_bonus # Somma base tapered + rank tapered
-                passed_pawn_score += bonus if piece_color == 'W' else -bonus
-    return passed_pawn_score
-
-def _calculate_mobility(board_array):
+def _calculate_mobility(piece_squares, white_occupancy, black_occupancy):
     """Calcola il bonus/malus per la mobilità dei pezzi (esclusi Re e Pedoni)."""
     mobility_score = 0
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece != '.' and piece.lower() not in ('p', 'k'):
-                piece_char = piece
-                piece_color = get_piece_color(piece_char)
-                piece_type = piece.lower()
-                square_index = r * 8 + c
-                piece_mobility_value_sum = 0
-
-                if piece_type == 'n':
-                    knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-                    multiplier = constants.MOBILITY_KNIGHT_MULTIPLIER
-                    for dr, dc in knight_moves:
-                        nr, nc = r + dr, c + dc
-                        if 0 <= nr < 8 and 0 <= nc < 8:
-                            target_piece = board_array[nr][nc]
-                            if target_piece == '.' or get_piece_color(target_piece) != piece_color:
-                                target_square_index = nr * 8 + nc
-                                piece_mobility_value_sum += constants.MOBILITY_SQUARE_BONUS[target_square_index]
-                    mobility_score += piece_mobility_value_sum * multiplier * (1 if piece_color == 'W' else -1)
-
-                elif piece_type in ('b', 'r', 'q'):
-                    directions = []
-                    multiplier = 0
-                    if piece_type == 'b': directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]; multiplier = constants.MOBILITY_BISHOP_MULTIPLIER
-                    elif piece_type == 'r': directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]; multiplier = constants.MOBILITY_ROOK_MULTIPLIER
-                    elif piece_type == 'q': directions = [(-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (1, 0), (0, -1), (0, 1)]; multiplier = constants.MOBILITY_QUEEN_MULTIPLIER
-
-                    for dr, dc in directions:
-                        for i in range(1, 8):
-                            sr, sc = r + i * dr, c + i * dc
-                            if not (0 <= sr < 8 and 0 <= sc < 8): break
-                            target_piece = board_array[sr][sc]
-                            target_square_index = sr * 8 + sc
-                            if target_piece == '.':
-                                piece_mobility_value_sum += constants.MOBILITY_SQUARE_BONUS[target_square_index]
-                            else:
-                                if get_piece_color(target_piece) != piece_color:
-                                    piece_mobility_value_sum += constants.MOBILITY_SQUARE_BONUS[target_square_index]
-                                break
-                    mobility_score += piece_mobility_value_sum * multiplier * (1 if piece_color == 'W' else -1)
+    occupied = white_occupancy | black_occupancy
+    for base, own, sign in ((0, white_occupancy, 1), (constants.BLACK_FLAG, black_occupancy, -1)):
+        not_own = ~own
+        value = 0
+        for sq in piece_squares[base | constants.KNIGHT]:
+            value += _mobility_bonus(KNIGHT_ATTACKS[sq] & not_own) * constants.MOBILITY_KNIGHT_MULTIPLIER
+        for sq in piece_squares[base | constants.BISHOP]:
+            value += _mobility_bonus(bishop_attacks(sq, occupied) & not_own) * constants.MOBILITY_BISHOP_MULTIPLIER
+        for sq in piece_squares[base | constants.ROOK]:
+            value += _mobility_bonus(rook_attacks(sq, occupied) & not_own) * constants.MOBILITY_ROOK_MULTIPLIER
+        for sq in piece_squares[base | constants.QUEEN]:
+            value += _mobility_bonus((rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)) & not_own) * constants.MOBILITY_QUEEN_MULTIPLIER
+        mobility_score += sign * value
     return mobility_score
 
-def _calculate_pawn_rams(board_array, phase): # Aggiunto phase
-    """Calcola la penalità per i pedoni bloccati frontalmente (rams) (tapered)."""
-    penalty_ram = get_tapered_value(constants.PAWN_RAM_PENALTY, phase)
-    pawn_ram_score = 0
-    for c in range(8):
-        for r in range(1, 7):
-            if board_array[r][c] == 'P' and board_array[r-1][c] == 'p':
-                pawn_ram_score -= penalty_ram # Usa tapered
-    return pawn_ram_score
+# Mobilità massima di un pezzo per tipo (scacchiera vuota, casa migliore): limite dei margini lazy
+MOBILITY_MAX_BY_TYPE = [0] * 7
+MOBILITY_MAX_BY_TYPE[constants.KNIGHT] = max(_mobility_bonus(KNIGHT_ATTACKS[sq]) for sq in range(64)) * constants.MOBILITY_KNIGHT_MULTIPLIER
+MOBILITY_MAX_BY_TYPE[constants.BISHOP] = max(_mobility_bonus(bishop_attacks(sq, 0)) for sq in range(64)) * constants.MOBILITY_BISHOP_MULTIPLIER
+MOBILITY_MAX_BY_TYPE[constants.ROOK] = max(_mobility_bonus(rook_attacks(sq, 0)) for sq in range(64)) * constants.MOBILITY_ROOK_MULTIPLIER
+MOBILITY_MAX_BY_TYPE[constants.QUEEN] = max(_mobility_bonus(rook_attacks(sq, 0) | bishop_attacks(sq, 0))
+                                            for sq in range(64)) * constants.MOBILITY_QUEEN_MULTIPLIER
 
-def _calculate_material_imbalance(board_array, phase): # Aggiunto phase
-    """Calcola bonus/malus per coppie di Cavalli e Torri (tapered)."""
+def _calculate_material_imbalance(counts, phase): # Aggiunto phase
+    """Calcola bonus/malus per coppie di Cavalli e Torri (tapered) dai conteggi per codice."""
     # Ottieni valori tapered
     penalty_knight_pair = get_tapered_value(constants.KNIGHT_PAIR_PENALTY, phase)
     bonus_rook_pair = get_tapered_value(constants.ROOK_PAIR_BONUS, phase)
 
     imbalance_score = 0
-    white_knights = 0; black_knights = 0
-    white_bishops = 0; black_bishops = 0
-    white_rooks = 0;   black_rooks = 0
-
-    # ... (logica conteggio pezzi invariata) ...
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece != '.':
-                piece_color = get_piece_color(piece)
-                piece_type = piece.lower()
-                if piece_type == 'n':
-                    if piece_color == 'W': white_knights += 1
-                    else: black_knights += 1
-                elif piece_type == 'b':
-                    if piece_color == 'W': white_bishops += 1
-                    else: black_bishops += 1
-                elif piece_type == 'r':
-                    if piece_color == 'W': white_rooks += 1
-                    else: black_rooks += 1
-
+    white_knights = counts[WN]; black_knights = counts[BN]
+    white_bishops = counts[WB]; black_bishops = counts[BB]
+    white_rooks = counts[WR];   black_rooks = counts[BR]
 
     # 1. Penalità Coppia di Cavalli (usa valore tapered)
     if white_knights >= 2 and black_bishops >= 1:
@@ -462,14 +393,240 @@ def _calculate_material_imbalance(board_array, phase): # Aggiunto phase
 
     return imbalance_score
 
-def evaluate_board(board_array, current_player_color):
+# --- Material Hash Table ---
+# Entry: tutto ciò che dipende solo dai conteggi dei pezzi (ChessEngine.material_key)
+#   (fase, imbalance tapered (coppie di cavalli/torri/alfieri), materiale non pedoni [bianco, nero],
+#    materiale totale [bianco, nero], patta certa per materiale insufficiente, recognizer o None,
+#    margini della lazy evaluation (pedoni, torri/Re, mobilità), vedi _lazy_margins)
+# Il recognizer è una funzione recognizer(piece_squares) -> score esatto dal punto di vista del
+# Bianco, o None se la posizione non è riconosciuta (si usa la valutazione normale).
+(MATERIAL_PHASE, MATERIAL_IMBALANCE, MATERIAL_NON_PAWN, MATERIAL_VALUE, MATERIAL_DRAW, MATERIAL_RECOGNIZER,
+ MATERIAL_LAZY_MARGINS) = range(7)
+
+def material_key_from_piece_squares(piece_squares):
+    """Chiave materiale (come ChessEngine.material_key) dagli insiemi di case per codice."""
+    return sum(constants.MATERIAL_KEY_UNIT[code] * len(piece_squares[code]) for code in range(1, 15))
+
+def pst_score_from_piece_squares(piece_squares):
+    """
+    Somma PST dei pezzi esclusi i re (come ChessEngine.pst_score): le tabelle per codice sono
+    già specchiate per il nero e vengono sommate così come sono. I re sono interpolati con la
+    fase in evaluate_board.
+    """
+    pst_by_code = pst.PST_BY_CODE
+    total = 0
+    for code in (WP, WN, WB, WR, WQ, BP, BN, BB, BR, BQ):
+        table = pst_by_code[code]
+        for square_index in piece_squares[code]:
+            total += table[square_index]
+    return total
+
+def _material_counts(material_key):
+    """Conteggi dei pezzi per codice (lista di 15) codificati nella chiave materiale."""
+    bits = constants.MATERIAL_KEY_BITS
+    count_mask = constants.MATERIAL_COUNT_MASK
+    return [(material_key >> (bits * code)) & count_mask for code in range(15)]
+
+def _recognize_dead_draw(piece_squares):
+    """
+    KvK, KNvK, KBvK: il matto è impossibile (patta certa, MATERIAL_DRAW). KNNvK: il matto
+    non si può forzare ma esiste se il difensore sbaglia, quindi solo lo score statico è 0
+    e la ricerca continua.
+    """
+    return constants.DRAW_SCORE
+
+def _recognize_wrong_bishop(piece_squares, side):
+    """
+    KB + pedoni di torre contro K: patta se l'alfiere non controlla la casa di promozione
+    e il Re difensore è sulla casa di promozione o accanto.
+    """
+    pawn_code, bishop_code, weak_king_code = (WP, WB, BK) if side == WHITE else (BP, BB, WK)
+    pawns_bb = 0
+    for sq in piece_squares[pawn_code]:
+        pawns_bb |= 1 << sq
+    if not pawns_bb & ~FILE_A: promotion_file = 0
+    elif not pawns_bb & ~FILE_H: promotion_file = 7
+    else: return None
+    promotion_sq = promotion_file if side == WHITE else 56 | promotion_file
+    bishop_sq = next(iter(piece_squares[bishop_code]))
+    if ((bishop_sq >> 3) ^ bishop_sq) & 1 == ((promotion_sq >> 3) ^ promotion_sq) & 1:
+        return None # Alfiere del colore giusto
+    for king_sq in piece_squares[weak_king_code]:
+        if king_sq == promotion_sq or KING_ATTACKS[promotion_sq] >> king_sq & 1:
+            return constants.DRAW_SCORE
+    return None
+
+def _recognize_wrong_bishop_white(piece_squares):
+    return _recognize_wrong_bishop(piece_squares, WHITE)
+
+def _recognize_wrong_bishop_black(piece_squares):
+    return _recognize_wrong_bishop(piece_squares, BLACK)
+
+def _lazy_margins(counts, phase):
+    """
+    Limiti (in valore assoluto) dei gruppi di termini non ancora calcolati dalla lazy
+    evaluation: numero massimo di occorrenze di ogni termine per i pezzi presenti × il suo
+    peso tapered alla fase. Ogni gruppo è (termini a favore del Bianco) - (termini a favore
+    del Nero): il limite è il massimo tra i due lati.
+    """
+    taper = lambda weight: abs(get_tapered_value(weight, phase))
+    # Pedoni: ogni pedone è al più doppiato, isolato, arretrato e in un ram, oppure passato
+    pawn_penalty = (taper(constants.DOUBLED_PAWN_PENALTY) + taper(constants.ISOLATED_PAWN_PENALTY) +
+                    taper(constants.BACKWARD_PAWN_PENALTY) + taper(constants.PAWN_RAM_PENALTY))
+    pawn_bonus = taper(constants.PASSED_PAWN_BONUS_BASE) + max(map(taper, constants.PASSED_PAWN_RANK_BONUS))
+    # Torri: colonna aperta (o semiaperta) e settima; Re: scudo (3 case) e 3 colonne intorno,
+    # attacchi di torri e donne avversarie in finale
+    rook_bonus = max(taper(constants.ROOK_OPEN_FILE_BONUS), taper(constants.ROOK_SEMI_OPEN_FILE_BONUS)) + \
+                 taper(constants.ROOK_ON_SEVENTH_BONUS)
+    king_file_penalty = 3 * max(taper(constants.KING_OPEN_FILE_PENALTY), taper(constants.KING_SEMI_OPEN_FILE_PENALTY))
+    rook_attack = max(taper(constants.ENDGAME_KING_ROOK_ATTACK_OPEN), taper(constants.ENDGAME_KING_ROOK_ATTACK_SEMI))
+    queen_attack = max(taper(constants.ENDGAME_KING_QUEEN_ATTACK_OPEN), taper(constants.ENDGAME_KING_QUEEN_ATTACK_SEMI))
+    shield_bonus = taper(constants.KING_SHIELD_BONUS)
+    sides = []
+    for base, enemy in ((0, constants.BLACK_FLAG), (constants.BLACK_FLAG, 0)):
+        pawns, enemy_pawns = counts[base | constants.PAWN], counts[enemy | constants.PAWN]
+        rooks, queens = counts[base | constants.ROOK], counts[base | constants.QUEEN]
+        pawn_margin = pawns * pawn_bonus + enemy_pawns * pawn_penalty
+        piece_margin = (rooks * rook_bonus + min(3, pawns) * shield_bonus + king_file_penalty +
+                        rooks * rook_attack + queens * queen_attack)
+        mobility_margin = sum(counts[base | piece_type] * MOBILITY_MAX_BY_TYPE[piece_type]
+                              for piece_type in (constants.KNIGHT, constants.BISHOP, constants.ROOK, constants.QUEEN))
+        sides.append((pawn_margin, piece_margin, mobility_margin))
+    return tuple(max(white_margin, black_margin) for white_margin, black_margin in zip(*sides))
+
+def _calculate_material_entry(material_key):
+    """Calcola l'entry della material hash table per la chiave materiale."""
+    counts = _material_counts(material_key)
+    phase = _game_phase_from_counts(counts)
+
+    imbalance = _calculate_material_imbalance(counts, phase)
+    bonus_bishop_pair = get_tapered_value(constants.BISHOP_PAIR_BONUS, phase)
+    if counts[WB] >= 2: imbalance += bonus_bishop_pair
+    if counts[BB] >= 2: imbalance -= bonus_bishop_pair
+
+    values_by_code = constants.PIECE_VALUES_BY_CODE
+    non_pawn = tuple(sum(values_by_code[base | piece_type] * counts[base | piece_type]
+                         for piece_type in (constants.KNIGHT, constants.BISHOP, constants.ROOK, constants.QUEEN))
+                     for base in (0, constants.BLACK_FLAG))
+    value = tuple(non_pawn[side] + values_by_code[base | constants.PAWN] * counts[base | constants.PAWN]
+                  for side, base in ((WHITE, 0), (BLACK, constants.BLACK_FLAG)))
+
+    # Riconoscimento finali banali (solo pezzi, senza pedoni/torri/donne per la patta certa)
+    is_draw = False
+    recognizer = None
+    heavy_and_pawns = (counts[WP] + counts[BP] + counts[WR] + counts[BR] + counts[WQ] + counts[BQ])
+    white_minors = counts[WN] + counts[WB]
+    black_minors = counts[BN] + counts[BB]
+    if not heavy_and_pawns:
+        for minors, knights, other_minors in ((white_minors, counts[WN], black_minors),
+                                              (black_minors, counts[BN], white_minors)):
+            if not other_minors and (minors <= 1 or (minors == 2 and knights == 2)):
+                if minors <= 1: # KNNvK ha matti (non forzati): niente patta certa
+                    is_draw = True
+                recognizer = _recognize_dead_draw
+    elif not (counts[WN] + counts[WR] + counts[WQ] + counts[BP] + black_minors + counts[BR] + counts[BQ]) and counts[WB] == 1:
+        recognizer = _recognize_wrong_bishop_white # KB + pedoni contro K
+    elif not (counts[BN] + counts[BR] + counts[BQ] + counts[WP] + white_minors + counts[WR] + counts[WQ]) and counts[BB] == 1:
+        recognizer = _recognize_wrong_bishop_black
+    return (phase, imbalance, non_pawn, value, is_draw, recognizer, _lazy_margins(counts, phase))
+
+class MaterialHashTable:
+    """
+    Cache delle entry di _calculate_material_entry indicizzata dalla chiave materiale.
+    La chiave è un vettore di contatori, non un hash: l'indice la mescola (hash di Fibonacci).
+    Sostituzione sempre; hits/misses contano gli accessi.
+    """
+    def __init__(self, size=constants.MATERIAL_HASH_SIZE):
+        self.index_shift = 64 - (size.bit_length() - 1) # size è una potenza di 2
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        size = len(self.keys)
+        self.keys = [None] * size
+        self.entries = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, material_key):
+        index = ((material_key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self.index_shift
+        if self.keys[index] == material_key:
+            self.hits += 1
+            return self.entries[index]
+        self.misses += 1
+        entry = _calculate_material_entry(material_key)
+        self.keys[index] = material_key
+        self.entries[index] = entry
+        return entry
+
+class LazyEvalStats:
+    """
+    Strumentazione della lazy evaluation: reached[i] = valutazioni arrivate allo stadio i
+    (0 materiale/PST, 1 pedoni, 2 torri/Re, 3 mobilità), exits[i] = uscite anticipate dopo lo
+    stadio i, azzerati all'inizio di ogni search_move. Con verify=True ogni uscita anticipata ricalcola la valutazione completa:
+    differs conta gli score parziali diversi da quella completa, wrong_side quelli in cui la
+    valutazione completa cade dentro la finestra o dall'altra parte (margine violato).
+    """
+    def __init__(self):
+        self.verify = False
+        self.reset()
+
+    def reset(self):
+        self.reached = [0, 0, 0, 0]
+        self.exits = [0, 0, 0]
+        self.verified = 0
+        self.differs = 0
+        self.wrong_side = 0
+
+    def add(self, other):
+        """Somma i contatori di other (es. per totali su più ricerche, che azzerano i propri)."""
+        self.reached = [a + b for a, b in zip(self.reached, other.reached)]
+        self.exits = [a + b for a, b in zip(self.exits, other.exits)]
+        self.verified += other.verified
+        self.differs += other.differs
+        self.wrong_side += other.wrong_side
+
+lazy_eval_stats = LazyEvalStats()
+
+def evaluate_board(squares, current_player_color, piece_squares=None, pawn_key=None, pawn_table=None,
+                   material_key=None, material_table=None, pst_score=None, bitboards=None,
+                   alpha=None, beta=None):
+    """
+    Valutazione dal punto di vista di chi muove (vedi evaluate_board_bounded, che ritorna
+    anche se lo score è esatto o solo un limite per la finestra alpha/beta).
+    """
+    return evaluate_board_bounded(squares, current_player_color, piece_squares, pawn_key, pawn_table,
+                                  material_key, material_table, pst_score, bitboards, alpha, beta)[0]
+
+def evaluate_board_bounded(squares, current_player_color, piece_squares=None, pawn_key=None, pawn_table=None,
+                           material_key=None, material_table=None, pst_score=None, bitboards=None,
+                           alpha=None, beta=None):
     """
     Valuta la posizione usando Tapered Evaluation.
-    Chiama le funzioni helper aggiornate che accettano il parametro 'phase'.
+    squares è la mailbox bytearray di 64 codici interi (ChessEngine.squares);
+    la vecchia vista [r][c] di caratteri viene convertita con board_to_squares.
+    piece_squares sono gli insiemi di case per codice (ChessEngine.piece_squares):
+    se mancano vengono ricostruiti dalla mailbox.
+    pawn_key/pawn_table (ChessEngine.pawn_key e pawn_table): se presenti la struttura pedonale
+    viene letta dalla pawn hash table invece di essere ricalcolata.
+    material_key/material_table: come sopra per fase, materiale, imbalance e finali riconosciuti.
+    pst_score/bitboards (ChessEngine.pst_score e bitboards, aggiornati in make/unmake): somma
+    PST dei pezzi esclusi i re e bitboard per codice, altrimenti ricalcolate dagli insiemi.
+    alpha/beta (dal punto di vista di chi muove): lazy evaluation. I termini vengono sommati
+    dal più economico al più costoso; se lo score parziale, allargato dai limiti dei termini
+    mancanti (entry materiale, vedi _lazy_margins), è già fuori dalla finestra si ritorna il
+    limite garantito: un limite inferiore >= beta o superiore <= alpha dello score completo
+    (così il delta pruning della quiescenza resta corretto).
+    Ritorna (score, esatto): esatto è False per le uscite anticipate.
     """
+    if not isinstance(squares, (bytes, bytearray)):
+        squares = board_to_squares(squares)
+    if piece_squares is None:
+        piece_squares = squares_to_piece_squares(squares)
+
     # --- Inizializzazione Punteggi ---
-    material_score = 0
-    positional_score = 0 # Accumula PST tapered
     pawn_structure_score = 0
     piece_placement_score = 0 # Accumula bonus/malus piazzamento (es. coppia alfieri, torri)
     king_safety_score = 0
@@ -477,72 +634,55 @@ def evaluate_board(board_array, current_player_color):
     tempo_bonus_score = 0
     material_imbalance_score = 0
 
-    # --- Calcola Fase Numerica ---
-    phase = calculate_game_phase(board_array)
-
-    # --- Raccolta Dati Iniziale e Calcolo Materiale/PST ---
-    white_bishops = 0
-    black_bishops = 0
-    white_pawns_on_file_counts = [0] * 8
-    black_pawns_on_file_counts = [0] * 8
+    # --- Entry Materiale: fase, imbalance e finali riconosciuti ---
+    if material_key is None:
+        material_key = material_key_from_piece_squares(piece_squares)
+    if material_table is not None:
+        material_entry = material_table.lookup(material_key)
+    else:
+        material_entry = _calculate_material_entry(material_key)
+    recognizer = material_entry[MATERIAL_RECOGNIZER]
+    if recognizer is not None:
+        recognized_score = recognizer(piece_squares)
+        if recognized_score is not None:
+            return (recognized_score if current_player_color == 'W' else -recognized_score), True
+
+    # --- Fase Numerica ---
+    phase = material_entry[MATERIAL_PHASE]
+
+    # --- Materiale e PST (incrementali: qui si interpolano solo i due re) ---
+    white_material, black_material = material_entry[MATERIAL_VALUE]
+    material_score = white_material - black_material
+    if pst_score is None:
+        pst_score = pst_score_from_piece_squares(piece_squares)
+    positional_score = pst_score
+    max_phase = constants.GAME_PHASE_MAX or 1 # Evita divisione per zero
     white_king_pos = None
     black_king_pos = None
+    for code, is_black in ((WK, False), (BK, True)):
+        for square_index in piece_squares[code]:
+            mg_val = pst.KING_PST_MG_BY_CODE[code][square_index]
+            eg_val = pst.KING_PST_EG_BY_CODE[code][square_index]
+            positional_score += int(((mg_val * phase) + (eg_val * (max_phase - phase))) / max_phase)
+            if is_black: black_king_pos = (square_index >> 3, square_index & 7)
+            else: white_king_pos = (square_index >> 3, square_index & 7)
+
+    # --- Bitboard per le altre valutazioni ---
+    if bitboards is None:
+        bitboards = [0] * 15
+        for code in constants.PIECE_CODES.values():
+            for square_index in piece_squares[code]:
+                bitboards[code] |= 1 << square_index
+    white_occupancy = bitboards[WP] | bitboards[WN] | bitboards[WB] | bitboards[WR] | bitboards[WQ] | bitboards[WK] # Usate dalla mobilità
+    black_occupancy = bitboards[BP] | bitboards[BN] | bitboards[BB] | bitboards[BR] | bitboards[BQ] | bitboards[BK]
+    white_pawns_bb = bitboards[WP] # Struttura pedonale, scudo del re
+    black_pawns_bb = bitboards[BP]
+
+    # Prospettiva: dipende da chi deve muovere, per allinearsi con Negamax
+    perspective = 1 if current_player_color == 'W' else -1
 
-    for r in range(8):
-        for c in range(8):
-            piece = board_array[r][c]
-            if piece != '.':
-                piece_char = piece
-                piece_color = get_piece_color(piece_char)
-                piece_type = piece.lower()
-                square_index = r * 8 + c
-
-                # 1. Materiale (non tapered per ora)
-                value = constants.PIECE_VALUES.get(piece_type, 0)
-                material_score += value if piece_color == 'W' else -value
-
-                # 2. Punteggio Posizionale (da PST Tapered)
-                pst_val = get_tapered_pst_value(piece_char, square_index, phase)
-                # Aggiungi direttamente: get_tapered_pst_value dovrebbe già considerare il colore
-                # tramite il mirroring dell'indice se necessario.
-                positional_score += pst_val
-
-                # 3. Raccolta dati per altre valutazioni
-                if piece_type == 'b':
-                    if piece_color == 'W': white_bishops += 1
-                    else: black_bishops += 1
-                elif piece_type == 'p':
-                    if piece_color == 'W': white_pawns_on_file_counts[c] += 1
-                    else: black_pawns_on_file_counts[c] += 1
-                elif piece_type == 'k':
-                    if piece_color == 'W': white_king_pos = (r, c)
-                    else: black_king_pos = (r, c)
-
-    # --- Calcolo Termini Aggiuntivi usando Funzioni Helper Aggiornate ---
-
-    # Precalcola la lista dei bonus di rango tapered per i pedoni passati
-    tapered_rank_bonus = [get_tapered_value(bonus_tuple, phase) for bonus_tuple in constants.PASSED_PAWN_RANK_BONUS]
-
-    # Chiama le funzioni helper passando 'phase' (e 'tapered_rank_bonus' per i pedoni passati)
-    # Assumiamo che queste funzioni siano state modificate come discusso
-    pawn_structure_score += _calculate_pawn_structure(board_array, white_pawns_on_file_counts, black_pawns_on_file_counts, phase)
-    pawn_structure_score += _calculate_passed_pawns(board_array, phase, tapered_rank_bonus)
-    pawn_structure_score += _calculate_pawn_rams(board_array, phase)
-
-    piece_placement_score += _calculate_rook_placement(board_array, white_pawns_on_file_counts, black_pawns_on_file_counts, phase)
-
-    king_safety_score += _calculate_king_safety(board_array, white_king_pos, black_king_pos, white_pawns_on_file_counts, black_pawns_on_file_counts, phase)
-
-    # La mobilità potrebbe essere resa tapered in futuro, per ora no
-    mobility_score += _calculate_mobility(board_array)
-
-    material_imbalance_score += _calculate_material_imbalance(board_array, phase)
-
-    # Calcola qui i termini che non erano nelle funzioni helper dedicate
-    # Bonus Coppia Alfieri (Tapered)
-    bonus_bishop_pair = get_tapered_value(constants.BISHOP_PAIR_BONUS, phase)
-    if white_bishops >= 2: piece_placement_score += bonus_bishop_pair
-    if black_bishops >= 2: piece_placement_score -= bonus_bishop_pair
+    # Coppie di cavalli/torri e coppia alfieri (tapered), precalcolate nell'entry materiale
+    material_imbalance_score += material_entry[MATERIAL_IMBALANCE]
 
     # Bonus Tempo (Tapered)
     tapered_tempo = get_tapered_value(constants.TEMPO_BONUS, phase)
@@ -551,6 +691,59 @@ def evaluate_board(board_array, current_player_color):
     else:
         tempo_bonus_score = -tapered_tempo
 
+    # --- Stadio 0: termini incrementali/precalcolati ---
+    lazy = alpha is not None and beta is not None
+    pawn_margin, piece_margin, mobility_margin = material_entry[MATERIAL_LAZY_MARGINS]
+    stats = lazy_eval_stats
+    partial_score = material_score + positional_score + material_imbalance_score + tempo_bonus_score
+    stats.reached[0] += 1
+    if lazy:
+        bound = _lazy_bound(partial_score * perspective, pawn_margin + piece_margin + mobility_margin, alpha, beta)
+        if bound is not None:
+            return _lazy_exit(bound, 0, alpha, beta, squares, current_player_color, piece_squares, pawn_key, pawn_table,
+                              material_key, material_table, pst_score, bitboards)
+
+    # --- Calcolo Termini Aggiuntivi usando Funzioni Helper Aggiornate ---
+
+    # Struttura pedonale dalla pawn hash table (o calcolata al volo senza tabella):
+    # i conteggi per colonna servono anche a torri e sicurezza del Re
+    if pawn_table is not None and pawn_key is not None:
+        pawn_entry = pawn_table.lookup(pawn_key, white_pawns_bb, black_pawns_bb)
+    else:
+        pawn_entry = _calculate_pawn_entry(white_pawns_bb, black_pawns_bb)
+    white_pawns_on_file_counts = pawn_entry[PAWN_FILE_COUNTS_WHITE]
+    black_pawns_on_file_counts = pawn_entry[PAWN_FILE_COUNTS_BLACK]
+
+    # Chiama le funzioni helper passando 'phase'
+    pawn_structure_score += _pawn_structure_score(pawn_entry, phase)
+
+    # --- Stadio 1: struttura pedonale (pawn hash table) ---
+    partial_score += pawn_structure_score
+    stats.reached[1] += 1
+    if lazy:
+        bound = _lazy_bound(partial_score * perspective, piece_margin + mobility_margin, alpha, beta)
+        if bound is not None:
+            return _lazy_exit(bound, 1, alpha, beta, squares, current_player_color, piece_squares, pawn_key, pawn_table,
+                              material_key, material_table, pst_score, bitboards)
+
+    piece_placement_score += _calculate_rook_placement(piece_squares, white_pawns_on_file_counts, black_pawns_on_file_counts, phase)
+
+    king_safety_score += _calculate_king_safety(piece_squares, white_pawns_bb, black_pawns_bb, white_occupancy | black_occupancy, white_king_pos, black_king_pos, white_pawns_on_file_counts, black_pawns_on_file_counts, phase)
+
+    # --- Stadio 2: torri e sicurezza del Re ---
+    partial_score += piece_placement_score + king_safety_score
+    stats.reached[2] += 1
+    if lazy:
+        bound = _lazy_bound(partial_score * perspective, mobility_margin, alpha, beta)
+        if bound is not None:
+            return _lazy_exit(bound, 2, alpha, beta, squares, current_player_color, piece_squares, pawn_key, pawn_table,
+                              material_key, material_table, pst_score, bitboards)
+
+    # --- Stadio 3: mobilità (raggi dei pezzi scorrevoli, il termine più costoso) ---
+    # La mobilità potrebbe essere resa tapered in futuro, per ora no
+    stats.reached[3] += 1
+    mobility_score += _calculate_mobility(piece_squares, white_occupancy, black_occupancy)
+
     # --- Combina Tutti i Punteggi ---
     total_score = (
         material_score +
@@ -564,12 +757,9 @@ def evaluate_board(board_array, current_player_color):
     )
 
     # --- Applica Prospettiva e Clipping ---
-    # La prospettiva dipende da chi deve muovere, per allinearsi con Negamax
-    perspective = 1 if current_player_color == 'W' else -1
-
     # Clipping per evitare valori eccessivi che si avvicinano a MATE_SCORE
     # Usiamo un cap un po' sotto il punteggio di matto per sicurezza
-    eval_cap = constants.MATE_SCORE // 2 - 1 # Esempio di cap
+    eval_cap = EVAL_CAP
     # Assicurati che MATE_SCORE sia significativamente più grande di qualsiasi possibile somma dei termini
     total_score_clipped = max(-eval_cap, min(eval_cap, total_score))
 
@@ -584,4 +774,31 @@ def evaluate_board(board_array, current_player_color):
     #       f"Total={total_score*perspective}, Final={final_eval}", file=sys.stderr)
 
 
-    return final_eval
\ No newline at end of file
+    return final_eval, True
+
+EVAL_CAP = constants.MATE_SCORE // 2 - 1 # Cap della valutazione, un po' sotto il punteggio di matto
+
+def _lazy_bound(partial_score, margin, alpha, beta):
+    """
+    Se anche +/- margin resta fuori dalla finestra ritorna il limite garantito dal margine
+    (partial - margin sopra beta, partial + margin sotto alpha), altrimenti None.
+    """
+    if partial_score - margin >= beta:
+        return max(-EVAL_CAP, min(EVAL_CAP, partial_score - margin))
+    if partial_score + margin <= alpha:
+        return max(-EVAL_CAP, min(EVAL_CAP, partial_score + margin))
+    return None
+
+def _lazy_exit(lazy_score, stage, alpha, beta, *position):
+    """Registra l'uscita anticipata (e con verify la confronta con la valutazione completa)."""
+    stats = lazy_eval_stats
+    stats.exits[stage] += 1
+    if stats.verify:
+        reached = stats.reached[:] # La valutazione completa non conta negli stadi
+        full_score = evaluate_board(*position)
+        stats.reached = reached
+        stats.verified += 1
+        if full_score != lazy_score: stats.differs += 1
+        if (lazy_score >= beta and full_score < beta) or (lazy_score <= alpha and full_score > alpha):
+            stats.wrong_side += 1
+    return lazy_score, False
\ No newline at end of file
@@ -1,37 +1,103 @@
 # -*- coding: utf-8 -*-
+# Codifica delle mosse in un intero a 16 bit:
+#   bit 0-5   casa di partenza (a8 = 0, h1 = 63, come in bitboard.py)
+#   bit 6-11  casa di arrivo
+#   bit 12-14 pezzo di promozione (0 = nessuno, 1..4 = n, b, r, q)
+#   bit 15    arrocco
+# Move è una sottoclasse di int: hash e confronto sono quelli degli interi, quindi TT, killer,
+# history e set lavorano direttamente sul codice. Gli attributi (start_row, ...) vengono
+# decodificati al bisogno. Le istanze sono precalcolate in MOVE_TABLE e condivise:
+# generare una mossa è un lookup, non un'allocazione.
 
-class Move:
-    """Rappresenta una mossa di scacchi."""
-    def __init__(self, start_row, start_col, end_row, end_col, promotion_piece=None, is_castle=False):
-        self.start_row = start_row
-        self.start_col = start_col
-        self.end_row = end_row
-        self.end_col = end_col
-        self.promotion_piece = promotion_piece
-        self.is_castle = is_castle
+FROM_MASK = 0x3F
+TO_SHIFT = 6
+FROM_TO_MASK = 0xFFF # Indice [from][to] appiattito (history heuristic)
+PROMOTION_SHIFT = 12
+PROMOTION_MASK = 0x7
+CASTLE_FLAG = 1 << 15
+NO_MOVE = 0 # a8a8 non è mai una mossa: usato come "nessuna mossa" nelle strutture impacchettate
+
+PROMOTION_PIECES = (None, 'n', 'b', 'r', 'q')
+PROMOTION_INDEX = {'n': 1, 'b': 2, 'r': 3, 'q': 4}
+
+
+def encode_move(from_sq, to_sq, promotion_piece=None, is_castle=False):
+    """Codice a 16 bit della mossa (solleva KeyError per un pezzo di promozione non valido)."""
+    code = from_sq | (to_sq << TO_SHIFT)
+    if promotion_piece:
+        code |= PROMOTION_INDEX[promotion_piece] << PROMOTION_SHIFT
+    if is_castle:
+        code |= CASTLE_FLAG
+    return code
+
+
+class Move(int):
+    """Rappresenta una mossa di scacchi (intero a 16 bit, vedi la codifica sopra)."""
+    __slots__ = ()
+
+    def __new__(cls, start_row, start_col, end_row, end_col, promotion_piece=None, is_castle=False):
+        code = encode_move(start_row * 8 + start_col, end_row * 8 + end_col, promotion_piece, is_castle)
+        return MOVE_TABLE[code] or int.__new__(cls, code)
+
+    @property
+    def from_sq(self): return self & FROM_MASK
+    @property
+    def to_sq(self): return (self >> TO_SHIFT) & FROM_MASK
+    @property
+    def start_row(self): return (self & FROM_MASK) >> 3
+    @property
+    def start_col(self): return self & 7
+    @property
+    def end_row(self): return (self >> 9) & 7
+    @property
+    def end_col(self): return (self >> TO_SHIFT) & 7
+    @property
+    def promotion_piece(self): return PROMOTION_PIECES[(self >> PROMOTION_SHIFT) & PROMOTION_MASK]
+    @property
+    def is_castle(self): return bool(self & CASTLE_FLAG)
 
     def to_uci_string(self):
-        start = f"{chr(ord('a') + self.start_col)}{8 - self.start_row}"
-        end = f"{chr(ord('a') + self.end_col)}{8 - self.end_row}"
-        promo = self.promotion_piece if self.promotion_piece else ""
-        return start + end + promo
-
-    def __eq__(self, other):
-        if not isinstance(other, Move):
-            return NotImplemented
-        return (self.start_row == other.start_row and
-                self.start_col == other.start_col and
-                self.end_row == other.end_row and
-                self.end_col == other.end_col and
-                self.promotion_piece == other.promotion_piece and
-                self.is_castle == other.is_castle)
-
-    def __hash__(self):
-        return hash((self.start_row, self.start_col, self.end_row, self.end_col,
-                    self.promotion_piece, self.is_castle))
+        return UCI_STRINGS.get(int(self)) or _uci_string(int(self))
 
     def __str__(self):
         return self.to_uci_string()
 
     def __repr__(self):
-        return f"Move({self.start_row},{self.start_col} -> {self.end_row},{self.end_col}, promo={self.promotion_piece}, castle={self.is_castle})"
\ No newline at end of file
+        return f"Move({self.start_row},{self.start_col} -> {self.end_row},{self.end_col}, promo={self.promotion_piece}, castle={self.is_castle})"
+
+    # Immutabile: copia e pickle passano dal codice
+    def __copy__(self): return self
+    def __deepcopy__(self, memo): return self
+    def __reduce__(self): return (move_from_code, (int(self),))
+
+
+def move_from_code(code):
+    """Ritorna la Move corrispondente a un codice a 16 bit (None per NO_MOVE)."""
+    if not code: return None
+    return MOVE_TABLE[code] or int.__new__(Move, code)
+
+
+def _uci_string(code):
+    from_sq = code & FROM_MASK
+    to_sq = (code >> TO_SHIFT) & FROM_MASK
+    promo = PROMOTION_PIECES[(code >> PROMOTION_SHIFT) & PROMOTION_MASK] or ""
+    return (f"{chr(ord('a') + (from_sq & 7))}{8 - (from_sq >> 3)}"
+            f"{chr(ord('a') + (to_sq & 7))}{8 - (to_sq >> 3)}{promo}")
+
+
+def _build_move_table():
+    """Istanze condivise per tutte le mosse generabili: normali, promozioni, arrocchi."""
+    table = [None] * (1 << 16)
+    codes = list(range(1, 1 << 12))
+    for from_sq in list(range(8, 16)) + list(range(48, 56)): # Pedoni in settima (bianco) o seconda (nero)
+        for to_sq in list(range(0, 8)) + list(range(56, 64)):
+            for index in range(1, len(PROMOTION_PIECES)):
+                codes.append(encode_move(from_sq, to_sq) | (index << PROMOTION_SHIFT))
+    codes.extend(encode_move(from_sq, to_sq, is_castle=True) for from_sq, to_sq in ((60, 62), (60, 58), (4, 6), (4, 2)))
+    for code in codes:
+        table[code] = int.__new__(Move, code)
+    return table
+
+MOVE_TABLE = _build_move_table()
+# Stringhe UCI precalcolate (solo output: info pv, bestmove)
+UCI_STRINGS = {code: _uci_string(code) for code, move_obj in enumerate(MOVE_TABLE) if move_obj is not None}
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Valutazione NNUE opzionale (richiede NumPy): rete 768 -> 2 x HIDDEN -> HIDDEN2 -> 1.
+#   Input: 768 feature (pezzo relativo alla prospettiva x 6 tipi x 64 case), una per pezzo.
+#   Primo layer: un accumulatore int16 per prospettiva (Bianco, Nero con la scacchiera
+#   specchiata), aggiornato in make_move sommando/sottraendo le righe dei pesi dei pezzi
+#   mossi, catturati e promossi (ChessEngine.accumulators, uno per ply).
+#   Layer successivi: clipped ReLU [0, QA] sugli accumulatori concatenati (prima quello di chi
+#   muove), prodotti int32 con pesi int16 scalati di QB, poi uscita * output_scale / (QA * QB).
+#
+# File dei pesi (little-endian): header NETWORK_HEADER (magic, versione, HIDDEN, HIDDEN2,
+# output_scale) seguito da: pesi feature int16 [768][HIDDEN], bias int16 [HIDDEN],
+# pesi layer 2 int16 [2 * HIDDEN][HIDDEN2], bias int32 [HIDDEN2], pesi uscita int16 [HIDDEN2],
+# bias uscita int32.
+import os
+import struct
+
+import constants
+
+# Import condizionale: senza NumPy l'engine usa solo la valutazione classica
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+INPUT_SIZE = 768
+QA = 255 # Scala dei pesi del primo layer (e limite della clipped ReLU)
+QB = 64  # Scala dei pesi dei layer successivi
+NETWORK_MAGIC = b"BMNNUE\x00\x00"
+NETWORK_VERSION = 1
+_NETWORK_HEADER = struct.Struct('<8sIIII')
+NETWORK_HEADER = _NETWORK_HEADER.size
+_EVAL_CAP = constants.MATE_SCORE // 2 - 1 # Stesso cap della valutazione classica
+
+
+def feature_index(code, sq, perspective):
+    """Indice della feature del pezzo code sulla casa sq per la prospettiva 0 (Bianco) o 1 (Nero)."""
+    color = code >> 3
+    relative_color = 0 if color == perspective else 1
+    relative_sq = sq if perspective == 0 else sq ^ 56
+    return (relative_color * 6 + (code & constants.TYPE_MASK) - 1) * 64 + relative_sq
+
+
+class Network:
+    """Pesi quantizzati della rete; refresh() e evaluate() lavorano sugli accumulatori (2, HIDDEN)."""
+    def __init__(self, feature_weights, feature_bias, l2_weights, l2_bias, output_weights, output_bias,
+                 output_scale=400, path=None):
+        self.hidden = feature_weights.shape[1]
+        self.feature_weights = feature_weights
+        self.feature_bias = feature_bias
+        self.l2_weights = l2_weights.astype(np.int32)
+        self.l2_bias = l2_bias.astype(np.int32)
+        self.output_weights = output_weights.astype(np.int32)
+        self.output_bias = int(output_bias)
+        self.output_scale = output_scale
+        self.path = path
+        # delta_table[code][sq]: righe dei pesi per le due prospettive (zeri per casa vuota),
+        # così make_move aggiorna l'accumulatore con una somma per pezzo
+        self.delta_table = np.zeros((16, 64, 2, self.hidden), dtype=np.int16)
+        for code in constants.PIECE_CODES.values():
+            for sq in range(64):
+                self.delta_table[code, sq, 0] = feature_weights[feature_index(code, sq, 0)]
+                self.delta_table[code, sq, 1] = feature_weights[feature_index(code, sq, 1)]
+
+    @classmethod
+    def random(cls, seed=0, hidden=128, hidden2=32):
+        """Rete con pesi casuali (benchmark e test: non gioca bene)."""
+        rng = np.random.default_rng(seed)
+        return cls(rng.integers(-32, 33, (INPUT_SIZE, hidden), dtype=np.int16),
+                   rng.integers(0, 64, hidden, dtype=np.int16),
+                   rng.integers(-64, 65, (2 * hidden, hidden2), dtype=np.int16),
+                   rng.integers(-QA * QB, QA * QB, hidden2, dtype=np.int32),
+                   rng.integers(-64, 65, hidden2, dtype=np.int16),
+                   0)
+
+    def refresh(self, piece_squares):
+        """Accumulatore calcolato da zero per la posizione (insiemi di case per codice)."""
+        accumulator = np.empty((2, self.hidden), dtype=np.int16)
+        accumulator[0] = self.feature_bias
+        accumulator[1] = self.feature_bias
+        for code in constants.PIECE_CODES.values():
+            for sq in piece_squares[code]:
+                accumulator += self.delta_table[code, sq]
+        return accumulator
+
+    def evaluate(self, accumulator, side):
+        """Score in centipawn dal punto di vista di side (0 = Bianco, 1 = Nero)."""
+        hidden_input = np.clip(np.concatenate((accumulator[side], accumulator[side ^ 1])), 0, QA)
+        hidden = np.clip((hidden_input @ self.l2_weights + self.l2_bias) // QB, 0, QA)
+        output = int(hidden @ self.output_weights) + self.output_bias
+        score = output * self.output_scale // (QA * QB)
+        return max(-_EVAL_CAP, min(_EVAL_CAP, score))
+
+    def save(self, path):
+        hidden2 = self.l2_weights.shape[1]
+        with open(path, 'wb') as network_file:
+            network_file.write(_NETWORK_HEADER.pack(NETWORK_MAGIC, NETWORK_VERSION, self.hidden, hidden2, self.output_scale))
+            for array, dtype in ((self.feature_weights, '<i2'), (self.feature_bias, '<i2'), (self.l2_weights, '<i2'),
+                                 (self.l2_bias, '<i4'), (self.output_weights, '<i2'),
+                                 (np.array([self.output_bias]), '<i4')):
+                network_file.write(array.astype(dtype).tobytes())
+
+
+def load_network(path):
+    """
+    Carica un file di pesi (formato in testa al modulo). Solleva ValueError se il file
+    non è valido e ImportError se NumPy non è installato.
+    """
+    if not NUMPY_AVAILABLE:
+        raise ImportError("la valutazione NNUE richiede NumPy")
+    with open(path, 'rb') as network_file:
+        data = network_file.read()
+    if len(data) < NETWORK_HEADER:
+        raise ValueError(f"{path}: file troppo corto per una rete NNUE")
+    magic, version, hidden, hidden2, output_scale = _NETWORK_HEADER.unpack_from(data)
+    if magic != NETWORK_MAGIC:
+        raise ValueError(f"{path}: non è una rete NNUE")
+    if version != NETWORK_VERSION:
+        raise ValueError(f"{path}: versione rete {version}, attesa {NETWORK_VERSION}")
+    shapes = (((INPUT_SIZE, hidden), '<i2'), ((hidden,), '<i2'), ((2 * hidden, hidden2), '<i2'),
+              ((hidden2,), '<i4'), ((hidden2,), '<i2'), ((1,), '<i4'))
+    expected_size = NETWORK_HEADER + sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype in shapes)
+    if not hidden or not hidden2 or len(data) != expected_size:
+        raise ValueError(f"{path}: dimensione non valida")
+    arrays = []
+    offset = NETWORK_HEADER
+    for shape, dtype in shapes:
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape).astype(dtype[1:]))
+        offset += count * np.dtype(dtype).itemsize
+    feature_weights, feature_bias, l2_weights, l2_bias, output_weights, output_bias = arrays
+    return Network(feature_weights, feature_bias, l2_weights, l2_bias, output_weights, int(output_bias[0]),
+                   output_scale, path=os.path.abspath(path))
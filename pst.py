@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import constants
 
 # --- Piece-Square Tables (Midgame & Endgame, White's Perspective) ---
 # fmt: off
@@ -109,4 +110,23 @@ def get_pst_value(piece_char, square_index, game_phase="MIDGAME"):
 
     if 0 <= lookup_index < 64:
         return table[lookup_index]
-    return 0
\ No newline at end of file
+    return 0
+
+# --- Tabelle indicizzate per codice intero del pezzo (constants.PIECE_CODES) ---
+# I pezzi neri usano la tabella specchiata (casa ^ 56), come get_pst_value.
+def _build_code_tables():
+    by_code = [[0] * 64 for _ in range(15)]
+    king_mg = [[0] * 64 for _ in range(15)]
+    king_eg = [[0] * 64 for _ in range(15)]
+    piece_tables = ((constants.PAWN, PAWN_PST), (constants.KNIGHT, KNIGHT_PST), (constants.BISHOP, BISHOP_PST),
+                    (constants.ROOK, ROOK_PST), (constants.QUEEN, QUEEN_PST))
+    for piece_type, table in piece_tables:
+        by_code[piece_type] = table[:]
+        by_code[piece_type | constants.BLACK_FLAG] = [table[sq ^ 56] for sq in range(64)]
+    for code in (constants.KING, constants.KING | constants.BLACK_FLAG):
+        flip = 56 if code & constants.BLACK_FLAG else 0
+        king_mg[code] = [KING_PST_MIDGAME[sq ^ flip] for sq in range(64)]
+        king_eg[code] = [KING_PST_ENDGAME[sq ^ flip] for sq in range(64)]
+    return by_code, king_mg, king_eg
+
+PST_BY_CODE, KING_PST_MG_BY_CODE, KING_PST_EG_BY_CODE = _build_code_tables()
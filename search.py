@@ -3,9 +3,13 @@ import math
 import time
 import sys # Per debug print
 import random
+import threading
 import constants
 import move as m # Rinomina per evitare conflitti se usi 'move' come variabile
+from move import FROM_MASK, TO_SHIFT, FROM_TO_MASK
 import evaluation # Importa il modulo di valutazione
+from bitboard import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKER_ORIGINS, WHITE, BLACK,
+                      rook_attacks, bishop_attacks, iter_squares)
 
 # Variabili globali del modulo per statistiche (se preferisci non passarle ovunque)
 # Altrimenti, passale come argomenti o mettile in un oggetto 'SearchStats'
@@ -14,26 +18,70 @@ q_nodes_searched = 0
 tt_probes = 0
 tt_hits = 0
 nmp_cutoffs = 0
+moves_generated = 0 # Mosse generate dal move picker (staged) nei nodi negamax
 start_time = 0
+search_control = None # SearchControl della ricerca in corso (impostato da search_move)
+
+# --- Controllo Ricerca (scadenza e abort) ---
+class SearchAborted(Exception):
+    """Sollevata dal polling del SearchControl: svolge la ricorsione fino a search_move."""
+
+def write_line(line):
+    """Writer predefinito delle righe UCI della ricerca: una sola write su stdout."""
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+class SearchControl:
+    """
+    Scadenza rigida (time.monotonic) e flag di abort della ricerca.
+    negamax e quiescence_search lo interrogano ogni constants.SEARCH_POLL_INTERVAL nodi;
+    stop() può essere chiamato da un altro thread (comando UCI 'stop').
+    root_best_move è la miglior mossa dell'iterazione radice in corso, già cercata per intero:
+    se la ricerca viene interrotta a metà iterazione è sicuro giocarla.
+    send scrive le righe UCI della ricerca (info depth ...): il loop UCI passa uci.send, che
+    le serializza con le proprie risposte (readyok, bestmove) mentre la ricerca gira su un thread.
+    """
+    def __init__(self, deadline=None, send=write_line):
+        self.deadline = deadline
+        self.send = send
+        self.abort_requested = False # Letto dal polling (più veloce dell'Event)
+        self.stop_event = threading.Event() # Per chi deve attendere lo stop (UCI 'go infinite')
+        self.root_depth = 0
+        self.root_best_move = None
+        self.root_best_score = None
+
+    def stop(self):
+        self.abort_requested = True
+        self.stop_event.set()
+
+    def should_stop(self):
+        if self.abort_requested: return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.abort_requested = True
+            return True
+        return False
+
+def _poll_search_control():
+    """Chiamata ogni SEARCH_POLL_INTERVAL nodi: interrompe la ricerca se scaduta o fermata."""
+    if search_control is not None and search_control.should_stop():
+        raise SearchAborted()
 
 # --- Funzioni di Ordinamento e SEE ---
 
-def score_move(board_array, move_obj, killer_moves_ply, history_heuristic_color, ply, current_player_color):
-    """ Assegna un punteggio alla mossa per l'ordinamento. """
+def score_move(squares, move_obj, killer_moves_ply, history_heuristic_color, ply, current_player_color):
+    """ Assegna un punteggio alla mossa per l'ordinamento. squares è la mailbox di codici interi. """
     score = 0
-    attacker_piece_char = board_array[move_obj.start_row][move_obj.start_col]
+    attacker_code = squares[move_obj & FROM_MASK]
     # Gestione robusta se la casa di partenza fosse vuota (non dovrebbe succedere con mosse legali)
-    if attacker_piece_char == '.': return -float('inf')
-    attacker_type = attacker_piece_char.lower()
+    if not attacker_code: return -float('inf')
 
-    captured_piece_char = board_array[move_obj.end_row][move_obj.end_col]
-    captured_type = captured_piece_char.lower() if captured_piece_char != '.' else '.'
+    captured_code = squares[(move_obj >> TO_SHIFT) & FROM_MASK]
 
     # Catture (MVV-LVA)
-    if captured_type != '.':
+    if captured_code:
         score += constants.MVV_LVA_CAPTURE_BONUS
-        victim_value = constants.PIECE_VALUES.get(captured_type, 0)
-        attacker_value = constants.PIECE_VALUES.get(attacker_type, 0)
+        victim_value = constants.PIECE_VALUES_BY_CODE[captured_code]
+        attacker_value = constants.PIECE_VALUES_BY_CODE[attacker_code]
         score += victim_value * 100 - attacker_value # Pondera di più il valore della vittima
 
     # Promozioni
@@ -43,7 +91,7 @@ def score_move(board_array, move_obj, killer_moves_ply, history_heuristic_color,
         score += constants.PROMOTION_BONUS_OFFSET + promotion_bonus
 
     # Mosse Killer (se non cattura/promozione)
-    if captured_type == '.' and not move_obj.promotion_piece:
+    if not captured_code and not move_obj.promotion_piece:
         is_killer = False
         # Assicurati che killer_moves_ply sia una lista valida (potrebbe essere None fuori range)
         if killer_moves_ply is not None:
@@ -55,221 +103,118 @@ def score_move(board_array, move_obj, killer_moves_ply, history_heuristic_color,
                 is_killer = True
 
         # History Heuristic (solo per mosse tranquille non killer)
-        if not is_killer:
-            start_sq = move_obj.start_row * 8 + move_obj.start_col
-            end_sq = move_obj.end_row * 8 + move_obj.end_col
-            # Assicurati che history_heuristic_color sia valido
-            if history_heuristic_color is not None and 0 <= start_sq < 64 and 0 <= end_sq < 64:
-                try:
-                    history_score = history_heuristic_color[start_sq][end_sq]
-                    # Applica un cap al bonus dell'history
-                    score += min(history_score, constants.MAX_HISTORY_SCORE_BONUS)
-                except IndexError: # Sicurezza extra
-                    pass # Ignora se gli indici sono fuori range per qualche motivo
+        if not is_killer and history_heuristic_color is not None:
+            # Applica un cap al bonus dell'history (indice [from][to] = bit bassi della mossa)
+            score += min(history_heuristic_color[move_obj & FROM_TO_MASK], constants.MAX_HISTORY_SCORE_BONUS)
     return score
 
 
-def order_moves(board_array, moves_list, killer_moves_ply, history_heuristic_color, ply, current_player_color):
+def order_moves(squares, moves_list, killer_moves_ply, history_heuristic_color, ply, current_player_color):
     """ Ordina una lista di mosse. """
     # Potrebbe essere utile gestire None per killer_moves_ply e history_heuristic_color
     safe_killer_moves = killer_moves_ply if killer_moves_ply is not None else [None, None]
     safe_history = history_heuristic_color # Assumendo che sia sempre una lista valida o gestita in score_move
     return sorted(moves_list,
-                  key=lambda mv: score_move(board_array, mv, safe_killer_moves, safe_history, ply, current_player_color),
+                  key=lambda mv: score_move(squares, mv, safe_killer_moves, safe_history, ply, current_player_color),
                   reverse=True)
 
-# --- Funzione Helper _get_least_valuable_attacker (Versione v5 - CORRETTA) ---
-def _get_least_valuable_attacker(board_array, target_r, target_c, attacker_color, occupied_mask):
-    """ Trova l'attaccante di minor valore per una data casa e colore. (DEBUG FINALE CAVALLO) """
-    least_value_found = float('inf')
-    best_attacker_info = (None, -1, -1)
-    piece_order = {'p': 1, 'n': 2, 'b': 3, 'r': 4, 'q': 5, 'k': 6}
-
-    # 1. Check Pawns (invariato)
-    expected_pawn = 'P' if attacker_color == 'W' else 'p'
-    possible_origins = []
-    if attacker_color == 'W': possible_origins = [(target_r + 1, target_c - 1), (target_r + 1, target_c + 1)]
-    else: possible_origins = [(target_r - 1, target_c - 1), (target_r - 1, target_c + 1)]
-    for pr, pc in possible_origins:
-        if 0 <= pr < 8 and 0 <= pc < 8:
-            if (pr, pc) in occupied_mask and board_array[pr][pc] == expected_pawn: return ('p', pr, pc)
-
-    current_best_type = None
-    current_best_r, current_best_c = -1, -1
-
-    # 2. Check Knights (CON DEBUG MIRATO)
-    knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-    expected_knight = 'N' if attacker_color == 'W' else 'n'
-    # === INIZIO DEBUG SPECIFICO TEST 15 ===
-    #is_test_15_case = (target_r == 4 and target_c == 3 and attacker_color == 'B') # Target d4, Attacker Black
-    #if is_test_15_case: print(f"\n--- LVA KNIGHT DEBUG (Test 15 Specific) ---", file=sys.stderr)
-    # === FINE DEBUG SPECIFICO TEST 15 ===
-    for dr, dc in knight_moves:
-        nr, nc = target_r + dr, target_c + dc
-        if 0 <= nr < 8 and 0 <= nc < 8:
-            is_occupied = (nr, nc) in occupied_mask
-            piece_on_sq = board_array[nr][nc] if is_occupied else '.'
-
-            # === INIZIO DEBUG SPECIFICO TEST 15 ===
-            # Stampa solo quando controlla la casa c6 (2,2) nel caso del Test 15
-            #if is_test_15_case and nr == 2 and nc == 2:
-            #    print(f"LVA Knight Debug (Test 15): Checking square ({nr},{nc})={ (nr,nc) }", file=sys.stderr)
-            #    print(f"LVA Knight Debug (Test 15): is_occupied = {is_occupied}", file=sys.stderr)
-            #    print(f"LVA Knight Debug (Test 15): piece_on_sq = '{piece_on_sq}'", file=sys.stderr)
-            #    print(f"LVA Knight Debug (Test 15): expected_knight = '{expected_knight}'", file=sys.stderr)
-            #    print(f"LVA Knight Debug (Test 15): Condition Check: (is_occupied and piece_on_sq == expected_knight) = {is_occupied and piece_on_sq == expected_knight}", file=sys.stderr)
-            # === FINE DEBUG SPECIFICO TEST 15 ===
-
-            if is_occupied and piece_on_sq == expected_knight:
-                # Trovato Cavallo attaccante.
-                if least_value_found > piece_order['n']:
-                    least_value_found = piece_order['n']
-                    current_best_type = 'n'
-                    current_best_r, current_best_c = nr, nc
-                    # === INIZIO DEBUG SPECIFICO TEST 15 ===
-                    #if is_test_15_case and nr == 2 and nc == 2: print(f"LVA Knight Debug (Test 15): *** Knight FOUND and updated best_attacker! ***", file=sys.stderr)
-                    # === FINE DEBUG SPECIFICO TEST 15 ===
-
-    # 3. Check Bishops / Diagonal Queens (invariato)
-    if least_value_found > piece_order['b']:
-        directions_diag = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-        expected_bishop = 'B' if attacker_color == 'W' else 'b'
-        expected_queen = 'Q' if attacker_color == 'W' else 'q'
-        for dr, dc in directions_diag:
-            for i in range(1, 8):
-                sr, sc = target_r + i * dr, target_c + i * dc
-                if not (0 <= sr < 8 and 0 <= sc < 8): break
-                if (sr, sc) in occupied_mask:
-                    piece_on_sq = board_array[sr][sc]
-                    piece_type_on_sq = piece_on_sq.lower()
-                    if (piece_on_sq == expected_bishop or piece_on_sq == expected_queen):
-                        if piece_order[piece_type_on_sq] < least_value_found:
-                            least_value_found = piece_order[piece_type_on_sq]
-                            current_best_type = piece_type_on_sq
-                            current_best_r, current_best_c = sr, sc
-                        break
-                    else: break
-
-    # 4. Check Rooks / Straight Queens (invariato)
-    if least_value_found > piece_order['r']:
-        directions_straight = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        expected_rook = 'R' if attacker_color == 'W' else 'r'
-        expected_queen = 'Q' if attacker_color == 'W' else 'q'
-        for dr, dc in directions_straight:
-            for i in range(1, 8):
-                sr, sc = target_r + i * dr, target_c + i * dc
-                if not (0 <= sr < 8 and 0 <= sc < 8): break
-                if (sr, sc) in occupied_mask:
-                    piece_on_sq = board_array[sr][sc]
-                    piece_type_on_sq = piece_on_sq.lower()
-                    if (piece_on_sq == expected_rook or piece_on_sq == expected_queen):
-                        if piece_order[piece_type_on_sq] < least_value_found:
-                            least_value_found = piece_order[piece_type_on_sq]
-                            current_best_type = piece_type_on_sq
-                            current_best_r, current_best_c = sr, sc
-                        break
-                    else: break
-
-    # 5. Check King (invariato)
-    if least_value_found > piece_order['k']:
-        king_moves = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        expected_king = 'K' if attacker_color == 'W' else 'k'
-        for dr, dc in king_moves:
-            kr, kc = target_r + dr, target_c + dc
-            if 0 <= kr < 8 and 0 <= kc < 8:
-                if (kr, kc) in occupied_mask and board_array[kr][kc] == expected_king:
-                    if least_value_found == float('inf'):
-                        least_value_found = piece_order['k']
-                        current_best_type = 'k'
-                        current_best_r, current_best_c = kr, kc
-                    break
-
-    best_attacker_info = (current_best_type, current_best_r, current_best_c)
-    # === INIZIO DEBUG SPECIFICO TEST 15 ===
-    #if is_test_15_case: print(f"LVA Knight Debug (Test 15): Returning best_attacker_info = {best_attacker_info}", file=sys.stderr)
-    # === FINE DEBUG SPECIFICO TEST 15 ===
-    return best_attacker_info
+# --- Funzione Helper _get_least_valuable_attacker (versione a bitboard) ---
+def _get_least_valuable_attacker(squares, target_sq, attacker_color, occupied):
+    """
+    Trova l'attaccante di minor valore per una data casa e colore.
+    occupied è la bitboard delle case occupate nella simulazione (gli attacchi scorrevoli
+    la usano, quindi i pezzi già scambiati scoprono automaticamente i raggi X).
+    Ritorna (tipo_pezzo, casa) oppure (None, -1) se la casa non è attaccata.
+    """
+    base = 0 if attacker_color == 'W' else constants.BLACK_FLAG
+    pawn_origins = PAWN_ATTACKER_ORIGINS[WHITE if attacker_color == 'W' else BLACK][target_sq]
+    diagonal = bishop_attacks(target_sq, occupied)
+    straight = rook_attacks(target_sq, occupied)
+    candidates = (
+        (constants.PAWN, pawn_origins),
+        (constants.KNIGHT, KNIGHT_ATTACKS[target_sq]),
+        (constants.BISHOP, diagonal),
+        (constants.ROOK, straight),
+        (constants.QUEEN, diagonal | straight),
+        (constants.KING, KING_ATTACKS[target_sq]),
+    )
+    for piece_type, origins in candidates:
+        code = base | piece_type
+        for sq in iter_squares(origins & occupied):
+            if squares[sq] == code:
+                return piece_type, sq
+    return None, -1
 
 
 # --- Funzione SEE (Static Exchange Evaluation) ---
 # (Versione corretta con swap_list e calcolo finale standard, senza debug)
-def see(board_array, move_obj, en_passant_target):
+def see(squares, move_obj, en_passant_target):
     """
     Static Exchange Evaluation (SEE) - Stima il guadagno/perdita materiale di una cattura.
     Ritorna il punteggio dello scambio dal punto di vista del lato che cattura.
     Implementa l'algoritmo standard basato su ricatture del pezzo di minor valore.
-    Versione con swap_list corretta e calcolo finale standard.
+    squares è la mailbox bytearray (ChessEngine.squares); la vista [r][c] viene convertita.
     """
-    from_r, from_c = move_obj.start_row, move_obj.start_col
-    to_r, to_c = move_obj.end_row, move_obj.end_col
-    attacker_char = board_array[from_r][from_c]
+    if not isinstance(squares, (bytes, bytearray)):
+        squares = evaluation.board_to_squares(squares)
+    values = constants.PIECE_VALUES_BY_CODE
+    from_sq = move_obj & FROM_MASK
+    to_sq = (move_obj >> TO_SHIFT) & FROM_MASK
+    attacker_code = squares[from_sq]
 
-    if attacker_char == '.': return 0
+    if not attacker_code: return 0
 
-    victim_char = board_array[to_r][to_c]
+    victim_code = squares[to_sq]
+    attacker_color = 'B' if attacker_code & constants.BLACK_FLAG else 'W'
     is_ep = False
-    captured_ep_value = 0
 
-    if victim_char == '.':
-        if attacker_char.lower() == 'p' and en_passant_target == (to_r, to_c):
-            try: attacker_color_local = evaluation.get_piece_color(attacker_char)
-            except (NameError, AttributeError): attacker_color_local = 'W' if attacker_char.isupper() else 'B'
-            victim_char = 'p' if attacker_color_local == 'W' else 'P'
+    if not victim_code:
+        if attacker_code & constants.TYPE_MASK == constants.PAWN and en_passant_target == (move_obj.end_row, move_obj.end_col):
+            victim_code = constants.PAWN | ((attacker_code & constants.BLACK_FLAG) ^ constants.BLACK_FLAG)
             is_ep = True
-            captured_ep_value = constants.PIECE_VALUES.get(victim_char.lower(), 0)
         else:
             return 0
 
-    if victim_char.lower() == 'k':
+    if victim_code & constants.TYPE_MASK == constants.KING:
         return constants.MATE_SCORE // 2
 
     # ---- Inizio Simulazione Scambi ----
     swap_list = [0] * 32
     swap_index = 0
+    swap_list[swap_index] = values[victim_code]
 
-    if not is_ep:
-        initial_victim_value = constants.PIECE_VALUES.get(victim_char.lower(), 0)
-    else:
-        initial_victim_value = captured_ep_value
-    swap_list[swap_index] = initial_victim_value
+    sim_squares = bytearray(squares)
+    sim_squares[to_sq] = attacker_code
+    sim_squares[from_sq] = 0
+    if is_ep:
+        ep_victim_sq = to_sq + (8 if attacker_color == 'W' else -8)
+        if sim_squares[ep_victim_sq] & constants.TYPE_MASK == constants.PAWN:
+            sim_squares[ep_victim_sq] = 0
 
-    sim_board = [row[:] for row in board_array]
-    try: attacker_color = evaluation.get_piece_color(attacker_char)
-    except (NameError, AttributeError): attacker_color = 'W' if attacker_char.isupper() else 'B'
+    occupied = 0
+    for sq, code in enumerate(sim_squares):
+        if code: occupied |= 1 << sq
 
-    sim_board[to_r][to_c] = attacker_char
-    sim_board[from_r][from_c] = '.'
-    if is_ep:
-        ep_victim_r = to_r + (1 if attacker_color == 'W' else -1)
-        ep_victim_c = to_c
-        if 0 <= ep_victim_r < 8 and 0 <= ep_victim_c < 8:
-            if sim_board[ep_victim_r][ep_victim_c].lower() == 'p':
-                sim_board[ep_victim_r][ep_victim_c] = '.'
-
-    current_target_r, current_target_c = to_r, to_c
-    piece_on_target_char = attacker_char
+    piece_on_target_code = attacker_code
     current_attacker_color = attacker_color
 
     while True:
         swap_index += 1
         next_attacker_color = 'B' if current_attacker_color == 'W' else 'W'
-        occupied_mask = set((r, c) for r in range(8) for c in range(8) if sim_board[r][c] != '.')
 
-        next_attacker = _get_least_valuable_attacker(sim_board, current_target_r, current_target_c, next_attacker_color, occupied_mask)
-        next_attacker_type, nr, nc = next_attacker
+        next_attacker_type, attacker_sq = _get_least_valuable_attacker(sim_squares, to_sq, next_attacker_color, occupied)
 
         if next_attacker_type is None:
             swap_index -= 1
             break
 
-        value_of_piece_being_captured = constants.PIECE_VALUES.get(piece_on_target_char.lower(), 0)
-        swap_list[swap_index] = value_of_piece_being_captured
+        swap_list[swap_index] = values[piece_on_target_code]
 
-        next_attacker_char_on_board = sim_board[nr][nc]
-        sim_board[current_target_r][current_target_c] = next_attacker_char_on_board
-        sim_board[nr][nc] = '.'
+        piece_on_target_code = sim_squares[attacker_sq]
+        sim_squares[to_sq] = piece_on_target_code
+        sim_squares[attacker_sq] = 0
+        occupied &= ~(1 << attacker_sq)
 
-        piece_on_target_char = next_attacker_char_on_board
         current_attacker_color = next_attacker_color
     # ---- Fine Simulazione Scambi ----
 
@@ -285,74 +230,131 @@ def see(board_array, move_obj, en_passant_target):
 
     return final_see_score
 
+# --- Move Picker a Fasi (Staged Move Generation) ---
+def pick_moves(engine, tt_move, iid_move, killer_moves_ply, history_heuristic_color):
+    """
+    Generatore delle mosse legali di un nodo negamax, in fasi:
+    mossa TT, mossa IID, catture buone e promozioni (MVV-LVA), killer, mosse tranquille
+    (history), catture perdenti (SEE < 0).
+    Ogni fase viene generata solo quando la precedente è esaurita: dopo un taglio beta
+    sulla mossa TT o su una cattura le mosse tranquille non vengono mai generate.
+    Va consumato tra make/unmake (la generazione avviene sempre nella posizione del nodo).
+    """
+    global moves_generated
+    player_color = engine.current_player
+    yielded = []
+
+    # 1-2. Mossa TT e mossa IID (verificate senza generare le altre)
+    for hint_move in (tt_move, iid_move):
+        if hint_move is not None and hint_move not in yielded and engine.is_legal_move(hint_move):
+            yielded.append(hint_move)
+            yield hint_move
+
+    # 3. Catture e promozioni: MVV-LVA, le catture perdenti vengono rimandate in fondo
+    squares = engine.squares
+    values = constants.PIECE_VALUES_BY_CODE
+    tactical_moves = engine.generate_captures(player_color)
+    moves_generated += len(tactical_moves)
+    tactical_moves.sort(key=lambda mv: score_move(squares, mv, None, None, 0, player_color), reverse=True)
+    bad_captures = []
+    for move_obj in tactical_moves:
+        if move_obj in yielded: continue
+        victim_code = squares[(move_obj >> TO_SHIFT) & FROM_MASK]
+        # SEE solo se la vittima vale meno dell'attaccante (altrimenti lo scambio non può perdere)
+        if victim_code and not move_obj.promotion_piece and \
+           values[victim_code] < values[squares[move_obj & FROM_MASK]] and \
+           see(squares, move_obj, engine.en_passant_target) < 0:
+            bad_captures.append(move_obj)
+            continue
+        yield move_obj
+
+    # 4. Killer (solo se tranquille e legali in questa posizione)
+    if killer_moves_ply is not None:
+        for killer in killer_moves_ply:
+            if killer is not None and killer not in yielded and \
+               not engine.is_tactical_move(killer) and engine.is_legal_move(killer):
+                yielded.append(killer)
+                yield killer
+
+    # 5. Mosse tranquille ordinate per history
+    quiet_moves = engine._generate_legal_moves(player_color, tactical=False, quiet=True)
+    moves_generated += len(quiet_moves)
+    if history_heuristic_color is not None:
+        max_bonus = constants.MAX_HISTORY_SCORE_BONUS
+        quiet_moves.sort(key=lambda mv: min(history_heuristic_color[mv & FROM_TO_MASK], max_bonus), reverse=True)
+    for move_obj in quiet_moves:
+        if move_obj not in yielded:
+            yield move_obj
+
+    # 6. Catture perdenti
+    for move_obj in bad_captures:
+        yield move_obj
+
 # --- Funzioni Ricerca Principale ---
+_POLL_MASK = constants.SEARCH_POLL_INTERVAL - 1 # SEARCH_POLL_INTERVAL è una potenza di 2
 
-def _store_tt_entry(transposition_table, index, position_hash, depth, score, bound, best_move):
-    """ Salva un'entry nella TT (Depth-Preferred). """
-    existing_entry = transposition_table[index]
-    should_store = False
-    # Controlla se lo slot è vuoto o l'hash non corrisponde (collisione)
-    if existing_entry is None or existing_entry['hash'] != position_hash:
-        should_store = True
-    # Se l'hash corrisponde, sovrascrivi solo se la nuova profondità è maggiore o uguale
-    elif depth >= existing_entry['depth']:
-        # Potresti aggiungere un check qui: se la profondità è uguale,
-        # forse preferisci mantenere un EXACT bound rispetto a un LOWER/UPPER?
-        # Per ora, sovrascrivi sempre se profondità >=
-        should_store = True
-
-    if should_store:
-        # Crea il nuovo dizionario per l'entry
-        new_entry = {
-            'hash': position_hash, 'depth': depth, 'score': score,
-            'bound': bound, 'best_move': best_move # Assicurati che best_move sia un oggetto Move o None
-        }
-        transposition_table[index] = new_entry
-
-
-def quiescence_search(engine, alpha, beta, ply):
-    """ Quiescence search. Ora ritorna (score, None). """
+def quiescence_search(engine, alpha, beta, ply, in_check=None):
+    """
+    Quiescence search. Ora ritorna (score, None).
+    Fuori dallo scacco cerca solo catture e promozioni (generate_captures) con stand-pat;
+    sotto scacco niente stand-pat: si cercano tutte le evasioni (generate_evasions) e,
+    se non ce ne sono, è matto.
+    in_check arriva dal nodo padre (gives_check); None = da calcolare qui.
+    """
     global q_nodes_searched
     q_nodes_searched += 1
+    if not q_nodes_searched & _POLL_MASK: _poll_search_control()
 
-    board_array = engine.board
+    squares = engine.squares
     current_player_color = engine.current_player
     en_passant_target = engine.en_passant_target
-
-    stand_pat_score = evaluation.evaluate_board(board_array, current_player_color)
-
     best_move_q = None
 
-    if stand_pat_score >= beta:
-        return beta, best_move_q # Fail high
-    alpha = max(alpha, stand_pat_score)
-
-    moves = engine.get_pseudo_legal_moves(current_player_color)
-    # Considera solo catture e promozioni in quiescenza
-    candidate_moves = [mv for mv in moves if board_array[mv.end_row][mv.end_col] != '.' or mv.promotion_piece or
-                      (board_array[mv.start_row][mv.start_col].lower() == 'p' and en_passant_target == (mv.end_row, mv.end_col))]
+    # Sotto scacco (e non al limite di ply): solo evasioni, lo stand-pat non è una scelta legale
+    if ply >= constants.MAX_SEARCH_PLY:
+        in_check = False
+    elif in_check is None:
+        in_check = engine.is_in_check(current_player_color)
+    if in_check:
+        candidate_moves = engine._generate_legal_moves(current_player_color) # Sotto scacco = evasioni
+        if not candidate_moves:
+            return -constants.MATE_SCORE + ply, best_move_q # Matto
+        stand_pat_score = -constants.MATE_SCORE + ply
+    else:
+        if constants.LAZY_EVAL:
+            # Lazy solo sopra beta (si ritorna subito beta). Sotto alpha il limite superiore garantito
+            # dal margine è troppo largo per il delta pruning e farebbe cercare più catture.
+            stand_pat_score = engine.evaluate(-constants.MATE_SCORE * 2, beta)
+        else:
+            stand_pat_score = engine.evaluate()
+        if stand_pat_score >= beta:
+            return beta, best_move_q # Fail high
+        alpha = max(alpha, stand_pat_score)
+        if ply >= constants.MAX_SEARCH_PLY:
+            return alpha, best_move_q
+        # Considera solo catture e promozioni in quiescenza (generate direttamente, già legali)
+        candidate_moves = engine.generate_captures(current_player_color)
 
     qply = min(ply, constants.MAX_SEARCH_PLY - 1)
     killer_moves_ply = engine.killer_moves[qply] if qply < len(engine.killer_moves) else [None, None]
     color_index = 0 if current_player_color == 'W' else 1
     history_heuristic_color = engine.history_heuristic[color_index]
-    # Ordina solo le mosse candidate (catture/promozioni)
-    ordered_candidates = order_moves(board_array, candidate_moves, killer_moves_ply, history_heuristic_color, ply, current_player_color)
+    # Ordina solo le mosse candidate (catture/promozioni o evasioni)
+    ordered_candidates = order_moves(squares, candidate_moves, killer_moves_ply, history_heuristic_color, ply, current_player_color)
 
     current_best_score = stand_pat_score # Inizia con stand-pat
 
     for move_obj in ordered_candidates:
         # --- Controllo SEE ---
-        # Solo per catture dirette (non promozioni su casa vuota)
-        is_direct_capture = board_array[move_obj.end_row][move_obj.end_col] != '.' or \
-                            (board_array[move_obj.start_row][move_obj.start_col].lower() == 'p' and en_passant_target == (move_obj.end_row, move_obj.end_col))
+        # Solo per catture dirette (non promozioni su casa vuota), mai sulle evasioni
+        victim_code_delta = squares[(move_obj >> TO_SHIFT) & FROM_MASK]
+        is_direct_capture = not in_check and (victim_code_delta != constants.EMPTY or not move_obj.promotion_piece) # Altrimenti è EP
 
         if is_direct_capture:
             # Ottieni il valore del pezzo effettivamente catturato per Delta Pruning
-            victim_char_delta = board_array[move_obj.end_row][move_obj.end_col]
-            if victim_char_delta == '.': # Era EP
-                victim_char_delta = 'p' if current_player_color == 'W' else 'P'
-            captured_piece_val = constants.PIECE_VALUES.get(victim_char_delta.lower(), 0)
+            if victim_code_delta == constants.EMPTY: # Era EP
+                victim_code_delta = constants.PAWN
+            captured_piece_val = constants.PIECE_VALUES_BY_CODE[victim_code_delta]
 
             # Delta Pruning: Se lo stand-pat + valore catturato + margine è ancora peggio di alpha, pota.
             if stand_pat_score + captured_piece_val + 200 < alpha:
@@ -360,66 +362,63 @@ def quiescence_search(engine, alpha, beta, ply):
 
             # SEE Pruning: Se lo scambio statico è negativo, pota.
             # Nota: Usiamo la funzione 'see' corretta
-            see_score = see(board_array, move_obj, en_passant_target)
+            see_score = see(squares, move_obj, en_passant_target)
             if see_score < 0:
                 continue
         # --- Fine Controllo SEE ---
 
 
-        # Verifica legalità mossa (necessario perché partiamo da pseudo-legali)
-        # Usare snapshot è più sicuro per lo stato complesso dell'engine
-        original_state = engine.get_state_snapshot()
+        child_in_check = engine.gives_check(move_obj)
         engine.make_move(move_obj)
-        # Il giocatore che ha mosso è l'avversario di current_player_color originale
-        opponent_color_check = 'B' if current_player_color == 'W' else 'W'
-        is_legal = not engine.is_in_check(current_player_color) # Controlla se il *proprio* re è in scacco
-        engine.restore_state_snapshot(original_state) # Ripristina subito
-
-        if is_legal:
-            # Esegui la mossa di nuovo per la chiamata ricorsiva
-            engine.make_move(move_obj)
-            # Chiamata ricorsiva - prendi solo lo score, ignora la mossa ritornata
-            score, _ = quiescence_search(engine, -beta, -alpha, ply + 1)
-            score = -score # Nega lo score ritornato
-            engine.unmake_move() # Annulla la mossa
+        # Chiamata ricorsiva - prendi solo lo score, ignora la mossa ritornata
+        score, _ = quiescence_search(engine, -beta, -alpha, ply + 1, child_in_check)
+        score = -score # Nega lo score ritornato
+        engine.unmake_move() # Annulla la mossa
 
-            current_best_score = max(current_best_score, score) # Aggiorna il miglior score trovato finora
+        current_best_score = max(current_best_score, score) # Aggiorna il miglior score trovato finora
 
-            if score >= beta:
-                return beta, best_move_q # Fail high (Taglio Beta)
-            alpha = max(alpha, score) # Aggiorna Alpha
+        if score >= beta:
+            return beta, best_move_q # Fail high (Taglio Beta)
+        alpha = max(alpha, score) # Aggiorna Alpha
 
     # Ritorna il miglior score trovato (o alpha se nessuna mossa ha migliorato) e None per la mossa
     return alpha, best_move_q
 
-def negamax(engine, depth, alpha, beta, ply):
-    """ Funzione di ricerca Negamax con IID e Singular Extensions. Ritorna (score, best_move_obj). """
+def negamax(engine, depth, alpha, beta, ply, in_check=None):
+    """
+    Funzione di ricerca Negamax con IID e Singular Extensions. Ritorna (score, best_move_obj).
+    in_check arriva dal nodo padre (gives_check prima di make_move): il test di scacco sul re
+    gira al più una volta per nodo. None = da calcolare qui (radice).
+    """
     global nodes_searched, tt_probes, tt_hits, nmp_cutoffs
     nodes_searched += 1
+    if not nodes_searched & _POLL_MASK: _poll_search_control()
 
     transposition_table = engine.transposition_table
     current_hash = engine.current_hash
     current_player_color = engine.current_player
     halfmove_clock = engine.halfmove_clock
-    history = engine.history
     killer_moves = engine.killer_moves
     history_heuristic = engine.history_heuristic
     position_hash = current_hash
 
     if ply >= constants.MAX_SEARCH_PLY:
-        eval_score = evaluation.evaluate_board(engine.board, current_player_color)
+        eval_score = engine.evaluate()
         return eval_score, None
     if ply > 0:
-        history_len = len(history)
-        if history_len >= 4:
-            try:
-                # Controllo ripetizione semplice (2 ripetizioni precedenti)
-                # NOTA: questo è un check base, non copre tutte le ripetizioni a 3 posizioni
-                if history[-2]['previous_hash'] == position_hash and history[-4]['previous_hash'] == position_hash:
-                    return constants.DRAW_SCORE, None
-            except IndexError: pass
+        undo_count = engine.undo_count
+        if undo_count >= 4:
+            # Controllo ripetizione semplice (2 ripetizioni precedenti) sull'array piatto degli hash
+            # NOTA: questo è un check base, non copre tutte le ripetizioni a 3 posizioni
+            hash_history = engine.hash_history
+            if hash_history[undo_count - 2] == position_hash and hash_history[undo_count - 4] == position_hash:
+                return constants.DRAW_SCORE, None
         if halfmove_clock >= 100:
             return constants.DRAW_SCORE, None
+    # Entry materiale (chiave incrementale): patta certa per materiale insufficiente e gate NMP
+    material_entry = engine.material_table.lookup(engine.material_key)
+    if ply > 0 and material_entry[evaluation.MATERIAL_DRAW]:
+        return constants.DRAW_SCORE, None
 
     original_alpha = alpha
     original_beta = beta
@@ -427,19 +426,12 @@ def negamax(engine, depth, alpha, beta, ply):
     tt_score = None
     tt_bound = None
     tt_depth = -1
-    tt_index = position_hash % constants.TT_SIZE
-    cached_entry = transposition_table[tt_index]
+    cached_entry = transposition_table.probe(position_hash)
     tt_probes += 1
 
-    if cached_entry is not None and cached_entry['hash'] == position_hash:
+    if cached_entry is not None:
         tt_hits += 1
-        tt_depth = cached_entry['depth']
-        tt_score = cached_entry['score']
-        tt_bound = cached_entry['bound']
-        # Verifica se la mossa cachata è un oggetto Move valido
-        cached_move = cached_entry.get('best_move')
-        if isinstance(cached_move, m.Move):
-            tt_move = cached_move
+        tt_depth, tt_score, tt_bound, tt_move = cached_entry
 
         # Usa l'entry TT solo se la profondità è sufficiente
         if tt_depth >= depth:
@@ -452,51 +444,39 @@ def negamax(engine, depth, alpha, beta, ply):
             if tt_bound == constants.TT_BOUND_LOWER and score >= beta: return score, tt_move
             if tt_bound == constants.TT_BOUND_UPPER and score <= alpha: return score, tt_move
 
-    is_in_check = engine.is_in_check(current_player_color)
+    is_in_check = engine.is_in_check(current_player_color) if in_check is None else in_check
     if depth <= 0:
         # Raggiunta profondità 0, passa a quiescence search
-        return quiescence_search(engine, alpha, beta, ply)
+        return quiescence_search(engine, alpha, beta, ply, is_in_check)
 
     # Internal Iterative Deepening (IID)
     iid_move = None
     if tt_move is None and depth >= constants.IID_MIN_DEPTH:
         iid_depth = depth - constants.IID_REDUCTION
-        # Esegui una ricerca a profondità ridotta senza aggiornare lo stato globale
-        # Passa una copia temporanea dell'engine o usa snapshot (snapshot è più semplice qui)
-        # NOTA: IID qui è semplificato, non passa TT o altre strutture complesse
-        # Potrebbe essere meno efficace senza condividere informazioni tra ricerche
-        _, iid_potential_move = negamax(engine, iid_depth, -constants.MATE_SCORE*2, constants.MATE_SCORE*2, ply) # Non incrementa ply qui? Dipende da implementazione
+        # Ricerca a profondità ridotta sulla stessa posizione: negamax lascia l'engine
+        # com'era (make/unmake), quindi non serve nessuna copia.
+        # NOTA: IID qui è semplificato, la mossa trovata viene usata solo per l'ordinamento
+        _, iid_potential_move = negamax(engine, iid_depth, -constants.MATE_SCORE*2, constants.MATE_SCORE*2, ply, is_in_check) # Stessa posizione, stesso ply
         if iid_potential_move is not None: iid_move = iid_potential_move
 
     # Null Move Pruning (NMP)
     can_do_nmp = not is_in_check and depth >= constants.NMP_MIN_DEPTH and ply > 0
     if can_do_nmp:
         # Verifica materiale minimo per evitare NMP in endgame con pochi pezzi
-        own_material = 0
-        player_piece_chars = 'PNBRQ' if current_player_color == 'W' else 'pnbrq'
-        for r in range(8):
-            for c in range(8):
-                piece = engine.board[r][c]
-                # Considera solo pezzi non pedoni per il threshold NMP
-                if piece in player_piece_chars and piece.lower() != 'p':
-                    own_material += constants.PIECE_VALUES.get(piece.lower(), 0)
-                    if own_material >= constants.MIN_MATERIAL_FOR_NMP: break
-            if own_material >= constants.MIN_MATERIAL_FOR_NMP: break
+        # Considera solo pezzi non pedoni per il threshold NMP (precalcolati nell'entry materiale)
+        own_material = material_entry[evaluation.MATERIAL_NON_PAWN][0 if current_player_color == 'W' else 1]
 
         if own_material >= constants.MIN_MATERIAL_FOR_NMP:
-            # Salva stato, fai mossa nulla, cerca, ripristina stato
-            original_state_nmp = engine.get_state_snapshot()
-            # Fai la "null move": cambia solo turno e resetta EP
-            engine.current_player = 'B' if current_player_color == 'W' else 'W'
-            engine.current_hash = engine.calculate_zobrist_hash() # Ricalcola hash dopo cambio stato
+            # Fai la "null move": cambia solo turno e resetta EP (hash incrementale, nessuna copia)
             # Non resettare halfmove clock per null move
+            engine.make_null_move()
 
             nmp_depth = depth - 1 - constants.NMP_REDUCTION
             # Cerca con beta invertito (-beta + 1), se fallisce alto (>= -beta+1), allora la mossa nulla è >= beta originale
-            score_nmp, _ = negamax(engine, nmp_depth, -beta, -beta + 1, ply + 1)
+            score_nmp, _ = negamax(engine, nmp_depth, -beta, -beta + 1, ply + 1, False) # Dopo la mossa nulla l'avversario non è sotto scacco
             score_nmp = -score_nmp # Ripristina prospettiva
 
-            engine.restore_state_snapshot(original_state_nmp) # Ripristina stato
+            engine.unmake_null_move() # Ripristina stato
 
             if score_nmp >= beta:
                 nmp_cutoffs += 1
@@ -506,68 +486,45 @@ def negamax(engine, depth, alpha, beta, ply):
                 if score_to_store_nmp >= constants.MATE_SCORE - constants.MAX_SEARCH_PLY: score_to_store_nmp += ply
                 elif score_to_store_nmp <= -constants.MATE_SCORE + constants.MAX_SEARCH_PLY: score_to_store_nmp -= ply
                 # Usa la funzione helper per memorizzare
-                _store_tt_entry(transposition_table, tt_index, position_hash, depth, score_to_store_nmp, constants.TT_BOUND_LOWER, None) # Non abbiamo una best move da null move
+                transposition_table.store(position_hash, depth, score_to_store_nmp, constants.TT_BOUND_LOWER, None) # Non abbiamo una best move da null move
                 return beta, None # Ritorna beta come lower bound
 
-    # --- Generazione/Ordinamento Mosse ---
-    moves = engine.get_legal_moves(current_player_color)
-    if not moves:
-        # Nessuna mossa legale
-        score = (-constants.MATE_SCORE + ply) if is_in_check else constants.STALEMATE_SCORE
-        bound = constants.TT_BOUND_EXACT
-        _store_tt_entry(transposition_table, tt_index, position_hash, constants.MAX_SEARCH_PLY, score, bound, None) # Profondità massima per nodo terminale
-        return score, None
-
+    # --- Generazione/Ordinamento Mosse (a fasi, vedi pick_moves) ---
     qply = min(ply, constants.MAX_SEARCH_PLY - 1)
     killer_moves_ply = killer_moves[qply] if qply < len(killer_moves) else [None, None]
     color_index = 0 if current_player_color == 'W' else 1
     history_heuristic_color = history_heuristic[color_index]
 
-    # Ordina le mosse: priorità a TT move, IID move, poi catture (MVV/LVA), promozioni, killer, history
-    ordered_moves = []
-    processed_moves = set()
-    # 1. TT Move (se legale)
-    if tt_move and tt_move in moves:
-        ordered_moves.append(tt_move)
-        processed_moves.add(tt_move)
-    # 2. IID Move (se diverso da TT move e legale)
-    if iid_move and iid_move in moves and iid_move not in processed_moves:
-        ordered_moves.append(iid_move)
-        processed_moves.add(iid_move)
-    # 3. Ordina le rimanenti
-    remaining_moves = [mv for mv in moves if mv not in processed_moves]
-    sorted_remaining = order_moves(engine.board, remaining_moves, killer_moves_ply, history_heuristic_color, ply, current_player_color)
-    ordered_moves.extend(sorted_remaining)
-
-
     # --- Loop Mosse Principale ---
     best_score_at_node = -constants.MATE_SCORE * 2 # Inizializza a valore molto basso
-    best_move_at_node = ordered_moves[0] # Inizializza con la prima mossa ordinata come fallback
+    best_move_at_node = None # Diventa la prima mossa prodotta dal picker (fallback)
     moves_searched_count = 0
     static_eval_done = False
     static_eval = 0
     did_beta_cutoff = False # Flag per sapere se c'è stato taglio beta
 
-    for i, move_obj in enumerate(ordered_moves):
-        is_capture = engine.board[move_obj.end_row][move_obj.end_col] != '.'
-        if not is_capture and move_obj.promotion_piece: is_capture = True # Promozione conta come non-quiet
-        if not is_capture and engine.board[move_obj.start_row][move_obj.start_col].lower() == 'p' and \
-            engine.en_passant_target is not None and (move_obj.end_row, move_obj.end_col) == engine.en_passant_target:
-            is_capture = True # Cattura EP conta come non-quiet
-        is_quiet = not is_capture
+    for i, move_obj in enumerate(pick_moves(engine, tt_move, iid_move, killer_moves_ply, history_heuristic_color)):
+        if i == 0: best_move_at_node = move_obj
+        # Catture (incluso en passant) e promozioni contano come non-quiet
+        is_quiet = not engine.is_tactical_move(move_obj)
+        # Scacco dato dalla mossa, calcolato senza eseguirla e passato al figlio come suo in_check
+        gives_check = engine.gives_check(move_obj)
 
         # --- Futility Pruning (solo a profondità basse) ---
-        # Applica solo se non siamo in scacco, la mossa è tranquilla, e alpha non è già un matto
-        can_futility_prune = not is_in_check and is_quiet and \
+        # Applica solo se non siamo in scacco, la mossa è tranquilla e non dà scacco, e alpha non è già un matto
+        can_futility_prune = not is_in_check and is_quiet and not gives_check and \
                             alpha < constants.MATE_SCORE - constants.MAX_SEARCH_PLY and \
                             beta < constants.MATE_SCORE - constants.MAX_SEARCH_PLY
 
         if can_futility_prune and depth == 1:
             if not static_eval_done:
-                static_eval = evaluation.evaluate_board(engine.board, current_player_color)
+                static_eval = engine.evaluate()
                 static_eval_done = True
             # Se la valutazione statica + margine non migliora alpha, salta la mossa
             if static_eval + constants.FUTILITY_MARGIN_DEPTH_1 <= alpha:
+                # Lo score stimato conta come upper bound: se tutte le mosse vengono potate
+                # il nodo non ritorna -infinito (visto dal padre come un matto)
+                best_score_at_node = max(best_score_at_node, static_eval + constants.FUTILITY_MARGIN_DEPTH_1)
                 continue # Salta questa mossa tranquilla
 
         # --- Make Move ---
@@ -576,8 +533,6 @@ def negamax(engine, depth, alpha, beta, ply):
 
         # --- Calcolo Profondità Ricerca e Estensioni ---
         # Estensione per scacco
-        opponent_color_after_move = 'B' if current_player_color == 'W' else 'W'
-        gives_check = engine.is_in_check(opponent_color_after_move)
         current_extension = constants.CHECK_EXTENSION if gives_check else 0
         # La profondità base per la chiamata ricorsiva
         current_search_depth = depth - 1 + current_extension
@@ -588,7 +543,7 @@ def negamax(engine, depth, alpha, beta, ply):
 
         # Principal Variation Search (PVS)
         if i == 0: # Prima mossa (presumibilmente la migliore) -> Full Window Search
-            score, move_from_recursive_call = negamax(engine, current_search_depth, -beta, -alpha, ply + 1)
+            score, move_from_recursive_call = negamax(engine, current_search_depth, -beta, -alpha, ply + 1, gives_check)
             score = -score
         else: # Altre mosse -> Prova Zero Window Search (ZWS) prima
             reduction = 0
@@ -602,7 +557,7 @@ def negamax(engine, depth, alpha, beta, ply):
             reduced_depth = max(0, current_search_depth - reduction)
 
             # Zero Window Search (ZWS) con profondità ridotta (se LMR applicata)
-            score, _ = negamax(engine, reduced_depth, -alpha - 1, -alpha, ply + 1) # Finestra (-(a+1), -a)
+            score, _ = negamax(engine, reduced_depth, -alpha - 1, -alpha, ply + 1, gives_check) # Finestra (-(a+1), -a)
             score = -score
 
             # Se ZWS fallisce alto (score > alpha), significa che la mossa potrebbe essere migliore di alpha.
@@ -610,19 +565,22 @@ def negamax(engine, depth, alpha, beta, ply):
             if score > alpha and score < beta: # Se è potenzialmente dentro la finestra (alpha, beta)
                 # Possiamo prima provare senza riduzione se c'era LMR
                 if reduction > 0:
-                    score, _ = negamax(engine, current_search_depth, -alpha - 1, -alpha, ply + 1)
+                    score, _ = negamax(engine, current_search_depth, -alpha - 1, -alpha, ply + 1, gives_check)
                     score = -score
 
                 # Se ancora > alpha (o se non c'era LMR), fai la ricerca con finestra piena
                 if score > alpha:
-                    score, move_from_recursive_call = negamax(engine, current_search_depth, -beta, -alpha, ply + 1)
+                    score, move_from_recursive_call = negamax(engine, current_search_depth, -beta, -alpha, ply + 1, gives_check)
                     score = -score
 
         # --- Unmake Move ---
         engine.unmake_move()
 
-        # --- Controllo Tempo (Opzionale qui, più efficace nel loop ID) ---
-        # if time_limit is not None and (time.time() - start_time) > time_limit: return alpha, best_move_at_node # O un valore speciale
+        # Alla radice (profondità dell'iterazione, non IID) una mossa che migliora alpha
+        # è completamente cercata: è la mossa da giocare se l'iterazione viene interrotta.
+        if ply == 0 and score > alpha and search_control is not None and depth == search_control.root_depth:
+            search_control.root_best_move = move_obj
+            search_control.root_best_score = score
 
         # --- Aggiorna Best Score & Alpha per questo nodo ---
         if score > best_score_at_node:
@@ -642,31 +600,27 @@ def negamax(engine, depth, alpha, beta, ply):
                     if move_obj != killer_moves_ply[0]: # Non inserire duplicati
                         killer_moves[qply][1] = killer_moves_ply[0] # Sposta il vecchio primario a secondario
                         killer_moves[qply][0] = move_obj          # Imposta nuovo primario
-                # Aggiorna History Heuristic
-                start_sq = move_obj.start_row * 8 + move_obj.start_col
-                end_sq = move_obj.end_row * 8 + move_obj.end_col
-                # Assicura che indici siano validi e incrementa
-                if 0 <= start_sq < 64 and 0 <= end_sq < 64:
-                    history_heuristic[color_index][start_sq][end_sq] += depth * depth # Incremento quadratico
+                # Aggiorna History Heuristic (indice [from][to] = bit bassi della mossa)
+                history_heuristic[color_index][move_obj & FROM_TO_MASK] += depth * depth # Incremento quadratico
 
             # Memorizza nella TT come Lower Bound (punteggio è almeno beta)
             score_to_store_cutoff = beta # Memorizza il limite inferiore che è stato superato
             if score_to_store_cutoff >= constants.MATE_SCORE - constants.MAX_SEARCH_PLY: score_to_store_cutoff += ply
             elif score_to_store_cutoff <= -constants.MATE_SCORE + constants.MAX_SEARCH_PLY: score_to_store_cutoff -= ply
             # Usa la mossa che ha causato il taglio
-            _store_tt_entry(transposition_table, tt_index, position_hash, depth, score_to_store_cutoff, constants.TT_BOUND_LOWER, move_obj)
+            transposition_table.store(position_hash, depth, score_to_store_cutoff, constants.TT_BOUND_LOWER, move_obj)
             return beta, move_obj # Ritorna il lower bound (beta) e la mossa
 
     # --- Fine Loop Mosse Principale ---
 
     # Se siamo qui, nessuna mossa ha causato un taglio beta (alpha < beta)
 
-    # Verifica caso raro: nessuna mossa trovata valida nel loop (dovrebbe essere coperto da check iniziale 'if not moves')
+    # Il picker non ha prodotto mosse: nessuna mossa legale
     if best_move_at_node is None:
-        # Questo non dovrebbe accadere se 'moves' non è vuoto all'inizio
-        # Potrebbe indicare un problema se tutte le mosse sono state potate da Futility?
-        if is_in_check: return -constants.MATE_SCORE + ply, None # Se in scacco e nessuna mossa, è matto
-        else: return constants.DRAW_SCORE, None # Altrimenti stallo? O draw? Usiamo DRAW_SCORE.
+        score = (-constants.MATE_SCORE + ply) if is_in_check else constants.STALEMATE_SCORE
+        bound = constants.TT_BOUND_EXACT
+        transposition_table.store(position_hash, constants.MAX_SEARCH_PLY, score, bound, None) # Profondità massima per nodo terminale
+        return score, None
 
 
     # --- Singular Extensions ---
@@ -706,9 +660,10 @@ def negamax(engine, depth, alpha, beta, ply):
     if singular_extension_to_apply > 0 and singular_candidate_move is not None:
         extended_depth = depth - 1 + singular_extension_to_apply # Profondità base + estensione
         # Esegui la ricerca solo per la mossa singolare
+        singular_gives_check = engine.gives_check(singular_candidate_move)
         engine.make_move(singular_candidate_move)
         # Cerca con la finestra originale (alpha, beta)
-        extended_score, _ = negamax(engine, extended_depth, -original_beta, -original_alpha, ply + 1)
+        extended_score, _ = negamax(engine, extended_depth, -original_beta, -original_alpha, ply + 1, singular_gives_check)
         extended_score = -extended_score
         engine.unmake_move()
 
@@ -740,12 +695,50 @@ def negamax(engine, depth, alpha, beta, ply):
     if score_to_store >= constants.MATE_SCORE - constants.MAX_SEARCH_PLY: score_to_store += ply
     elif score_to_store <= -constants.MATE_SCORE + constants.MAX_SEARCH_PLY: score_to_store -= ply
 
-    # Salva nella TT (sovrascrivi solo se profondità è maggiore o uguale, gestito da _store_tt_entry)
-    _store_tt_entry(transposition_table, tt_index, position_hash, depth, score_to_store, bound_to_store, best_move_at_node)
+    # Salva nella TT (sostituzione per profondità ed età gestita da TranspositionTable.store)
+    transposition_table.store(position_hash, depth, score_to_store, bound_to_store, best_move_at_node)
 
     # Ritorna lo score finale e la mossa migliore associata
     return final_score, best_move_at_node
 
+def extract_pv(engine, first_move, max_length):
+    """
+    Ricostruisce la PV (lista di stringhe UCI) seguendo le best move della TT a partire
+    da first_move. Le mosse vengono giocate sull'engine e annullate alla fine (nessuna copia).
+    """
+    pv_line = []
+    pv_plies_made = 0
+    try:
+        current_pv_move = first_move
+        for _pv_depth in range(max_length): # Limita a profondità corrente
+            if current_pv_move is None: break
+            # Verifica legalità (dovrebbe essere legale se da negamax)
+            if not engine.is_legal_move(current_pv_move): break
+
+            pv_line.append(current_pv_move.to_uci_string())
+            engine.make_move(current_pv_move)
+            pv_plies_made += 1
+
+            # Cerca la prossima mossa PV nella TT
+            tt_entry_pv = engine.transposition_table.probe(engine.current_hash)
+            current_pv_move = tt_entry_pv[3] if tt_entry_pv is not None else None # Prossima mossa o None
+    except Exception:
+        # Fallback: usa solo la prima mossa se PV fallisce
+        pv_line = [first_move.to_uci_string()] if first_move else []
+    finally:
+        for _ in range(pv_plies_made):
+            engine.unmake_move()
+    return pv_line
+
+
+def format_score(score):
+    """Score UCI: 'cp N' o 'mate N' (in mosse, negativo se si subisce il matto)."""
+    if abs(score) >= constants.MATE_SCORE - constants.MAX_SEARCH_PLY:
+        mate_in_plies = constants.MATE_SCORE - abs(score)
+        mate_in_moves = max(1, (mate_in_plies + 1) // 2) # Arrotonda per eccesso, almeno 1
+        return f"mate {'' if score > 0 else '-'}{int(mate_in_moves)}"
+    return f"cp {int(score)}"
+
 # --- Funzione Principale di Ricerca (Iterative Deepening) ---
 
 def allocate_time(time_ms, inc_ms, movestogo):
@@ -778,13 +771,21 @@ def allocate_time(time_ms, inc_ms, movestogo):
     return max(calculated_time, min_time * safety_margin_factor)
 
 
-def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtime=None, btime=None, winc=0, binc=0, movestogo=None):
+def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtime=None, btime=None, winc=0, binc=0, movestogo=None,
+                control=None, start_depth=1):
     """
     Esegue la ricerca Iterative Deepening con Aspiration Windows.
+    Il tempo allocato è una scadenza rigida: negamax/quiescence la controllano ogni
+    SEARCH_POLL_INTERVAL nodi e, se scade (o control.stop() viene chiamato), la ricerca
+    si interrompe subito e ritorna la mossa dell'ultima iterazione completata, o quella
+    dell'iterazione parziale se la sua prima mossa radice è già stata cercata per intero.
+    start_depth > 1 salta le prime iterazioni (helper Lazy SMP, vedi smp.py).
     """
-    global nodes_searched, q_nodes_searched, tt_probes, tt_hits, nmp_cutoffs, start_time
-    nodes_searched = 0; q_nodes_searched = 0; tt_probes = 0; tt_hits = 0; nmp_cutoffs = 0
+    global nodes_searched, q_nodes_searched, tt_probes, tt_hits, nmp_cutoffs, moves_generated, start_time, search_control
+    nodes_searched = 0; q_nodes_searched = 0; tt_probes = 0; tt_hits = 0; nmp_cutoffs = 0; moves_generated = 0
+    evaluation.lazy_eval_stats.reset() # Le righe info string lazyeval sono per ricerca
     start_time = time.time()
+    start_monotonic = time.monotonic()
 
     overall_best_move = None
     overall_best_score = -constants.MATE_SCORE * 2 # Valore iniziale invalido
@@ -804,13 +805,22 @@ def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtim
     # Profondità massima effettiva
     effective_max_depth = max_depth if time_limit is None else constants.MAX_SEARCH_PLY
 
+    # Controllo ricerca: scadenza rigida = tempo allocato (un control esterno può già avere abort/scadenza)
+    if control is None:
+        control = SearchControl()
+    if time_limit is not None and control.deadline is None:
+        control.deadline = start_monotonic + time_limit
+    search_control = control
+    root_undo_count = engine.undo_count # Per riportare l'engine alla radice dopo un abort
+    engine.transposition_table.new_search() # Invecchia le entry delle ricerche precedenti
+
     # Valori per Aspiration Windows
     aspiration_alpha = -constants.MATE_SCORE * 2
     aspiration_beta = constants.MATE_SCORE * 2
     aspiration_delta = 35 # Finestra iniziale (circa 1/3 di pedone)
 
     # --- Iterative Deepening ---
-    for current_depth in range(1, effective_max_depth + 1):
+    for current_depth in range(min(start_depth, effective_max_depth), effective_max_depth + 1):
         # Imposta finestra di aspirazione se abbiamo uno score precedente valido
         if overall_best_score > -constants.MATE_SCORE * 2 + constants.MAX_SEARCH_PLY: # Usa score valido
             alpha = max(-constants.MATE_SCORE * 2, overall_best_score - aspiration_delta)
@@ -821,6 +831,7 @@ def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtim
 
         # Loop per Aspiration Window (potrebbe richiedere re-search)
         research_count = 0
+        iteration_aborted = False
         while True:
             research_count += 1
             if research_count > 1:
@@ -830,13 +841,22 @@ def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtim
 
             # Esegui la ricerca Negamax alla radice per questa profondità e finestra
             # (Negamax internamente gestirà TT, NMP, LMR, ecc.)
-            current_search_best_score, current_search_best_move = negamax(engine, current_depth, alpha, beta, 0) # ply = 0 alla radice
-
-            # Controlla se il tempo è scaduto DOPO la chiamata a negamax
-            elapsed_time_check = time.time() - start_time
-            if time_limit is not None and elapsed_time_check > time_limit:
-                print("info string Time limit reached during search (Aspiration)", file=sys.stderr, flush=True)
+            control.root_depth = current_depth
+            control.root_best_move = None
+            try:
+                current_search_best_score, current_search_best_move = negamax(engine, current_depth, alpha, beta, 0) # ply = 0 alla radice
+            except SearchAborted:
+                # Scadenza o stop: riporta l'engine alla radice e usa l'iterazione parziale solo se sicura
+                engine.unwind_to(root_undo_count)
+                print(f"info string Search aborted at depth {current_depth} after {int((time.monotonic() - start_monotonic) * 1000)} ms",
+                      file=sys.stderr, flush=True)
+                if control.root_best_move is not None:
+                    overall_best_move = control.root_best_move
+                    overall_best_score = control.root_best_score
+                    if not pv_line_global or pv_line_global[0] != overall_best_move.to_uci_string():
+                        pv_line_global = [overall_best_move.to_uci_string()]
                 time_out_occurred = True
+                iteration_aborted = True
                 break # Esce dal while True
 
             # Verifica se la ricerca è fallita bassa (score <= alpha originale)
@@ -865,32 +885,7 @@ def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtim
                 aspiration_delta = 35 # Resetta alla finestra iniziale
 
                 # Ricostruzione PV (Principal Variation) dalla TT
-                pv_line_global = []
-                try:
-                    import copy
-                    temp_engine = copy.deepcopy(engine) # Lavora su una copia
-                    current_pv_move = overall_best_move
-                    for _pv_depth in range(current_depth): # Limita a profondità corrente
-                        if current_pv_move is None: break
-                        # Verifica legalità (dovrebbe essere legale se da negamax)
-                        if current_pv_move not in temp_engine.get_legal_moves(temp_engine.current_player): break
-
-                        pv_line_global.append(current_pv_move.to_uci_string())
-                        temp_engine.make_move(current_pv_move)
-
-                        # Cerca la prossima mossa PV nella TT
-                        tt_idx_pv = temp_engine.current_hash % constants.TT_SIZE
-                        tt_entry_pv = engine.transposition_table[tt_idx_pv] # Usa la TT originale aggiornata
-                        next_move = None
-                        if tt_entry_pv and tt_entry_pv['hash'] == temp_engine.current_hash:
-                            pv_move_from_tt = tt_entry_pv.get('best_move')
-                            if isinstance(pv_move_from_tt, m.Move):
-                                next_move = pv_move_from_tt
-                        current_pv_move = next_move # Prossima mossa o None
-                except Exception as e:
-                    # Fallback: usa solo la prima mossa se PV fallisce
-                    pv_line_global = [overall_best_move.to_uci_string()] if overall_best_move else []
-                # --- Fine Ricostruzione PV ---
+                pv_line_global = extract_pv(engine, overall_best_move, current_depth)
 
             else:
                 # Nessuna mossa trovata (matto/stallo?)
@@ -906,32 +901,36 @@ def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtim
             break
         # --- Fine Loop Aspiration Window (while True) ---
 
+        # Iterazione interrotta: nessuna riga info, si stampano solo le iterazioni completate
+        if iteration_aborted:
+            break
+
         # --- Stampa Info UCI ---
         elapsed_time = time.time() - start_time
         score_str = ""
         # Usa l'ultimo score valido 'overall_best_score' per la stampa
         if overall_best_score > -constants.MATE_SCORE * 2 + constants.MAX_SEARCH_PLY: # Score valido
-            temp_score_for_print = overall_best_score
-            if abs(temp_score_for_print) >= constants.MATE_SCORE - constants.MAX_SEARCH_PLY:
-                mate_in_plies = constants.MATE_SCORE - abs(temp_score_for_print)
-                mate_in_moves = (mate_in_plies + 1) // 2 # Arrotonda per eccesso
-                mate_in_moves = max(1, mate_in_moves) # Almeno 1
-                score_sign = "" if temp_score_for_print > 0 else "-" # Segno per mate negativi
-                score_str = f"mate {score_sign}{int(mate_in_moves)}"
-            else:
-                score_str = f"cp {int(temp_score_for_print)}"
+            score_str = format_score(overall_best_score)
         else:
             score_str = "cp 0" # Default se non abbiamo score valido
 
         total_nodes = nodes_searched + q_nodes_searched
         nps = int(total_nodes / elapsed_time) if elapsed_time > 0 else 0
         pv_str = " ".join(pv_line_global) if pv_line_global else ""
-        # Calcola hashfull (opzionale, può rallentare)
-        # filled_count = sum(1 for entry in engine.transposition_table if entry is not None)
-        # hashfull = (filled_count * 1000 // constants.TT_SIZE) # Permille
-        # print(f"info depth {current_depth} score {score_str} nodes {total_nodes} nps {nps} hashfull {hashfull} time {int(elapsed_time * 1000)} pv {pv_str}", flush=True)
-        # Stampa senza hashfull per performance
-        print(f"info depth {current_depth} score {score_str} nodes {total_nodes} nps {nps} time {int(elapsed_time * 1000)} pv {pv_str}", flush=True)
+        # hashfull: permille della TT occupato dalla ricerca corrente (campione di 1000 entry)
+        hashfull = engine.transposition_table.hashfull()
+        # Tramite control.send: la riga non si mescola con le risposte del thread UCI (es. readyok)
+        control.send(f"info depth {current_depth} score {score_str} nodes {total_nodes} nps {nps} hashfull {hashfull} time {int(elapsed_time * 1000)} pv {pv_str}")
+        # Statistiche del move picker: mosse generate per nodo interno (generazione a fasi)
+        moves_per_node = moves_generated / nodes_searched if nodes_searched else 0
+        print(f"info string movegen {moves_generated} moves in {nodes_searched} nodes ({moves_per_node:.1f} per node)", file=sys.stderr, flush=True)
+        # Statistiche delle cache di valutazione (cumulative per l'engine)
+        eval_cache = engine.eval_cache
+        eval_probes = eval_cache.hits + eval_cache.misses
+        eval_hit_rate = 100 * eval_cache.hits / eval_probes if eval_probes else 0
+        print(f"info string evalcache {eval_cache.hits} hits {eval_cache.misses} misses ({eval_hit_rate:.0f}%)", file=sys.stderr, flush=True)
+        lazy_stats = evaluation.lazy_eval_stats
+        print(f"info string lazyeval reached {'/'.join(map(str, lazy_stats.reached))} exits {'/'.join(map(str, lazy_stats.exits))}", file=sys.stderr, flush=True)
 
 
         # --- Controlli Uscita Loop ID ---
@@ -954,5 +953,7 @@ def search_move(engine, max_depth=constants.MAX_SEARCH_PLY, move_time=None, wtim
         final_legal_moves = engine.get_legal_moves(engine.current_player)
         overall_best_move = final_legal_moves[0] if final_legal_moves else None # Prendi la prima se esiste
 
+    search_control = None
+
     # Ritorna la mossa migliore trovata
     return overall_best_move
\ No newline at end of file
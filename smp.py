@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# Ricerca parallela su più processi (non thread: il GIL serializzerebbe la ricerca).
+# - Lazy SMP: N-1 processi helper cercano la stessa radice del processo principale,
+#   con piccole perturbazioni (profondità di partenza, rumore sulla history), e
+#   condividono un'unica Transposition Table in multiprocessing.shared_memory.
+#   Solo il processo principale stampa info/bestmove; gli helper servono a riempire la TT.
+# - Root splitting (go depth N): le mosse radice, ordinate da una ricerca poco profonda,
+#   vengono cercate in un ProcessPoolExecutor con un alpha condiviso.
+import os
+import sys
+import time
+import queue
+import random
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+
+import constants
+import move as m
+import search
+import nnue
+from tt import TranspositionTable, ENTRY_BYTES, SNAPSHOT_HEADER, entries_for_size, read_snapshot_header
+from board import ChessEngine
+
+HELPER_STARTUP_TIMEOUT = 60 # Secondi
+
+
+def _network_path(engine):
+    """Percorso della rete NNUE attiva da passare agli altri processi (None = valutazione classica)."""
+    return engine.network.path if engine.network is not None else None
+
+
+def _set_worker_network(engine, path, networks):
+    """Attiva nel processo la rete path (caricata una volta sola e tenuta in networks)."""
+    if path is None:
+        network = None
+    elif path in networks:
+        network = networks[path]
+    else:
+        try:
+            network = networks[path] = nnue.load_network(path)
+        except (ImportError, OSError, ValueError):
+            network = networks[path] = None # Il processo principale ha già segnalato l'errore
+    if network is not engine.network:
+        engine.set_network(network)
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    tt.TranspositionTable su un blocco di shared memory (stesso formato impacchettato;
+    lo schema key = hash ^ data rende sicure le scritture concorrenti senza lock).
+    La generazione sta in una parola in fondo al blocco, così tutti i processi invecchiano
+    le entry allo stesso modo; la incrementa solo il processo che ha creato la tabella
+    (e che la distrugge con close(unlink=True)). Gli helper si agganciano con nome e
+    numero di entry.
+    """
+    def __init__(self, size_mb=constants.TT_SIZE_MB, name=None, entries=None):
+        entries = entries if entries is not None else entries_for_size(size_mb)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=entries * ENTRY_BYTES + 8)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._generation_index = 2 * entries
+        super().__init__(entries=entries, words=self.shm.buf[:entries * ENTRY_BYTES + 8].cast('Q'))
+        if self.owner:
+            self.clear()
+
+    @property
+    def generation(self):
+        return self.words[self._generation_index]
+
+    @generation.setter
+    def generation(self, value):
+        if self.owner: # Gli helper leggono soltanto la generazione del processo principale
+            self.words[self._generation_index] = value
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def clear(self):
+        self.shm.buf[:self.size_bytes + 8] = bytes(self.size_bytes + 8)
+
+    def resize_entries(self, entries):
+        """
+        Gli altri processi sono agganciati al blocco per nome e numero di entry: non si
+        ridimensiona in posto (uci._set_hash ricrea tabella e helper con LazySMP).
+        """
+        if entries != self.entries:
+            raise ValueError(f"la TT condivisa ha {self.entries} entry e non si ridimensiona in posto "
+                             f"(va ricreata con {entries} entry)")
+        self.clear()
+
+    def load(self, path):
+        """Copia lo snapshot nella shared memory (gli helper vedono lo stesso blocco: niente mmap del file)."""
+        entries, generation = read_snapshot_header(path)
+        if entries != self.entries:
+            raise ValueError(f"{path}: snapshot di {entries} entry, la TT condivisa ne ha {self.entries} (imposta Hash)")
+        with open(path, 'rb') as snapshot_file:
+            snapshot_file.seek(SNAPSHOT_HEADER)
+            snapshot_file.readinto(self.shm.buf[:self.size_bytes])
+        self.generation = generation
+
+    def close(self, unlink=False):
+        self.words.release()
+        self.words = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# --- Processi helper ---
+
+class _HelperControl(search.SearchControl):
+    """Lo helper si ferma quando il processo principale cambia l'id della ricerca corrente."""
+    def __init__(self, current_search_id, search_id):
+        super().__init__()
+        self.current_search_id = current_search_id
+        self.search_id = search_id
+
+    def should_stop(self):
+        if self.current_search_id.value != self.search_id:
+            self.abort_requested = True
+        return self.abort_requested
+
+
+def _helper_main(helper_index, tt_name, tt_entries, commands, ready, current_search_id):
+    """
+    Loop di un processo helper: attende (search_id, start_fen, move_codes, max_depth, nnue_path),
+    ricrea la posizione rigiocando le mosse (storia degli hash per le ripetizioni, come nel
+    root splitting) e cerca finché la ricerca è quella corrente, con la stessa rete NNUE del
+    processo principale.
+    """
+    # Nessun output UCI dagli helper
+    sys.stdout = open(os.devnull, "w")
+    sys.stderr = open(os.devnull, "w")
+    table = SharedTranspositionTable(name=tt_name, entries=tt_entries)
+    engine = ChessEngine()
+    engine.transposition_table = table
+    rng = random.Random(helper_index)
+    networks = {}
+    ready.put(helper_index)
+    try:
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            search_id, start_fen, move_codes, max_depth, nnue_path = command
+            if current_search_id.value != search_id:
+                continue # Ricerca già finita prima che lo helper la leggesse
+            _set_worker_network(engine, nnue_path, networks)
+            engine.parse_fen(start_fen)
+            for code in move_codes:
+                engine.make_move(m.move_from_code(code))
+            # Perturbazioni Lazy SMP: metà degli helper parte da profondità 2, e la history
+            # riceve un rumore diverso per helper, così l'ordinamento delle mosse diverge
+            for history_color in engine.history_heuristic:
+                for index in range(len(history_color)):
+                    history_color[index] = (history_color[index] >> 1) + rng.randrange(8)
+            search.search_move(engine, max_depth=max_depth, control=_HelperControl(current_search_id, search_id),
+                               start_depth=1 + helper_index % 2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.transposition_table = None
+        table.close()
+
+
+class LazySMP:
+    """
+    Gruppo di threads-1 processi helper con la TT condivisa. Il processo principale
+    usa la stessa TT (engine.transposition_table = smp.table) e cerca con search_move.
+    Se gli helper non sono pronti entro HELPER_STARTUP_TIMEOUT secondi il costruttore li
+    termina, libera la TT condivisa e solleva TimeoutError (OSError se un processo non parte).
+    """
+    def __init__(self, threads, size_mb=constants.TT_SIZE_MB):
+        self.threads = max(1, threads)
+        self.table = SharedTranspositionTable(size_mb)
+        context = multiprocessing.get_context("spawn")
+        self.current_search_id = context.Value('L', 0, lock=False)
+        self.commands = context.Queue()
+        ready = context.Queue()
+        self.helpers = []
+        try:
+            for helper_index in range(self.threads - 1):
+                process = context.Process(target=_helper_main, name=f"smp-helper-{helper_index}", daemon=True,
+                                          args=(helper_index, self.table.name, self.table.entries, self.commands, ready, self.current_search_id))
+                process.start()
+                self.helpers.append(process)
+            # Attende che gli helper abbiano importato i moduli e creato l'engine (readyok solo dopo)
+            deadline = time.monotonic() + HELPER_STARTUP_TIMEOUT
+            for _ in self.helpers:
+                ready.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            self.close()
+            raise TimeoutError(f"helper Lazy SMP non pronti dopo {HELPER_STARTUP_TIMEOUT} s") from None
+        except OSError:
+            self.close()
+            raise
+        self._next_search_id = 1
+
+    def search_move(self, engine, max_depth=constants.MAX_SEARCH_PLY, **search_kwargs):
+        """search.search_move sul processo principale con gli helper attivi sulla stessa radice."""
+        search_id = self._next_search_id
+        self._next_search_id += 2 # Gli id dispari sono ricerche, quelli pari "nessuna ricerca"
+        self.current_search_id.value = search_id
+        start_fen, moves = engine.get_position_history()
+        move_codes = [int(move_obj) for move_obj in moves]
+        nnue_path = _network_path(engine)
+        for _ in self.helpers:
+            self.commands.put((search_id, start_fen, move_codes, max_depth, nnue_path))
+        try:
+            return search.search_move(engine, max_depth=max_depth, **search_kwargs)
+        finally:
+            self.current_search_id.value = search_id + 1 # Ferma gli helper (polling ogni SEARCH_POLL_INTERVAL nodi)
+
+    def close(self):
+        self.current_search_id.value = 0
+        for _ in self.helpers:
+            self.commands.put(None)
+        for process in self.helpers:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.helpers = []
+        self.table.close(unlink=True)
+
+
+# --- Root splitting ---
+# Stato del processo worker (impostato dall'initializer del pool)
+_root_engine = None
+_root_alpha = None
+_root_stop = None
+
+
+class _RootWorkerControl(search.SearchControl):
+    """Il worker si ferma quando il coordinatore alza il flag di stop condiviso."""
+    def __init__(self, stop_flag):
+        super().__init__()
+        self.stop_flag = stop_flag
+
+    def should_stop(self):
+        if self.stop_flag.value:
+            self.abort_requested = True
+        return self.abort_requested
+
+
+def _root_worker_init(tt_name, tt_entries, shared_alpha, stop_flag, nnue_path):
+    global _root_engine, _root_alpha, _root_stop
+    sys.stdout = open(os.devnull, "w")
+    sys.stderr = open(os.devnull, "w")
+    _root_engine = ChessEngine()
+    _set_worker_network(_root_engine, nnue_path, {})
+    _root_engine.transposition_table = SharedTranspositionTable(name=tt_name, entries=tt_entries) # TT del coordinatore
+    _root_alpha = shared_alpha
+    _root_stop = stop_flag
+
+
+def _search_root_move(start_fen, move_codes, root_move_code, depth):
+    """
+    Cerca una mossa radice a profondità depth nel worker. Ritorna
+    (codice mossa, score, esatto, pv, nodi); score è None se la ricerca è stata fermata.
+    Con un alpha condiviso già valido prova prima una finestra nulla: una mossa che non
+    lo supera è scartata con un upper bound (esatto = False).
+    """
+    engine = _root_engine
+    engine.parse_fen(start_fen)
+    for code in move_codes:
+        engine.make_move(m.move_from_code(code))
+    move_obj = m.move_from_code(root_move_code)
+    gives_check = engine.gives_check(move_obj)
+    child_depth = depth - 1 + (constants.CHECK_EXTENSION if gives_check else 0)
+    beta = constants.MATE_SCORE * 2
+    search.search_control = _RootWorkerControl(_root_stop)
+    search.nodes_searched = search.q_nodes_searched = 0
+    engine.make_move(move_obj)
+    try:
+        alpha = _root_alpha.value
+        if alpha > -constants.MATE_SCORE * 2:
+            score = -search.negamax(engine, child_depth, -alpha - 1, -alpha, 1, gives_check)[0]
+            if score > alpha:
+                alpha = max(alpha, _root_alpha.value) # Un'altra mossa può aver già alzato alpha
+                score = -search.negamax(engine, child_depth, -beta, -alpha, 1, gives_check)[0]
+        else:
+            score = -search.negamax(engine, child_depth, -beta, -alpha, 1, gives_check)[0]
+    except search.SearchAborted:
+        engine.unwind_to(len(move_codes))
+        return root_move_code, None, False, [], search.nodes_searched + search.q_nodes_searched
+    engine.unmake_move()
+    exact = score > alpha
+    if exact:
+        with _root_alpha.get_lock():
+            if score > _root_alpha.value:
+                _root_alpha.value = score
+    pv = search.extract_pv(engine, move_obj, depth) if exact else [move_obj.to_uci_string()]
+    return root_move_code, score, exact, pv, search.nodes_searched + search.q_nodes_searched
+
+
+def root_split_search(engine, depth, workers, control=None):
+    """
+    Analisi a profondità fissa con le mosse radice divise tra workers processi.
+    Coordinatore e worker usano la stessa TT condivisa: quella di engine se è già una
+    SharedTranspositionTable (es. con Lazy SMP attivo), altrimenti una temporanea con lo
+    stesso numero di entry, in cui si copiano le entry della TT di engine e da cui si
+    ricopiano alla fine (la TT del chiamante non perde né dimensione né entry calde).
+    Una ricerca seriale a ROOT_SPLIT_ORDER_DEPTH fissa l'ordinamento; la prima mossa
+    (la migliore finora) viene cercata da sola per stabilire alpha, poi le altre vanno
+    in parallelo con l'alpha condiviso. Il coordinatore unisce score e PV e stampa la
+    riga info finale. control.stop() (UCI 'stop') ferma i worker.
+    """
+    local_table = engine.transposition_table
+    if isinstance(local_table, SharedTranspositionTable):
+        table = local_table
+    else:
+        table = SharedTranspositionTable(entries=local_table.entries)
+        table.shm.buf[:table.size_bytes] = local_table.words.cast('B')
+        table.generation = local_table.generation
+        engine.transposition_table = table
+    try:
+        return _root_split_search(engine, table, depth, workers, control)
+    finally:
+        if table is not local_table:
+            local_table.words.cast('B')[:] = table.shm.buf[:table.size_bytes]
+            local_table.generation = table.generation
+            engine.transposition_table = local_table
+            table.close(unlink=True)
+
+
+def _root_split_search(engine, table, depth, workers, control):
+    if control is None:
+        control = search.SearchControl()
+    order_depth = max(1, min(depth - 1, constants.ROOT_SPLIT_ORDER_DEPTH))
+    best_move = search.search_move(engine, max_depth=order_depth, control=control)
+    if best_move is None or depth <= order_depth or control.abort_requested:
+        return best_move
+    # Matto già trovato dalla ricerca seriale (search_move si è fermata prima di order_depth)
+    if control.root_best_score is not None and abs(control.root_best_score) >= constants.MATE_SCORE - constants.MAX_SEARCH_PLY:
+        return best_move
+    color_index = 0 if engine.current_player == 'W' else 1
+    root_moves = list(search.pick_moves(engine, best_move, None, engine.killer_moves[0], engine.history_heuristic[color_index]))
+    if len(root_moves) == 1:
+        return best_move
+
+    start_time = time.monotonic()
+    start_fen, moves = engine.get_position_history()
+    move_codes = [int(move_obj) for move_obj in moves]
+    context = multiprocessing.get_context("spawn")
+    shared_alpha = context.Value('q', -constants.MATE_SCORE * 2)
+    stop_flag = context.Value('b', 0, lock=False)
+    best_score, best_pv, total_nodes = None, [best_move.to_uci_string()], 0
+    aborted = False
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_root_worker_init,
+                                                initargs=(table.name, table.entries, shared_alpha, stop_flag, _network_path(engine))) as pool:
+        # Young brothers wait: la prima mossa da sola, poi tutte le altre
+        batches = [root_moves[:1], root_moves[1:]]
+        for batch in batches:
+            pending = {pool.submit(_search_root_move, start_fen, move_codes, int(move_obj), depth) for move_obj in batch}
+            while pending and not aborted:
+                done, pending = concurrent.futures.wait(pending, timeout=0.05, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    move_code, score, exact, pv, nodes = future.result()
+                    total_nodes += nodes
+                    if score is not None and exact and (best_score is None or score > best_score):
+                        best_move, best_score, best_pv = m.move_from_code(move_code), score, pv
+                if control.should_stop():
+                    aborted = True
+            if aborted:
+                stop_flag.value = 1
+                for future in pending:
+                    future.cancel()
+                break
+
+    elapsed = time.monotonic() - start_time
+    if best_score is not None:
+        nps = int(total_nodes / elapsed) if elapsed > 0 else 0
+        control.send(f"info depth {depth} score {search.format_score(best_score)} nodes {total_nodes} nps {nps} "
+                     f"hashfull {table.hashfull()} time {int(elapsed * 1000)} pv {' '.join(best_pv)}")
+    return best_move
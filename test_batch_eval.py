@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# test_batch_eval.py: evaluate_batch deve dare gli stessi score di evaluate_board.
+# Posizioni da partite casuali (seme fisso) da alcune FEN di mediogioco e finale,
+# più le FEN stesse; ogni score diverso viene stampato.
+import sys
+import random
+
+try:
+    import evaluation
+    import batch_eval
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+START_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "rnbqkb1r/pp2pp1p/3p1np1/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",
+    "8/8/8/8/8/2k5/p7/K1B5 b - - 0 1",           # Alfiere del colore sbagliato (finale riconosciuto)
+    "8/3k4/8/8/8/8/3N4/4K3 w - - 0 1",           # KNvK
+    "4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1",
+]
+
+
+def run_tests():
+    rng = random.Random(2024)
+    positions = []
+    for fen in START_FENS:
+        positions.append(fen)
+        for _ in range(40):
+            engine = ChessEngine(fen)
+            for _ in range(rng.randrange(1, 80)):
+                legal_moves = engine.get_legal_moves(engine.current_player)
+                if not legal_moves:
+                    break
+                engine.make_move(rng.choice(legal_moves))
+            positions.append(engine.get_fen())
+
+    batch_scores = batch_eval.evaluate_batch(positions)
+
+    passed = 0
+    failed = 0
+    for fen, batch_score in zip(positions, batch_scores):
+        engine = ChessEngine(fen)
+        expected_score = evaluation.evaluate_board(engine.squares, engine.current_player)
+        if int(batch_score) == expected_score:
+            passed += 1
+        else:
+            print(f"FAIL: {fen} (Expected: {expected_score}, Got: {int(batch_score)})")
+            failed += 1
+
+    # Anche le coppie (squares, colore) come input
+    engine = ChessEngine(START_FENS[1])
+    pair_score = int(batch_eval.evaluate_batch([(engine.squares, engine.current_player)])[0])
+    if pair_score == evaluation.evaluate_board(engine.squares, engine.current_player):
+        passed += 1
+    else:
+        print(f"FAIL: input (squares, colore) (Got: {pair_score})")
+        failed += 1
+
+    print("\n--- Test Summary ---")
+    print(f"Posizioni: {len(positions) + 1} ({len(positions)} FEN + 1 coppia (squares, colore); throughput: python bench.py batch)")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL BATCH EVAL TESTS PASSED!")
+    else:
+        print("Errors detected! evaluate_batch differs from evaluate_board.")
+        sys.exit(1)
+
+
+if not batch_eval.NUMPY_AVAILABLE:
+    print("NumPy non installato: test di evaluate_batch saltato.")
+else:
+    run_tests()
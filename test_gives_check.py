@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# test_gives_check.py: gives_check (calcolato senza eseguire la mossa) confrontato con
+# make_move + is_in_check per ogni mossa legale di posizioni con scacchi di scoperta,
+# promozioni, arrocchi ed en passant, e di partite casuali (seme fisso).
+import sys
+import random
+
+try:
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "4k3/8/8/8/8/8/4N3/4R1K1 w - - 0 1",      # Scoperta del cavallo sulla colonna
+    "7k/8/8/8/8/8/1P6/B6K w - - 0 1",         # Scoperta del pedone sulla diagonale
+    "3k4/1P6/8/8/8/8/8/4K3 w - - 0 1",        # Promozioni che danno scacco
+    "5k2/8/8/8/8/8/8/4K2R w K - 0 1",         # Arrocco con scacco della torre
+    "8/1k6/8/3pP3/8/8/8/4K2B w - d6 0 1",     # En passant con scoperta dell'alfiere
+    "8/8/8/8/K2pP2r/8/8/4k3 b - e3 0 1",      # En passant che libera la traversa
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def wrong_moves(engine):
+    """Mosse legali per cui gives_check differisce da make_move + is_in_check."""
+    wrong = []
+    for move_obj in engine.get_legal_moves(engine.current_player):
+        predicted = engine.gives_check(move_obj)
+        engine.make_move(move_obj)
+        actual = engine.is_in_check(engine.current_player)
+        engine.unmake_move()
+        if predicted != actual:
+            wrong.append(f"{move_obj.to_uci_string()} (previsto {predicted}, reale {actual})")
+    return wrong
+
+
+def run_tests():
+    for fen in FENS:
+        wrong = wrong_moves(ChessEngine(fen))
+        check(f"{fen}: {', '.join(wrong)}", not wrong)
+
+    rng = random.Random(11)
+    checks_found = 0
+    for fen in FENS[:4]:
+        for _ in range(10):
+            engine = ChessEngine(fen)
+            wrong = []
+            for _ in range(80):
+                wrong.extend(f"{engine.get_fen()} {move}" for move in wrong_moves(engine))
+                legal_moves = engine.get_legal_moves(engine.current_player)
+                if not legal_moves:
+                    break
+                engine.make_move(rng.choice(legal_moves))
+                checks_found += engine.is_in_check(engine.current_player)
+            check(f"partita casuale da {fen}: {wrong[:3]}", not wrong)
+    check(f"partite casuali con scacchi ({checks_found})", checks_found > 0)
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL GIVES_CHECK TESTS PASSED!")
+    else:
+        print("Errors detected! gives_check differs from make_move + is_in_check.")
+        sys.exit(1)
+
+
+run_tests()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# test_lazy_eval.py: evaluate_board_bounded (lazy evaluation) confrontata con la valutazione
+# completa su posizioni estreme (pedoni passati in settima, molte donne, torri in settima su
+# colonne aperte, re senza scudo, strutture pedonali rotte) e da partite casuali.
+# Ogni uscita anticipata deve essere un limite dello score completo dalla parte giusta della finestra
+# (inferiore >= beta o superiore <= alpha), così il delta pruning della quiescenza resta corretto.
+import sys
+import random
+
+try:
+    import evaluation
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+EXTREME_FENS = [
+    "k7/PPPPPPPP/8/8/8/8/8/7K w - - 0 1",                 # Otto passati in settima
+    "7k/8/8/8/8/8/pppppppp/K7 w - - 0 1",                 # Lo stesso per il Nero
+    "k7/PPPPPPPP/8/8/8/8/pppppppp/K7 b - - 0 1",
+    "4k3/8/P1P1P1P1/P1P1P1P1/8/8/8/4K3 w - - 0 1",        # Doppiati e isolati
+    "4k3/p1p1p1p1/p1p1p1p1/8/8/8/8/4K3 b - - 0 1",
+    "QQQ5/8/8/3k4/8/8/8/QQQ1K3 w - - 0 1",                # Mobilità massima delle donne
+    "1k6/8/3qqq2/8/8/3qqq2/8/6K1 b - - 0 1",
+    "k7/RRRR4/8/8/8/8/8/K7 w - - 0 1",                    # Torri in settima su colonne aperte
+    "k7/8/8/8/8/8/rrrr4/K7 b - - 0 1",
+    "rnbqkbnr/8/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",  # Re nero senza scudo né pedoni
+    "1k6/1ppp4/8/8/8/8/8/QQQ3K1 w - - 0 1",
+    "NNNNk3/NNNN4/8/8/8/8/8/4K3 w - - 0 1",               # Molti cavalli (e alfieri) al centro
+    "4k3/8/2BBBB2/2BBBB2/8/8/8/4K3 w - - 0 1",
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def wrong_exits(engine):
+    """Finestre (alpha, beta) per cui l'uscita anticipata non è un limite della valutazione completa."""
+    arguments = (engine.squares, engine.current_player, engine.piece_squares, engine.pawn_key, engine.pawn_table,
+                 engine.material_key, engine.material_table, engine.pst_score, engine.bitboards)
+    full_score = evaluation.evaluate_board(*arguments)
+    wrong = []
+    for offset in range(-3000, 3001, 25):
+        for width in (1, 50, 400):
+            alpha = full_score + offset
+            beta = alpha + width
+            score, exact = evaluation.evaluate_board_bounded(*arguments, alpha=alpha, beta=beta)
+            if exact:
+                if score != full_score:
+                    wrong.append((alpha, beta, score, full_score))
+            elif (score >= beta and full_score < score) or (score <= alpha and full_score > score) or alpha < score < beta:
+                wrong.append((alpha, beta, score, full_score))
+    return wrong
+
+
+def run_tests():
+    for fen in EXTREME_FENS:
+        wrong = wrong_exits(ChessEngine(fen))
+        check(f"{fen}: {wrong[:2]}", not wrong)
+
+    rng = random.Random(5)
+    for fen in EXTREME_FENS[9:] + ["r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"]:
+        engine = ChessEngine(fen)
+        wrong = []
+        for _ in range(40):
+            legal_moves = engine.get_legal_moves(engine.current_player)
+            if not legal_moves:
+                break
+            engine.make_move(rng.choice(legal_moves))
+            wrong.extend(wrong_exits(engine))
+        check(f"partita casuale da {fen}: {wrong[:2]}", not wrong)
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL LAZY EVAL TESTS PASSED!")
+    else:
+        print("Errors detected! A lazy exit disagrees with the full evaluation.")
+        sys.exit(1)
+
+
+run_tests()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# test_make_unmake.py: stato incrementale (hash Zobrist, chiave pedoni, chiave materiale,
+# PST, insiemi pezzi, bitboard) dopo make_move/unmake_move e mosse nulle, confrontato con
+# lo stesso stato ricalcolato da zero su partite casuali (seme fisso).
+import sys
+import random
+
+try:
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+START_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", # Arrocchi, catture
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",    # Promozioni
+    "rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",        # En passant
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def snapshot(engine):
+    """Tutto lo stato che make/unmake aggiornano in modo incrementale."""
+    return (engine.get_fen(), engine.current_hash, engine.pawn_key, engine.material_key, engine.pst_score,
+            engine.castling, tuple(engine.king_squares), bytes(engine.squares), tuple(engine.bitboards),
+            tuple(frozenset(squares) for squares in engine.piece_squares))
+
+
+def incremental_ok(engine):
+    """Le chiavi incrementali coincidono con quelle calcolate da zero e con quelle di una FEN riletta."""
+    fresh = ChessEngine(engine.get_fen())
+    return (engine.current_hash == engine.calculate_zobrist_hash() == fresh.current_hash and
+            engine.pawn_key == engine.calculate_pawn_key() == fresh.pawn_key and
+            engine.material_key == engine.calculate_material_key() == fresh.material_key and
+            engine.pst_score == engine.calculate_pst_score() == fresh.pst_score and
+            snapshot(engine)[5:] == snapshot(fresh)[5:])
+
+
+def null_move_fen(fen):
+    """FEN dopo una mossa nulla: turno cambiato, niente en passant."""
+    fields = fen.split()
+    fields[1] = 'b' if fields[1] == 'w' else 'w'
+    fields[3] = '-'
+    return " ".join(fields)
+
+
+def run_tests():
+    rng = random.Random(9)
+    for fen in START_FENS:
+        for game in range(4):
+            engine = ChessEngine(fen)
+            snapshots = [snapshot(engine)]
+            forward_ok = null_ok = True
+            for _ in range(120):
+                legal_moves = engine.get_legal_moves(engine.current_player)
+                if not legal_moves:
+                    break
+                engine.make_move(rng.choice(legal_moves))
+                snapshots.append(snapshot(engine))
+                forward_ok = forward_ok and incremental_ok(engine)
+                if not engine.is_in_check(engine.current_player):
+                    before = snapshot(engine)
+                    engine.make_null_move()
+                    null_ok = null_ok and engine.current_hash == ChessEngine(null_move_fen(before[0])).current_hash
+                    engine.unmake_null_move()
+                    null_ok = null_ok and snapshot(engine) == before
+            check(f"make_move: stato incrementale {fen} #{game}", forward_ok)
+            check(f"null move: hash e ripristino {fen} #{game}", null_ok)
+
+            backward_ok = True
+            while engine.undo_count:
+                engine.unmake_move()
+                backward_ok = backward_ok and snapshot(engine) == snapshots[engine.undo_count]
+            check(f"unmake_move: stato ripristinato {fen} #{game}", backward_ok)
+
+    # Trasposizione: stessa posizione per strade diverse, stesso hash
+    first = ChessEngine()
+    for uci_move in ("g1f3", "g8f6", "b1c3", "b8c6"):
+        first.make_move(first.parse_move(uci_move))
+    second = ChessEngine()
+    for uci_move in ("b1c3", "b8c6", "g1f3", "g8f6"):
+        second.make_move(second.parse_move(uci_move))
+    check("trasposizione: stesso hash", first.current_hash == second.current_hash and
+          first.pawn_key == second.pawn_key and first.material_key == second.material_key)
+    # Un diritto di arrocco perso cambia l'hash anche se i pezzi tornano a posto
+    for uci_move in ("h1g1", "h8g8", "g1h1", "g8h8"):
+        first.make_move(first.parse_move(uci_move))
+    check("arrocco perso: hash diverso", first.current_hash != second.current_hash and incremental_ok(first))
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL MAKE/UNMAKE TESTS PASSED!")
+    else:
+        print("Errors detected! Incremental state differs from a full recomputation.")
+        sys.exit(1)
+
+
+run_tests()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# test_material.py: entry della material hash table. Patta certa solo dove il matto è
+# impossibile, recognizer dei finali (alfiere del colore sbagliato) e KNNvK: valutato 0
+# ma la ricerca deve ancora trovare i matti quando il difensore sbaglia.
+import io
+import sys
+import contextlib
+
+try:
+    import evaluation
+    import search
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+# (FEN, patta certa attesa, score del recognizer atteso: None = non riconosciuta)
+MATERIAL_CASES = [
+    ("8/8/8/8/8/2k5/8/K7 w - - 0 1", True, 0),         # KvK
+    ("8/8/8/8/8/2k5/8/KN6 w - - 0 1", True, 0),        # KNvK
+    ("8/8/8/8/8/2k5/8/KB6 b - - 0 1", True, 0),        # KBvK
+    ("8/8/8/8/8/2k5/8/KNN5 w - - 0 1", False, 0),      # KNNvK: drawish, non patta certa
+    ("8/8/8/8/8/2k5/8/KBB5 w - - 0 1", False, None),   # KBBvK vince
+    ("8/8/8/8/8/2k5/8/KBN5 w - - 0 1", False, None),   # KBNvK vince
+    ("k7/8/P7/8/8/8/8/KB6 w - - 0 1", False, None),    # Alfiere del colore giusto
+    ("k7/8/P7/8/8/8/8/K1B5 w - - 0 1", False, 0),      # Alfiere sbagliato, re nell'angolo
+    ("2k5/8/P7/8/8/8/8/K1B5 w - - 0 1", False, None),  # Re difensore lontano dall'angolo
+    ("8/8/8/8/8/p7/8/K4b1k b - - 0 1", False, 0),      # Lo stesso per il Nero
+]
+
+# (FEN, mossa di matto attesa)
+MATE_CASES = [
+    ("k7/3N4/1K6/3N4/8/8/8/8 w - - 0 1", "d5c7"), # KNNvK: matto in 1
+    ("8/8/8/8/3n4/1k6/3n4/K7 b - - 0 1", "d4c2"),  # Lo stesso per il Nero
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def run_tests():
+    for fen, expected_draw, expected_score in MATERIAL_CASES:
+        engine = ChessEngine(fen)
+        entry = evaluation._calculate_material_entry(engine.material_key)
+        recognizer = entry[evaluation.MATERIAL_RECOGNIZER]
+        score = recognizer(engine.piece_squares) if recognizer is not None else None
+        check(f"{fen}: patta certa {entry[evaluation.MATERIAL_DRAW]}, attesa {expected_draw}",
+              entry[evaluation.MATERIAL_DRAW] == expected_draw)
+        check(f"{fen}: recognizer {score}, atteso {expected_score}", score == expected_score)
+
+    for fen, expected_move in MATE_CASES:
+        engine = ChessEngine(fen)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            best_move = search.search_move(engine, max_depth=3)
+        found = best_move is not None and best_move.to_uci_string() == expected_move and "score mate 1" in output.getvalue()
+        check(f"{fen}: matto {expected_move} (trovato {best_move})", found)
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL MATERIAL TESTS PASSED!")
+    else:
+        print("Errors detected! Material entries or endgame recognizers are wrong.")
+        sys.exit(1)
+
+
+run_tests()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# test_nnue.py: accumulatori NNUE aggiornati in make/unmake uguali a quelli ricalcolati
+# da zero (Network.refresh), anche con la rete attivata dopo aver giocato delle mosse
+# ('position startpos moves ...' -> 'setoption name Use NNUE' -> 'go' con RootSplit).
+import os
+import sys
+import random
+import tempfile
+
+try:
+    import nnue
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+START_FENS = [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", # Arrocchi, catture
+    "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",                             # Promozioni
+    "rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",        # En passant
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def accumulator_ok(engine, network):
+    accumulator = engine.accumulators[engine.undo_count] if engine.undo_count < len(engine.accumulators) else None
+    return accumulator is not None and (accumulator == network.refresh(engine.piece_squares)).all()
+
+
+def run_tests():
+    network = nnue.Network.random(3)
+
+    # 1. Salvataggio e caricamento del file dei pesi
+    path = os.path.join(tempfile.mkdtemp(), "nn.bin")
+    network.save(path)
+    loaded = nnue.load_network(path)
+    check("save/load: stessi pesi", (loaded.delta_table == network.delta_table).all() and
+          loaded.output_bias == network.output_bias and loaded.output_scale == network.output_scale)
+    with open(path, 'r+b') as network_file:
+        network_file.write(b"XXXX")
+    try:
+        nnue.load_network(path)
+        check("load: magic non valido rifiutato", False)
+    except ValueError:
+        check("load: magic non valido rifiutato", True)
+
+    # 2. make/unmake (e mosse nulle) contro refresh su partite casuali
+    rng = random.Random(1)
+    for fen in START_FENS:
+        for _ in range(5):
+            engine = ChessEngine(fen)
+            engine.set_network(loaded)
+            ok = True
+            for ply in range(100):
+                ok = ok and accumulator_ok(engine, loaded)
+                if ply % 7 == 3:
+                    engine.make_null_move()
+                    ok = ok and accumulator_ok(engine, loaded)
+                    engine.unmake_null_move()
+                legal_moves = engine.get_legal_moves(engine.current_player)
+                if not legal_moves:
+                    break
+                engine.make_move(rng.choice(legal_moves))
+            while engine.undo_count:
+                engine.unmake_move()
+                ok = ok and accumulator_ok(engine, loaded)
+            check(f"make/unmake: {fen}", ok)
+
+    # 3. Rete attivata dopo le mosse: get_position_history (root split) e unwind_to rigiocano
+    #    i ply precedenti, che non hanno ancora un accumulatore
+    engine = ChessEngine()
+    for uci_move in ("e2e4", "e7e5", "g1f3"):
+        engine.make_move(engine.parse_move(uci_move))
+    engine.set_network(loaded)
+    try:
+        start_fen, moves = engine.get_position_history()
+        check("set_network dopo le mosse: get_position_history", accumulator_ok(engine, loaded) and len(moves) == 3)
+        expected = loaded.evaluate(loaded.refresh(engine.piece_squares), 1)
+        engine.unwind_to(0)
+        check("set_network dopo le mosse: evaluate dopo unwind_to",
+              engine.evaluate() == loaded.evaluate(loaded.refresh(engine.piece_squares), 0))
+        for move_obj in moves:
+            engine.make_move(move_obj)
+        check("set_network dopo le mosse: mosse rigiocate", engine.evaluate() == expected)
+    except TypeError as e:
+        check(f"set_network dopo le mosse: {e}", False)
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL NNUE TESTS PASSED!")
+    else:
+        print("Errors detected! NNUE accumulators differ from a full refresh.")
+        sys.exit(1)
+
+
+if not nnue.NUMPY_AVAILABLE:
+    print("NumPy non installato: test NNUE saltato.")
+else:
+    run_tests()
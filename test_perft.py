@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# test_perft.py: conteggi Perft delle posizioni standard (chessprogramming.org/Perft_Results)
+# e generatore legale (pin e scacchi) confrontato con pseudo-legali + make + is_in_check.
+import io
+import sys
+import contextlib
+
+try:
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+# (Nome, FEN, nodi attesi per profondità 1, 2, 3, ...)
+PERFT_CASES = [
+    ("Posizione iniziale", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("Posizione 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]), # En passant con pin sulla traversa
+    ("Posizione 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467]),
+    ("Posizione 4 (specchiata)", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", [6, 264, 9467]),
+    ("Posizione 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+    ("Posizione 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890]),
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def filtered_pseudo_legal(engine):
+    """Mosse legali ottenute nel modo lento: pseudo-legali eseguite e scartate se lasciano il re in scacco."""
+    player = engine.current_player
+    legal_moves = set()
+    for move_obj in engine.get_pseudo_legal_moves(player):
+        engine.make_move(move_obj)
+        if not engine.is_in_check(player):
+            legal_moves.add(move_obj)
+        engine.unmake_move()
+    return legal_moves
+
+
+def compare_generators(engine, depth):
+    """Confronta i due generatori in tutti i nodi dell'albero fino a depth; ritorna i nodi diversi."""
+    mismatches = []
+    legal_moves = engine.get_legal_moves(engine.current_player)
+    if set(legal_moves) != filtered_pseudo_legal(engine) or len(set(legal_moves)) != len(legal_moves):
+        mismatches.append(engine.get_fen())
+    if depth > 1:
+        for move_obj in legal_moves:
+            engine.make_move(move_obj)
+            mismatches.extend(compare_generators(engine, depth - 1))
+            engine.unmake_move()
+    return mismatches
+
+
+def run_tests():
+    for name, fen, expected_counts in PERFT_CASES:
+        engine = ChessEngine(fen)
+        start_hash = engine.current_hash
+        for depth, expected_nodes in enumerate(expected_counts, 1):
+            with contextlib.redirect_stdout(io.StringIO()): # perft stampa intestazione e tempi
+                nodes = engine.perft(depth, divide=False)
+            check(f"{name}: perft({depth}) = {nodes}, attesi {expected_nodes}", nodes == expected_nodes)
+        check(f"{name}: stato ripristinato dopo perft", engine.get_fen() == fen and engine.current_hash == start_hash)
+
+        mismatches = compare_generators(engine, 2)
+        for mismatch_fen in mismatches[:3]:
+            print(f"  generatori diversi in {mismatch_fen}")
+        check(f"{name}: mosse legali = pseudo-legali filtrate", not mismatches)
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL PERFT TESTS PASSED!")
+    else:
+        print("Errors detected! Move generation differs from the reference counts.")
+        sys.exit(1)
+
+
+run_tests()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# test_tt.py: Transposition Table impacchettata (tt.py) e sua versione in shared memory
+# (smp.SharedTranspositionTable). Ogni entry scritta deve tornare identica dal probe:
+# mossa, bound, profondità e score ai limiti dei campi. Gli snapshot (save/load) devono
+# ridare le stesse entry e la stessa generazione; il root splitting su una TT locale non deve
+# perderne dimensione ed entry.
+import os
+import sys
+import random
+import tempfile
+import io
+import contextlib
+
+try:
+    import constants
+    import move as m
+    import smp
+    from tt import TranspositionTable, read_snapshot_header
+    from board import ChessEngine
+except ImportError as e:
+    print(f"Errore di importazione: {e}. Assicurati che tutti i file .py siano nella directory corretta o nel PYTHONPATH.")
+    sys.exit(1)
+
+MATE = constants.MATE_SCORE
+# (depth, score, bound, mossa UCI o None)
+ENTRIES = [
+    (0, 0, constants.TT_BOUND_EXACT, None),
+    (1, -35, constants.TT_BOUND_UPPER, "e2e4"),
+    (7, 120, constants.TT_BOUND_LOWER, "e1g1"),      # Arrocco
+    (12, -MATE + 5, constants.TT_BOUND_EXACT, "a7a8q"), # Promozione, score di matto
+    (255, MATE * 2, constants.TT_BOUND_LOWER, "h2h1n"),
+    (40, -MATE * 2, constants.TT_BOUND_UPPER, "b7b8r"),
+]
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+    else:
+        print(f"FAIL: {name}")
+        failed += 1
+
+
+def code_of(uci_move):
+    """Codice di MOVE_TABLE per una mossa UCI (None = nessuna mossa)."""
+    if uci_move is None:
+        return None
+    return next(code for code, uci_string in m.UCI_STRINGS.items()
+                if uci_string == uci_move and (code & m.CASTLE_FLAG) == (m.CASTLE_FLAG if uci_move == "e1g1" else 0))
+
+
+def random_hash(rng):
+    return rng.getrandbits(64)
+
+
+def check_round_trip(table, label):
+    """Scrive ENTRIES in bucket diversi e le rilegge."""
+    rng = random.Random(7)
+    stored = []
+    for depth, score, bound, uci_move in ENTRIES:
+        position_hash = random_hash(rng)
+        best_move = code_of(uci_move)
+        table.store(position_hash, depth, score, bound, best_move)
+        stored.append((position_hash, depth, score, bound, best_move))
+    for position_hash, depth, score, bound, best_move in stored:
+        entry = table.probe(position_hash)
+        expected_move = m.move_from_code(best_move) if best_move is not None else None # NO_MOVE -> None
+        check(f"{label}: probe {depth} {score}", entry is not None and entry[:3] == (depth, score, bound) and
+              entry[3] == expected_move and (expected_move is None or type(entry[3]) is m.Move))
+        check(f"{label}: hash diverso", table.probe(position_hash ^ 1) is None)
+    return stored
+
+
+def run_tests():
+    # 1. Pack/unpack sulla tabella locale
+    table = TranspositionTable(1)
+    stored = check_round_trip(table, "tt")
+
+    # 2. Stessa posizione: una ricerca meno profonda non sovrascrive, la mossa vecchia resta
+    position_hash, depth, score, bound, best_move = stored[2]
+    table.store(position_hash, depth - 1, 0, constants.TT_BOUND_UPPER, None)
+    check("tt: entry più profonda tenuta", table.probe(position_hash)[:3] == (depth, score, bound))
+    table.store(position_hash, depth + 1, 0, constants.TT_BOUND_UPPER, None)
+    check("tt: mossa vecchia tenuta", table.probe(position_hash) == (depth + 1, 0, constants.TT_BOUND_UPPER, best_move))
+
+    # 3. Bucket pieno: viene sostituita l'entry che vale meno (profondità - età)
+    small = TranspositionTable(entries=constants.TT_BUCKET_SIZE)
+    for depth in range(constants.TT_BUCKET_SIZE):
+        small.store(1000 + depth, depth + 1, depth, constants.TT_BOUND_EXACT, None)
+    small.store(2000, 9, 0, constants.TT_BOUND_EXACT, None)
+    check("tt: sostituita la meno profonda", small.probe(1000) is None and small.probe(2000) is not None and
+          all(small.probe(1000 + depth) for depth in range(1, constants.TT_BUCKET_SIZE)))
+    small.new_search()
+    small.store(3000, 1, 0, constants.TT_BOUND_EXACT, None)
+    check("tt: sostituita un'entry vecchia", small.probe(3000) is not None)
+
+    # 4. new_game, clear e resize
+    generation = table.generation
+    table.new_game()
+    check("tt: new_game conserva le entry", table.probe(stored[1][0]) is not None and table.generation != generation)
+    table.clear()
+    check("tt: clear svuota", all(table.probe(entry[0]) is None for entry in stored) and table.hashfull() == 0)
+    table.resize(2)
+    check("tt: resize", table.entries == 2 * (1 << 20) // 16 and table.probe(stored[0][0]) is None)
+    check_round_trip(table, "tt dopo resize")
+
+    # 5. Shared memory: stesso formato, generazione condivisa, ridimensionamento rifiutato
+    shared = smp.SharedTranspositionTable(1)
+    try:
+        shared_stored = check_round_trip(shared, "shared")
+        helper_view = smp.SharedTranspositionTable(name=shared.name, entries=shared.entries)
+        check("shared: entry viste da un altro aggancio", helper_view.probe(shared_stored[3][0]) == shared.probe(shared_stored[3][0]))
+        shared.new_search()
+        shared.new_game()
+        check("shared: generazione condivisa", helper_view.generation == shared.generation != 0)
+        helper_view.close()
+        try:
+            shared.resize(2)
+            check("shared: resize rifiutato", False)
+        except ValueError:
+            check("shared: resize rifiutato", shared.probe(shared_stored[0][0]) is not None)
+        shared.resize_entries(shared.entries)
+        check("shared: resize alla stessa dimensione svuota", shared.probe(shared_stored[0][0]) is None)
+    finally:
+        shared.close(unlink=True)
+
+    # 6. Snapshot su file: save/load conservano entry e generazione, header non validi rifiutati
+    path = os.path.join(tempfile.mkdtemp(), "hash.tt")
+    table = TranspositionTable(1)
+    table.new_search()
+    stored = check_round_trip(table, "snapshot")
+    table.save(path)
+    check("snapshot: header", read_snapshot_header(path) == (table.entries, table.generation))
+    loaded = TranspositionTable(2)
+    loaded.load(path)
+    check("snapshot: load", loaded.entries == table.entries and loaded.generation == table.generation and
+          all(loaded.probe(entry[0]) == table.probe(entry[0]) for entry in stored))
+    loaded.store(stored[1][0], 50, 7, constants.TT_BOUND_EXACT, None)
+    from_file = TranspositionTable(1)
+    from_file.load(path)
+    check("snapshot: file invariato dalle scritture (copy-on-write)", loaded.probe(stored[1][0])[:2] == (50, 7) and
+          from_file.probe(stored[1][0]) == table.probe(stored[1][0]))
+    loaded.save(path) # Rinomina sopra il file ancora mappato
+    reloaded = TranspositionTable(1)
+    reloaded.load(path)
+    check("snapshot: save dopo load", reloaded.probe(stored[1][0])[:2] == (50, 7) and
+          reloaded.probe(stored[3][0]) == table.probe(stored[3][0]))
+    shared = smp.SharedTranspositionTable(entries=table.entries)
+    try:
+        shared.load(path)
+        check("snapshot: load nella TT condivisa", shared.generation == table.generation and
+              all(shared.probe(entry[0]) == reloaded.probe(entry[0]) for entry in stored))
+    finally:
+        shared.close(unlink=True)
+    with open(path, 'r+b') as snapshot_file:
+        snapshot_file.write(b"XXXXXXXX")
+    try:
+        reloaded.load(path)
+        check("snapshot: magic non valido rifiutato", False)
+    except ValueError:
+        check("snapshot: magic non valido rifiutato", reloaded.probe(stored[3][0]) is not None)
+
+    # 7. Root splitting con una TT locale: tabella condivisa temporanea della stessa dimensione,
+    #    entry calde disponibili ai worker e ricopiate (con quelle nuove) nella TT dell'engine
+    engine = ChessEngine("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    local_table = engine.transposition_table = TranspositionTable(2)
+    warm = check_round_trip(local_table, "root split")
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        best_move = smp.root_split_search(engine, 3, 2)
+    check("root split: TT dell'engine ripristinata", engine.transposition_table is local_table and local_table.entries == 2 * (1 << 20) // 16)
+    check("root split: entry calde conservate", sum(local_table.probe(entry[0]) is not None for entry in warm) >= len(warm) - 1)
+    root_entry = local_table.probe(engine.current_hash)
+    check("root split: entry della ricerca ricopiate", best_move is not None and root_entry is not None and root_entry[3] is not None)
+
+    print("\n--- Test Summary ---")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print("--------------------")
+    if failed == 0:
+        print("ALL TT TESTS PASSED!")
+    else:
+        print("Errors detected! Transposition table entries are not preserved.")
+        sys.exit(1)
+
+
+if __name__ == "__main__": # I worker del root splitting (spawn) reimportano questo modulo
+    run_tests()
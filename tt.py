@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# Transposition Table impacchettata: un buffer piatto di interi a 64 bit (mmap anonimo o
+# shared memory, vedi smp.py), due parole per entry, bucket di TT_BUCKET_SIZE entry.
+#   data: bit 0-15  mossa (codice di move.py, 0 = nessuna)
+#         bit 16-17 bound (constants.TT_BOUND_*)
+#         bit 18-25 profondità
+#         bit 26-57 score + _SCORE_OFFSET (mai 0: data == 0 vuol dire slot vuoto)
+#         bit 58-63 generazione (età della ricerca, modulo 64)
+#   key:  hash ^ data. Con più processi sulla stessa memoria (Lazy SMP) una scrittura
+#         strappata a metà non supera il confronto e viene letta come slot vuoto, senza lock.
+# 16 byte per entry contro le centinaia di un dizionario con la sua Move.
+# L'mmap anonimo ha pagine azzerate dal sistema al primo accesso: creare o svuotare la
+# tabella non costa il tempo di scrivere tutti i suoi MB.
+#
+# Snapshot su file (save/load): header di SNAPSHOT_HEADER byte seguito dalle parole così
+# come sono in memoria. load() mappa il file copy-on-write: il caricamento è immediato e
+# le pagine vengono lette dal disco solo quando la ricerca le tocca.
+import os
+import mmap
+import struct
+
+import constants
+import move as m
+
+_BOUND_SHIFT = 16
+_DEPTH_SHIFT = 18
+_SCORE_SHIFT = 26
+_GENERATION_SHIFT = 58
+_SCORE_OFFSET = 1 << 31
+_GENERATION_MASK = 0x3F
+_HASH_MASK = (1 << 64) - 1
+ENTRY_BYTES = 16
+_BUCKET_WORDS = 2 * constants.TT_BUCKET_SIZE
+_SLOT_OFFSETS = tuple(range(0, _BUCKET_WORDS, 2)) # Prima parola di ogni entry del bucket
+
+# Header snapshot: magic, versione, entry per bucket, seme Zobrist, chiave di controllo
+# (ZOBRIST_SIDE: cambia se cambia la generazione delle chiavi), numero di entry, generazione
+SNAPSHOT_MAGIC = b"BMTTHASH"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct('<8sIIQQQI20x')
+SNAPSHOT_HEADER = _SNAPSHOT_HEADER.size # 64 byte, multiplo di 8: le parole restano allineate
+
+
+def read_snapshot_header(path):
+    """
+    Valida l'header di uno snapshot e ritorna (entries, generation).
+    Solleva ValueError se il file non è uno snapshot compatibile con questo engine.
+    """
+    with open(path, 'rb') as snapshot_file:
+        header = snapshot_file.read(SNAPSHOT_HEADER)
+        file_size = os.fstat(snapshot_file.fileno()).st_size
+    if len(header) < SNAPSHOT_HEADER:
+        raise ValueError(f"{path}: file troppo corto per uno snapshot TT")
+    magic, version, bucket_size, seed, zobrist_check, entries, generation = _SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path}: non è uno snapshot TT")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"{path}: versione snapshot {version}, attesa {SNAPSHOT_VERSION}")
+    if bucket_size != constants.TT_BUCKET_SIZE:
+        raise ValueError(f"{path}: bucket da {bucket_size} entry, attesi {constants.TT_BUCKET_SIZE}")
+    if seed != constants.ZOBRIST_SEED or zobrist_check != constants.ZOBRIST_SIDE:
+        raise ValueError(f"{path}: chiavi Zobrist diverse da quelle dell'engine")
+    if not entries or entries % bucket_size or file_size != SNAPSHOT_HEADER + entries * ENTRY_BYTES:
+        raise ValueError(f"{path}: dimensione non valida")
+    return entries, generation
+
+
+def entries_for_size(size_mb):
+    """Numero di entry (multiplo di TT_BUCKET_SIZE) che stanno in size_mb megabyte."""
+    buckets = max(1, (size_mb << 20) // (ENTRY_BYTES * constants.TT_BUCKET_SIZE))
+    return buckets * constants.TT_BUCKET_SIZE
+
+
+class TranspositionTable:
+    """
+    TT a bucket con sostituzione per profondità ed età.
+    probe(hash) -> (depth, score, bound, best_move) o None; store(...) scrive l'entry.
+    new_search() incrementa la generazione: le entry di ricerche precedenti restano
+    utilizzabili ma vengono sostituite per prime.
+    """
+    def __init__(self, size_mb=constants.TT_SIZE_MB, entries=None, words=None):
+        self.entries = entries if entries is not None else entries_for_size(size_mb)
+        self.bucket_count = self.entries // constants.TT_BUCKET_SIZE
+        # words: buffer esterno già allocato (shared memory), altrimenti mmap anonimo locale
+        self._buffer = None
+        if words is None:
+            self._buffer = mmap.mmap(-1, self.size_bytes)
+            words = memoryview(self._buffer).cast('Q')
+        self.words = words
+        self.generation = 0
+
+    @property
+    def size_bytes(self):
+        return self.entries * ENTRY_BYTES
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & _GENERATION_MASK
+
+    def new_game(self):
+        """
+        Nuova partita in O(1): la generazione avanza di mezzo ciclo, quindi le entry delle
+        partite precedenti hanno età >= 32 e vengono sostituite per prime (restano valide
+        per il probe: l'hash identifica la posizione, non la partita).
+        """
+        self.generation = (self.generation + (_GENERATION_MASK + 1) // 2) & _GENERATION_MASK
+
+    def clear(self):
+        """Nuovo mmap al posto del vecchio (la memoria torna al sistema, niente azzeramento)."""
+        self.resize_entries(self.entries)
+
+    def resize(self, size_mb):
+        """Opzione UCI Hash: nuova tabella vuota di size_mb MB."""
+        self.resize_entries(entries_for_size(size_mb))
+
+    def resize_entries(self, entries):
+        self.words.release()
+        self._buffer.close()
+        self.entries = entries
+        self.bucket_count = entries // constants.TT_BUCKET_SIZE
+        self._buffer = mmap.mmap(-1, self.size_bytes)
+        self.words = memoryview(self._buffer).cast('Q')
+        self.generation = 0
+
+    def probe(self, position_hash):
+        words = self.words
+        base = (position_hash % self.bucket_count) * _BUCKET_WORDS
+        for offset in _SLOT_OFFSETS:
+            index = base + offset
+            data = words[index + 1]
+            if data and words[index] ^ data == position_hash:
+                return ((data >> _DEPTH_SHIFT) & 0xFF, ((data >> _SCORE_SHIFT) & 0xFFFFFFFF) - _SCORE_OFFSET,
+                        (data >> _BOUND_SHIFT) & 0x3, m.move_from_code(data & 0xFFFF))
+        return None
+
+    def store(self, position_hash, depth, score, bound, best_move):
+        """
+        Stessa posizione: sovrascrive se la nuova profondità è >= o l'entry è di una ricerca
+        precedente (tenendo la mossa vecchia se la nuova non c'è). Altrimenti usa uno slot
+        vuoto o quello che vale meno: profondità - TT_AGE_WEIGHT * età.
+        """
+        words = self.words
+        generation = self.generation
+        base = (position_hash % self.bucket_count) * _BUCKET_WORDS
+        target = base
+        target_value = None
+        for offset in _SLOT_OFFSETS:
+            index = base + offset
+            data = words[index + 1]
+            if not data:
+                target = index
+                break
+            entry_depth = (data >> _DEPTH_SHIFT) & 0xFF
+            age = (generation - (data >> _GENERATION_SHIFT)) & _GENERATION_MASK
+            if words[index] ^ data == position_hash:
+                if depth < entry_depth and not age:
+                    return # Entry più profonda della ricerca in corso: la teniamo
+                if best_move is None:
+                    best_move = data & 0xFFFF
+                target = index
+                break
+            value = entry_depth - constants.TT_AGE_WEIGHT * age
+            if target_value is None or value < target_value:
+                target = index
+                target_value = value
+        data = ((best_move or m.NO_MOVE) | (bound << _BOUND_SHIFT) | (min(max(depth, 0), 255) << _DEPTH_SHIFT) |
+                ((score + _SCORE_OFFSET) << _SCORE_SHIFT) | (generation << _GENERATION_SHIFT))
+        words[target] = (position_hash ^ data) & _HASH_MASK
+        words[target + 1] = data
+
+    def save(self, path):
+        """
+        Scrive lo snapshot su un file temporaneo e lo rinomina: un eventuale mmap dello
+        stesso file (load precedente) continua a vedere il vecchio contenuto.
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, constants.TT_BUCKET_SIZE,
+                                                      constants.ZOBRIST_SEED, constants.ZOBRIST_SIDE,
+                                                      self.entries, self.generation))
+            snapshot_file.write(self.words[:2 * self.entries])
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        """
+        Sostituisce la tabella con lo snapshot in path, mappato copy-on-write (ACCESS_COPY):
+        le scritture della ricerca restano in memoria e non modificano il file. La
+        dimensione diventa quella dello snapshot.
+        """
+        entries, generation = read_snapshot_header(path)
+        with open(path, 'rb') as snapshot_file:
+            snapshot = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.words.release()
+        self._buffer.close()
+        self.entries = entries
+        self.bucket_count = entries // constants.TT_BUCKET_SIZE
+        self._buffer = snapshot
+        self.words = memoryview(snapshot)[SNAPSHOT_HEADER:].cast('Q')
+        self.generation = generation
+
+    def hashfull(self):
+        """Permille delle entry occupate dalla generazione corrente (campione delle prime 1000 entry)."""
+        words = self.words
+        sample = min(1000, self.entries)
+        used = 0
+        for index in range(1, 2 * sample, 2):
+            data = words[index]
+            if data and (data >> _GENERATION_SHIFT) == self.generation:
+                used += 1
+        return used * 1000 // sample
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 import sys
 import time # Potrebbe servire per debug o altro
+import threading
 import constants
 import board as b # Alias
 import move as m # Alias
 import search # Per accedere alle costanti o funzioni di search se necessario
+import smp # Lazy SMP (opzione UCI Threads)
+import nnue # Valutazione NNUE opzionale (opzioni UCI Use NNUE / EvalFile)
+from tt import TranspositionTable, ENTRY_BYTES, read_snapshot_header
 
 # Import condizionale per Polyglot
 try:
@@ -15,8 +19,142 @@ except ImportError:
     CHESS_POLYGLOT_AVAILABLE_UCI = False
     chess = None # Definisci per evitare errori
 
+_output_lock = threading.Lock()
+
+def send(line):
+    """Scrive una riga UCI su stdout in una sola write (il thread di ricerca scrive in parallelo)."""
+    with _output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+# --- Ricerca in background ---
+# La ricerca gira su un thread di lavoro: il loop UCI continua a leggere stdin e può
+# rispondere a isready o fermare la ricerca (stop/quit) tramite il SearchControl.
+_search_thread = None
+_search_control = None
+_lazy_smp = None # smp.LazySMP quando Threads > 1
+_threads = 1
+_root_split = False # Opzione RootSplit: 'go depth N' divide le mosse radice tra Threads processi
+_hash_mb = constants.TT_SIZE_MB # Opzione Hash
+_hash_file = constants.TT_SNAPSHOT_PATH # Opzione Hash File (snapshot della TT)
+_eval_file = constants.NNUE_PATH # Opzione EvalFile (pesi NNUE)
+_use_nnue = False # Opzione Use NNUE
+
+def _set_threads(engine, threads):
+    """
+    Opzione Threads: 1 = ricerca classica, N > 1 = Lazy SMP con N-1 processi helper e TT condivisa.
+    Se gli helper non partono si torna a Threads=1 (segnalato con info string).
+    """
+    global _lazy_smp, _threads
+    _threads = threads
+    if _lazy_smp is not None:
+        _lazy_smp.close()
+        _lazy_smp = None
+    if threads > 1:
+        try:
+            _lazy_smp = smp.LazySMP(threads, _hash_mb)
+            engine.transposition_table = _lazy_smp.table
+        except (TimeoutError, OSError) as e:
+            send(f"info string Error starting {threads - 1} Lazy SMP helpers: {e}, using Threads=1")
+            threads = _threads = 1
+    if threads == 1:
+        engine.transposition_table = TranspositionTable(_hash_mb)
+    print(f"info string Threads set to {threads}", file=sys.stderr, flush=True)
+
+def _set_hash(engine, size_mb):
+    """Opzione Hash: ridimensiona la TT (vuota) a size_mb MB."""
+    global _hash_mb
+    _hash_mb = size_mb
+    if _lazy_smp is not None:
+        _set_threads(engine, _threads) # La TT condivisa va ricreata insieme agli helper
+    else:
+        engine.transposition_table.resize(size_mb)
+    print(f"info string Hash set to {size_mb} MB ({engine.transposition_table.entries} entries)", file=sys.stderr, flush=True)
+
+def _save_hash(engine):
+    try:
+        engine.transposition_table.save(_hash_file)
+        print(f"info string Hash saved to {_hash_file}", file=sys.stderr, flush=True)
+    except OSError as e:
+        print(f"info string Error saving hash to {_hash_file}: {e}", file=sys.stderr, flush=True)
+
+def _load_hash(engine):
+    """Carica lo snapshot: la TT prende la dimensione del file (con Lazy SMP viene ricreata prima)."""
+    global _hash_mb
+    try:
+        entries, _ = read_snapshot_header(_hash_file)
+        if _lazy_smp is not None and entries != engine.transposition_table.entries:
+            _set_hash(engine, entries * ENTRY_BYTES >> 20)
+        engine.transposition_table.load(_hash_file)
+        _hash_mb = entries * ENTRY_BYTES >> 20
+        print(f"info string Hash loaded from {_hash_file} ({entries} entries)", file=sys.stderr, flush=True)
+    except (OSError, ValueError) as e:
+        print(f"info string Error loading hash from {_hash_file}: {e}", file=sys.stderr, flush=True)
+
+def _set_nnue(engine, use_nnue):
+    """Opzione Use NNUE: carica la rete da EvalFile; se fallisce resta la valutazione classica."""
+    global _use_nnue
+    _use_nnue = use_nnue
+    if not use_nnue:
+        engine.set_network(None)
+        print("info string NNUE disabled, using classical evaluation", file=sys.stderr, flush=True)
+        return
+    try:
+        engine.set_network(nnue.load_network(_eval_file))
+        print(f"info string NNUE loaded from {_eval_file} ({engine.network.hidden} hidden)", file=sys.stderr, flush=True)
+    except (ImportError, OSError, ValueError) as e:
+        engine.set_network(None)
+        print(f"info string Error loading NNUE from {_eval_file}: {e}, using classical evaluation", file=sys.stderr, flush=True)
+
+def _run_search(engine, search_params, control, infinite, fixed_depth):
+    """Corpo del thread di ricerca: cerca e invia bestmove."""
+    search_function = _lazy_smp.search_move if _lazy_smp is not None else search.search_move
+    try:
+        if _root_split and _threads > 1 and fixed_depth:
+            best_move_found = smp.root_split_search(engine, search_params['depth'], _threads, control)
+        else:
+            best_move_found = search_function(
+                engine,
+                max_depth=search_params['depth'],
+                move_time=search_params['movetime'],
+                wtime=search_params['wtime'],
+                btime=search_params['btime'],
+                winc=search_params['winc'],
+                binc=search_params['binc'],
+                movestogo=search_params['movestogo'],
+                control=control
+            )
+    except Exception as e:
+        print(f"ERROR UCI: search failed: {e}", file=sys.stderr, flush=True)
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+        legal_moves = engine.get_legal_moves(engine.current_player)
+        best_move_found = legal_moves[0] if legal_moves else None
+    # Con 'go infinite' bestmove va inviato solo dopo 'stop', anche se la ricerca finisce prima
+    if infinite:
+        control.stop_event.wait()
+    # Stampa la mossa migliore trovata dalla ricerca (0000 = nessuna mossa: matto/stallo)
+    send(f"bestmove {best_move_found.to_uci_string() if best_move_found else '0000'}")
+
+def _start_search(engine, search_params, infinite, fixed_depth):
+    global _search_thread, _search_control
+    _search_control = search.SearchControl(send=send)
+    _search_thread = threading.Thread(target=_run_search, args=(engine, search_params, _search_control, infinite, fixed_depth),
+                                      name="search", daemon=True)
+    _search_thread.start()
+
+def _stop_search():
+    """Ferma la ricerca in corso (se c'è) e attende che il thread abbia inviato bestmove."""
+    global _search_thread, _search_control
+    if _search_thread is not None:
+        _search_control.stop()
+        _search_thread.join()
+        _search_thread = None
+        _search_control = None
+
 def uci_loop(engine):
     """Gestisce il loop di comunicazione UCI."""
+    global _root_split, _hash_file, _eval_file
     print("Avvio UCI loop...", file=sys.stderr, flush=True)
 
     while True:
@@ -29,27 +167,33 @@ def uci_loop(engine):
 
         print(f"DEBUG UCI Received: {line}", file=sys.stderr, flush=True) # Debug
 
+        # Comandi che modificano lo stato dell'engine: prima va fermata un'eventuale ricerca
+        if line.split()[0] in ("quit", "ucinewgame", "position", "go", "perft", "setoption"):
+            _stop_search()
+
         if line == "quit":
             break
         elif line == "uci":
             # Usa una versione nel nome ID per tracciamento
-            print(f"id name Baka Mitai", flush=True)
-            print(f"id author Mani D'Amarena", flush=True)
+            send(f"id name Baka Mitai")
+            send(f"id author Mani D'Amarena")
             # Qui potresti aggiungere opzioni UCI se ne implementi (es. Hash size, UseBook)
-            # print("option name Hash type spin default 128 min 1 max 1024")
-            print("uciok", flush=True)
+            send(f"option name Hash type spin default {constants.TT_SIZE_MB} min 1 max {constants.MAX_HASH_MB}")
+            send("option name Clear Hash type button")
+            send(f"option name Hash File type string default {constants.TT_SNAPSHOT_PATH}")
+            send("option name Save Hash type button")
+            send("option name Load Hash type button")
+            send(f"option name Threads type spin default 1 min 1 max {constants.MAX_THREADS}")
+            send("option name RootSplit type check default false")
+            send("option name Use NNUE type check default false")
+            send(f"option name EvalFile type string default {constants.NNUE_PATH}")
+            send("uciok")
         elif line == "isready":
-            # Qui l'engine dovrebbe assicurarsi di essere pronto (es. caricamento tabelle finito)
-            # In questo caso, siamo sempre pronti dopo l'init.
-            print("readyok", flush=True)
+            # Il loop UCI resta libero durante la ricerca (thread separato): risponde subito.
+            send("readyok")
         elif line == "ucinewgame":
-            # Resetta lo stato dell'engine alla posizione iniziale
-            engine.parse_fen(constants.INITIAL_FEN)
-            # Pulisci TT e history heuristic (potrebbe essere un metodo sull'engine)
-            engine.transposition_table = [None] * constants.TT_SIZE
-            engine.killer_moves = [[None, None] for _ in range(constants.MAX_SEARCH_PLY)]
-            engine.history_heuristic = [[[0] * 64 for _ in range(64)] for _ in range(2)]
-            engine.play_book_move_on_go = None # Resetta mossa libro
+            # Posizione iniziale, TT invecchiata (nuova generazione), killer e history azzerate in place
+            engine.new_game()
             print("DEBUG UCI: New game state reset.", file=sys.stderr, flush=True)
             
         elif line.startswith("perft"):
@@ -63,7 +207,7 @@ def uci_loop(engine):
 
                 # Imposta la FEN corrente prima di iniziare, per chiarezza
                 current_fen_for_perft = engine.get_fen()
-                print(f"info string Running Perft({depth}) on FEN: {current_fen_for_perft}", flush=True)
+                send(f"info string Running Perft({depth}) on FEN: {current_fen_for_perft}")
 
                 # Chiama la funzione perft dell'engine
                 # Usiamo divide=True di default per avere l'output dettagliato
@@ -72,7 +216,7 @@ def uci_loop(engine):
 
                 # Il risultato numerico e i dettagli vengono già stampati da engine.perft()
                 # Stampa un messaggio finale nel log UCI
-                print(f"info string Perft calculation finished. Total nodes: {result_nodes}", flush=True)
+                send(f"info string Perft calculation finished. Total nodes: {result_nodes}")
 
             except ValueError as e:
                 print(f"info string Invalid depth for perft: {e}", file=sys.stderr, flush=True)
@@ -160,7 +304,7 @@ def uci_loop(engine):
             # Controlla se abbiamo una mossa libro memorizzata
             if engine.play_book_move_on_go is not None:
                 print(f"info string Playing book move: {engine.play_book_move_on_go.to_uci_string()}", file=sys.stderr, flush=True)
-                print(f"bestmove {engine.play_book_move_on_go.to_uci_string()}", flush=True)
+                send(f"bestmove {engine.play_book_move_on_go.to_uci_string()}")
                 engine.play_book_move_on_go = None # Consuma la mossa libro
             else:
                 # Nessuna mossa libro, avvia la ricerca
@@ -178,36 +322,70 @@ def uci_loop(engine):
                             # Mantieni il default o imposta a None/0 ? Dipende dalla logica time management.
                             # search_params[part] = None # O gestisci errore
 
-                # Chiama la funzione di ricerca nel modulo search, passando l'engine
-                best_move_found = search.search_move(
-                    engine,
-                    max_depth=search_params['depth'],
-                    move_time=search_params['movetime'],
-                    wtime=search_params['wtime'],
-                    btime=search_params['btime'],
-                    winc=search_params['winc'],
-                    binc=search_params['binc'],
-                    movestogo=search_params['movestogo']
-                )
-
-                # Stampa la mossa migliore trovata dalla ricerca
-                if best_move_found:
-                    print(f"bestmove {best_move_found.to_uci_string()}", flush=True)
-                else:
-                    # Caso raro: ricerca non trova mosse (dovrebbe essere gestito da search_move?)
-                    # O posizione iniziale è già matto/stallo
-                    print("bestmove 0000", flush=True) # Notazione UCI per mossa nulla/partita finita
+                # 'go infinite': niente limiti di tempo/profondità, si ferma solo con stop
+                infinite = "infinite" in parts
+                if infinite:
+                    search_params.update(depth=constants.MAX_SEARCH_PLY, movetime=None, wtime=None, btime=None)
+
+                # Solo 'go depth N' senza limiti di tempo può usare il root splitting
+                fixed_depth = "depth" in parts and not infinite and search_params['movetime'] is None and \
+                              search_params['wtime'] is None and search_params['btime'] is None
+
+                # Avvia la ricerca sul thread di lavoro (bestmove viene inviato da lì)
+                _start_search(engine, search_params, infinite, fixed_depth)
 
         elif line == "stop":
-            # In un engine multithread, questo segnalerebbe al thread di ricerca di fermarsi.
-            # Qui, non facciamo nulla attivamente, ma la logica di time limit in search_move
-            # dovrebbe interrompere la ricerca se il tempo scade.
-            print("info string Stop command received (currently no effect in single thread)", file=sys.stderr, flush=True)
-            pass
+            # Segnala l'abort al thread di ricerca: negamax lo vede entro SEARCH_POLL_INTERVAL nodi
+            # e il thread invia subito bestmove con l'ultima mossa sicura.
+            _stop_search()
+        elif line.startswith("setoption"):
+            # setoption name <nome> [value <valore>]
+            parts = line.split()
+            if "name" not in parts:
+                print("ERROR UCI: Invalid setoption command", file=sys.stderr, flush=True)
+                continue
+            value_index = parts.index("value") if "value" in parts else len(parts)
+            option_name = " ".join(parts[parts.index("name") + 1:value_index]).lower()
+            option_value = " ".join(parts[value_index + 1:])
+            if option_name == "hash":
+                try:
+                    size_mb = min(max(int(option_value), 1), constants.MAX_HASH_MB)
+                except ValueError:
+                    print(f"WARN UCI: Invalid value for option 'Hash': {option_value}", file=sys.stderr, flush=True)
+                    continue
+                _set_hash(engine, size_mb)
+            elif option_name == "clear hash":
+                engine.transposition_table.clear() # Con Lazy SMP è la TT condivisa con gli helper
+            elif option_name == "hash file":
+                _hash_file = option_value
+            elif option_name == "save hash":
+                _save_hash(engine)
+            elif option_name == "load hash":
+                _load_hash(engine)
+            elif option_name == "threads":
+                try:
+                    threads = min(max(int(option_value), 1), constants.MAX_THREADS)
+                except ValueError:
+                    print(f"WARN UCI: Invalid value for option 'Threads': {option_value}", file=sys.stderr, flush=True)
+                    continue
+                _set_threads(engine, threads)
+            elif option_name == "rootsplit":
+                _root_split = option_value.lower() == "true"
+            elif option_name == "use nnue":
+                _set_nnue(engine, option_value.lower() == "true")
+            elif option_name == "evalfile":
+                _eval_file = option_value
+                if _use_nnue:
+                    _set_nnue(engine, True) # Ricarica la rete dal nuovo file
+            else:
+                print(f"info string Unknown option: {option_name}", file=sys.stderr, flush=True)
         elif line == "ponderhit":
             # Se stessimo facendo pondering, questo direbbe che l'avversario ha giocato la mossa attesa.
             # Non implementato qui.
             pass
         # Aggiungi altri comandi UCI se necessario (es. setoption)
 
+    _stop_search()
+    if _lazy_smp is not None:
+        _lazy_smp.close()
     print("UCI loop terminated.", file=sys.stderr, flush=True)
\ No newline at end of file